@@ -0,0 +1,83 @@
+"""compare the fast pattern noun phrase extractor with doc.noun_chunks for speed and accuracy
+
+usage: python benchmarks/bench_noun_phrases.py [--file text.txt | --size 200k] [--processes 4]
+
+accuracy treats the parser's noun chunks as the reference: exact matches need the
+same character span, head matches only the same last token (the chunk's head noun)
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_analyzer as ta
+from bench_suite import make_corpus, parse_size
+
+TOP_N = 20
+
+def timed(func, *args, **kwargs):
+    """run func once and return (result, seconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def extract(text, mode):
+    """run only the components the mode needs, return the noun phrase spans"""
+    nlp = ta.get_nlp()
+    with ta.planned_pipeline([f"noun_phrases_{mode}"]):
+        doc = nlp(text)
+        return list(doc.noun_chunks) if mode == "parser" else ta.match_noun_phrases(doc)
+
+def f1(precision, recall):
+    """harmonic mean of precision and recall"""
+    return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+def score(reference, candidate):
+    """(precision, recall, f1) of the candidate keys against the reference keys"""
+    hits = len(reference & candidate)
+    precision = hits / len(candidate) if candidate else 0.0
+    recall = hits / len(reference) if reference else 0.0
+    return precision, recall, f1(precision, recall)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", help="text file to use instead of the synthetic corpus")
+    parser.add_argument("--size", default="200k", help="synthetic corpus size, e.g. 200k")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for the parallel run")
+    args = parser.parse_args()
+    
+    text = ta.load_text_file(args.file) if args.file else make_corpus(parse_size(args.size))
+    nlp = ta.get_nlp()
+    nlp.max_length = max(nlp.max_length, len(text) + 1)
+    print(f"text: {len(text)} characters")
+    
+    reference, parser_seconds = timed(extract, text, "parser")
+    candidate, fast_seconds = timed(extract, text, "fast")
+    print(f"noun_chunks (tagger + parser): {parser_seconds:.3f}s, {len(reference)} phrases")
+    print(f"fast patterns (tagger only):   {fast_seconds:.3f}s, {len(candidate)} phrases")
+    print(f"speedup: {parser_seconds / fast_seconds:.1f}x")
+    
+    # each phrase occurs once per position, so positions make the sets
+    exact = score({(span.start_char, span.end_char) for span in reference},
+                  {(span.start_char, span.end_char) for span in candidate})
+    head = score({span[-1].idx for span in reference}, {span[-1].idx for span in candidate})
+    print(f"\n{'match':<8} {'precision':>9} {'recall':>7} {'f1':>6}")
+    for name, (precision, recall, f1_score) in (("exact", exact), ("head", head)):
+        print(f"{name:<8} {precision:>9.3f} {recall:>7.3f} {f1_score:>6.3f}")
+    
+    reference_top = {phrase for phrase, _ in Counter(span.text.lower() for span in reference).most_common(TOP_N)}
+    candidate_top = {phrase for phrase, _ in Counter(span.text.lower() for span in candidate).most_common(TOP_N)}
+    print(f"top {TOP_N} lowercased phrases in common: {len(reference_top & candidate_top)}/{TOP_N}")
+    
+    serial, serial_seconds = timed(ta.get_noun_phrase_counts_parallel, text, "fast", n_process=1)
+    parallel, parallel_seconds = timed(ta.get_noun_phrase_counts_parallel, text, "fast", n_process=args.processes)
+    assert serial == parallel, "parallel counts differ from the serial run"
+    print(f"\nfast mode over chunks, 1 process: {serial_seconds:.3f}s")
+    print(f"fast mode over chunks, {args.processes} processes: {parallel_seconds:.3f}s")
+
+if __name__ == "__main__":
+    main()
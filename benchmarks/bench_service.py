@@ -0,0 +1,126 @@
+"""load test the HTTP service: latency percentiles and throughput with and without micro-batching
+
+usage: python benchmarks/bench_service.py [--requests 400] [--concurrency 16] [--size 2k] [--max-batch 1,16]
+
+each --max-batch value starts its own `text_analyzer.py serve` in an empty directory
+(with a fresh database and a benchmark user), then keep-alive clients send requests
+with a different synthetic text each and time every response
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import text_analyzer as ta
+from bench_suite import make_corpus, parse_size
+
+USERNAME = "bench"
+PASSWORD = "bench"
+READY_TIMEOUT = 300
+
+def free_port():
+    """a port nothing listens on right now"""
+    with socket.socket() as sock:
+        sock.bind((ta.SERVICE_HOST, 0))
+        return sock.getsockname()[1]
+
+def start_service(work_dir, port, max_batch, batch_wait):
+    """launch the service in work_dir and wait until it listens, return the process"""
+    ta.DB_NAME = os.path.join(work_dir, os.path.basename(ta.DB_NAME))
+    ta.init_database()
+    ta.create_user(USERNAME, PASSWORD)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, "text_analyzer.py"), "serve", "--port", str(port),
+         "--max-batch", str(max_batch), "--batch-wait", str(batch_wait)],
+        cwd=work_dir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    deadline = time.perf_counter() + READY_TIMEOUT
+    for line in process.stdout:
+        if line.startswith(b"Serving on"):
+            return process
+        if time.perf_counter() > deadline:
+            break
+    process.kill()
+    raise RuntimeError("the service did not start")
+
+async def request(reader, writer, path, payload):
+    """send one keep-alive request, return (status, parsed body)"""
+    body = json.dumps(payload).encode()
+    auth = base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+    writer.write((f"POST {path} HTTP/1.1\r\nHost: localhost\r\nAuthorization: Basic {auth}\r\n"
+                  f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    length = next(int(line.split(":", 1)[1]) for line in lines if line.lower().startswith("content-length:"))
+    return int(lines[0].split(" ")[1]), json.loads(await reader.readexactly(length))
+
+async def load(port, texts, path, concurrency):
+    """send every text once from concurrency clients, return (latencies, batch sizes, seconds)"""
+    queue = list(reversed(texts))
+    latencies = []
+    batch_sizes = []
+    
+    async def client():
+        reader, writer = await asyncio.open_connection(ta.SERVICE_HOST, port)
+        while queue:
+            text = queue.pop()
+            start = time.perf_counter()
+            status, body = await request(reader, writer, path, {"text": text})
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                raise RuntimeError(f"request failed with {status}: {body}")
+            batch_sizes.append(body["batch_size"])
+        writer.close()
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, batch_sizes, time.perf_counter() - start
+
+def percentile(values, fraction):
+    """the value below which the given fraction of values fall (nearest rank)"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400, help="requests per run")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients sending at the same time")
+    parser.add_argument("--size", default="2k", help="characters per request text, e.g. 2k")
+    parser.add_argument("--endpoint", default="/analyze", help="endpoint to call, e.g. /tokens")
+    parser.add_argument("--max-batch", default=f"1,{ta.SERVICE_MAX_BATCH}",
+                        help="comma separated --max-batch values, one run each")
+    parser.add_argument("--batch-wait", type=float, default=ta.SERVICE_BATCH_WAIT * 1000,
+                        help="milliseconds a request waits for others to batch with")
+    args = parser.parse_args()
+    
+    size = parse_size(args.size)
+    texts = [make_corpus(size, seed=i) for i in range(args.requests)]
+    warmup = [make_corpus(size, seed=-i) for i in range(1, args.concurrency + 1)]
+    print(f"{args.requests} requests of {size} characters to {args.endpoint}, {args.concurrency} concurrent clients")
+    print(f"\n{'max batch':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>10}")
+    for max_batch in (int(value) for value in args.max_batch.split(",")):
+        with tempfile.TemporaryDirectory() as work_dir:
+            port = free_port()
+            process = start_service(work_dir, port, max_batch, args.batch_wait)
+            try:
+                # the first batches pay for lazy setup, keep them out of the numbers
+                asyncio.run(load(port, warmup, args.endpoint, args.concurrency))
+                latencies, batch_sizes, seconds = asyncio.run(load(port, texts, args.endpoint, args.concurrency))
+            finally:
+                process.terminate()
+                process.wait()
+        print(f"{max_batch:>9} {len(latencies) / seconds:>8.1f} {percentile(latencies, 0.5) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.1f} {statistics.mean(batch_sizes):>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""measure the time from launching text_analyzer.py to its first prompt
+
+usage: python benchmarks/bench_startup.py [--runs 5] [--script path/to/text_analyzer.py]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = b"Please enter your choice"
+
+def time_to_first_prompt(script):
+    """launch the interactive app, return seconds until the login prompt is printed"""
+    # run in an empty directory so the database is created fresh each time
+    with tempfile.TemporaryDirectory() as work_dir:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, script], cwd=work_dir,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            env={**os.environ, "TERM": os.environ.get("TERM", "dumb")})
+        output = b""
+        while PROMPT not in output:
+            byte = process.stdout.read(1)
+            if not byte:
+                raise RuntimeError("the app exited before showing its first prompt")
+            output += byte
+        elapsed = time.perf_counter() - start
+        
+        # choose "Exit" on the welcome screen
+        process.communicate(b"3\n", timeout=60)
+        return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="number of launches to time")
+    parser.add_argument("--script", default=os.path.join(REPO_DIR, "text_analyzer.py"),
+                        help="the app to launch (e.g. an older checkout, for comparison)")
+    args = parser.parse_args()
+    
+    timings = [time_to_first_prompt(args.script) for _ in range(args.runs)]
+    print(f"time to first prompt over {args.runs} runs:")
+    print(f"  median: {statistics.median(timings):.3f}s")
+    print(f"  min:    {min(timings):.3f}s")
+    print(f"  max:    {max(timings):.3f}s")
+
+if __name__ == "__main__":
+    main()
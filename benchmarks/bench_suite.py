@@ -0,0 +1,317 @@
+"""time and measure peak memory of every stage of text_analyzer.py on synthetic corpora
+
+usage:
+    python benchmarks/bench_suite.py run [--sizes 10k,100k,1m] [--repeat 3] [--output results.json]
+    python benchmarks/bench_suite.py compare baseline.json results.json [--threshold 0.10]
+
+corpora are generated from a fixed seed, so every run and every machine analyzes
+the same bytes; texts up to spaCy's max_length go through the single doc path,
+larger ones through streaming mode
+"""
+import os
+
+# fixed thread counts, set before numpy is imported, so timings don't depend on the machine's core count
+for _name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_name, "1")
+
+import argparse
+import gc
+import hashlib
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_analyzer as ta
+
+SIZE_UNITS = {"k": 1000, "m": 1000 * 1000}
+DEFAULT_SIZES = "10k,100k,1m"
+ALL_SIZES = "10k,100k,1m,10m,100m"
+SEED = 42
+KEYWORD = "city"
+
+STOP_WORDS = "the a an of to and in on at with for from by is was were be it this that they we".split()
+CONTENT_WORDS = ("city house river table window morning evening garden road market teacher student "
+                 "run ran running walk walked build built write wrote read quickly slowly carefully "
+                 "good bad happy sad terrible wonderful great awful nice poor love hate beautiful ugly "
+                 "amazing boring interesting dull bright dark old new young strong weak").split()
+NAMES = "Alice Bob London Paris Monday March Acme Google".split()
+
+def parse_size(text):
+    """turn "10k" / "100m" into a byte count (decimal units)"""
+    text = text.strip().lower()
+    if text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+def make_corpus(size, seed=SEED):
+    """build a deterministic synthetic text of exactly size bytes"""
+    rng = random.Random(f"{seed}:{size}")
+    paragraphs = []
+    written = 0
+    while written < size:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            words = rng.choices(STOP_WORDS, k=rng.randint(2, 8)) + rng.choices(CONTENT_WORDS, k=rng.randint(3, 12))
+            rng.shuffle(words)
+            if rng.random() < 0.3:
+                words.insert(rng.randrange(len(words)), rng.choice(NAMES))
+            if len(words) > 6 and rng.random() < 0.4:
+                words[rng.randrange(1, len(words) - 1)] += ","
+            sentences.append(" ".join(words).capitalize() + rng.choice(".....!?"))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        written += len(paragraph) + 2
+    # all ASCII, so characters and bytes line up
+    return "\n\n".join(paragraphs)[:size]
+
+def get_corpus_path(corpus_dir, size):
+    """write the corpus for size once and reuse it on later runs"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    path = os.path.join(corpus_dir, f"corpus_{SEED}_{size}.txt")
+    if not os.path.isfile(path):
+        with open(path, "w", encoding="utf-8", newline="\n") as f:
+            f.write(make_corpus(size))
+    return path
+
+def file_sha256(path):
+    """content hash recorded with the results, so a baseline is only compared on the same corpus"""
+    return ta.compute_file_hash(path)
+
+def measure(func, setup=None, repeat=3, memory=True):
+    """time func repeat times (median wall and CPU), then run it once more under tracemalloc for the peak"""
+    wall_times = []
+    cpu_times = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        result = func()
+        cpu_times.append(time.process_time() - start_cpu)
+        wall_times.append(time.perf_counter() - start_wall)
+    
+    peak = None
+    if memory:
+        if setup:
+            setup()
+        gc.collect()
+        # tracemalloc slows the code down, so it gets its own run outside the timings
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    
+    return result, {
+        "seconds": statistics.median(wall_times),
+        "cpu_seconds": statistics.median(cpu_times),
+        "runs": wall_times,
+        "peak_bytes": peak,
+    }
+
+def reset_token_sentiment_engine():
+    """start each run with an empty sentiment cache, as a fresh process would"""
+    ta._token_sentiment_engine = None
+
+def doc_stages(path, work_dir):
+    """(name, func, setup) for a file small enough to be one doc; later stages reuse earlier results"""
+    nlp = ta.get_nlp()
+    state = {}
+    
+    def load():
+        state["text"] = ta.load_text_file(path)
+        return state["text"]
+    
+    def preprocess_cold():
+        # a fresh cache key each run, so the pipeline always runs and the doc is saved
+        state["cache_key"] = hashlib.sha256(os.urandom(16)).hexdigest()
+        return ta.preprocess_text(state["text"], state["cache_key"], None)
+    
+    def full_doc():
+        state["doc"] = nlp(state["text"])
+        return state["doc"]
+    
+    def export():
+        report_path = os.path.join(work_dir, "report.txt")
+        sections = [name for name in ta.EXPORT_SECTIONS if name != "wordcloud"]
+        return ta.export_analysis_results(state["doc"], report_path, sections=sections)
+    
+    def wordcloud():
+        return ta.render_wordcloud(ta.get_token_counts(state["doc"]), os.path.join(work_dir, "wordcloud.png"))
+    
+    doc = lambda: state["doc"]
+    return [
+        ("load_text_file", load, None),
+        ("tokenize", lambda: nlp.make_doc(state["text"]), None),
+        ("nlp_full_pipeline", full_doc, None),
+        ("preprocess_text_cold", preprocess_cold, None),
+        ("preprocess_text_cached", lambda: ta.preprocess_text(state["text"], state["cache_key"], None), None),
+        # the counting stages below share the table cached for the doc
+        ("build_token_table", lambda: ta.TokenTable(doc()), None),
+        ("get_token_counts", lambda: ta.get_token_counts(doc()), None),
+        ("get_lemma_counts", lambda: ta.get_lemma_counts(doc()), None),
+        ("get_overall_sentiment_document", lambda: ta.get_overall_sentiment(doc(), mode="document"), None),
+        ("get_overall_sentiment_sentence", lambda: ta.get_overall_sentiment(doc(), mode="sentence"), None),
+        ("get_sentence_sentiments", lambda: ta.get_sentence_sentiments(doc(), n_workers=1), None),
+        ("get_token_sentiments", lambda: ta.get_token_sentiments(doc()), reset_token_sentiment_engine),
+        ("get_unique_sentiment_by_tokens", lambda: ta.get_unique_sentiment_by_tokens(doc()),
+         reset_token_sentiment_engine),
+        ("get_text_statistics", lambda: ta.get_text_statistics(doc()), None),
+        ("get_pos_distribution", lambda: ta.get_pos_distribution(doc()), None),
+        ("get_noun_phrase_counts", lambda: ta.get_noun_phrase_counts(doc()), None),
+        ("get_readability_score", lambda: ta.get_readability_score(doc()), None),
+        ("get_readability_scores", lambda: ta.get_readability_scores(doc()), None),
+        ("get_readability_sections", lambda: ta.get_readability_sections(doc()), None),
+        ("build_keyword_index", lambda: ta.build_keyword_index(doc()), None),
+        ("display_keyword_in_context", lambda: ta.display_keyword_in_context(doc(), KEYWORD), None),
+        ("export_analysis_results", export, None),
+        ("render_wordcloud", wordcloud, None),
+    ]
+
+def streaming_stages(path, work_dir):
+    """(name, func, setup) for a file larger than spaCy's max_length"""
+    state = {}
+    
+    def stream():
+        # time plain streaming, without writing checkpoints
+        state["accumulator"] = ta.analyze_file_streaming(path, checkpoint_seconds=None)
+        return state["accumulator"]
+    
+    def export():
+        session = ta.AnalysisSession(None, state["accumulator"])
+        sections = [name for name in ta.EXPORT_SECTIONS if name != "wordcloud"]
+        return ta.export_analysis_results(None, os.path.join(work_dir, "report.txt"), session=session,
+                                          sections=sections)
+    
+    def wordcloud():
+        return ta.render_wordcloud(state["accumulator"].token_counts, os.path.join(work_dir, "wordcloud.png"))
+    
+    return [
+        ("load_text_blocks", lambda: sum(len(block) for block in ta.iter_text_blocks(path)), None),
+        ("analyze_file_streaming", stream, None),
+        ("export_analysis_results", export, None),
+        ("render_wordcloud", wordcloud, None),
+    ]
+
+def run_suite(sizes, repeat, memory, corpus_dir):
+    """run every stage on every corpus size, return the results document"""
+    import spacy
+    nlp = ta.get_nlp()
+    spacy.util.fix_random_seed(0)
+    results = []
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        # keep the doc cache, database and checkpoints of the benchmark away from the user's
+        ta.DOC_CACHE_DIR = os.path.join(work_dir, "doc_cache")
+        ta.DB_NAME = os.path.join(work_dir, "bench.db")
+        ta.CHECKPOINT_DIR = os.path.join(work_dir, "checkpoints")
+        ta.init_database()
+        
+        for size in sizes:
+            path = get_corpus_path(corpus_dir, size)
+            streamed = ta.needs_streaming(path)
+            stages = streaming_stages(path, work_dir) if streamed else doc_stages(path, work_dir)
+            print(f"{size:,} bytes ({'streaming' if streamed else 'single doc'}):")
+            for name, func, setup in stages:
+                _, timing = measure(func, setup, repeat, memory)
+                peak = "" if timing["peak_bytes"] is None else f"  peak {timing['peak_bytes'] / 1024 / 1024:8.1f} MB"
+                print(f"  {name:<32} {timing['seconds']:9.4f}s{peak}")
+                results.append({"size": size, "corpus_sha256": file_sha256(path), "streamed": streamed,
+                                "stage": name, **timing})
+    
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "spacy": spacy.__version__,
+            "model": f"{nlp.meta.get('lang', '')}_{nlp.meta.get('name', '')}-{nlp.meta.get('version', '')}",
+            "pipeline": nlp.pipe_names,
+            "max_length": nlp.max_length,
+            "seed": SEED,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def compare(baseline, current, threshold, min_seconds):
+    """print stage-by-stage changes, return the stages that got slower or bigger than the threshold allows"""
+    baseline_results = {(r["size"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"{'size':>12} {'stage':<32} {'baseline':>10} {'current':>10} {'change':>8}  memory")
+    for result in current["results"]:
+        key = (result["size"], result["stage"])
+        base = baseline_results.get(key)
+        if base is None:
+            print(f"{result['size']:>12,} {result['stage']:<32} {'-':>10} {result['seconds']:>9.4f}s      new")
+            continue
+        if base.get("corpus_sha256") != result.get("corpus_sha256"):
+            print(f"{result['size']:>12,} {result['stage']:<32} corpus differs from the baseline, skipped")
+            continue
+        
+        change = (result["seconds"] - base["seconds"]) / base["seconds"] if base["seconds"] else 0.0
+        flags = []
+        # tiny stages are mostly noise, only flag them above an absolute floor
+        if change > threshold and result["seconds"] - base["seconds"] > min_seconds:
+            flags.append("SLOWER")
+        memory_change = ""
+        if base.get("peak_bytes") and result.get("peak_bytes") is not None:
+            ratio = (result["peak_bytes"] - base["peak_bytes"]) / base["peak_bytes"]
+            memory_change = f"{ratio:+.0%}"
+            if ratio > threshold:
+                flags.append("MORE MEMORY")
+        print(f"{result['size']:>12,} {result['stage']:<32} {base['seconds']:>9.4f}s {result['seconds']:>9.4f}s "
+              f"{change:>+8.0%}  {memory_change:>6} {' '.join(flags)}")
+        if flags:
+            regressions.append((key, flags))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    run = subparsers.add_parser("run", help="run the suite and write the results as JSON")
+    run.add_argument("--sizes", default=DEFAULT_SIZES,
+                     help=f"comma separated corpus sizes, or 'all' for {ALL_SIZES} (default: {DEFAULT_SIZES})")
+    run.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the median is reported")
+    run.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each stage")
+    run.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "text_analyzer_bench"),
+                     help="where the generated corpora are kept between runs")
+    run.add_argument("--output", default="bench_results.json", help="JSON results file")
+    
+    comparison = subparsers.add_parser("compare", help="flag regressions against a stored baseline")
+    comparison.add_argument("baseline", help="results JSON of the reference run")
+    comparison.add_argument("current", help="results JSON to check")
+    comparison.add_argument("--threshold", type=float, default=0.10,
+                            help="allowed relative slowdown or memory growth (default: 0.10)")
+    comparison.add_argument("--min-seconds", type=float, default=0.005,
+                            help="ignore slowdowns smaller than this many seconds (default: 0.005)")
+    args = parser.parse_args()
+    
+    if args.command == "run":
+        sizes = [parse_size(size) for size in (ALL_SIZES if args.sizes == "all" else args.sizes).split(",")]
+        document = run_suite(sizes, args.repeat, not args.no_memory, args.corpus_dir)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"results written to: {args.output}")
+        return 0
+    
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold, args.min_seconds)
+    print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""benchmark the token sentiment engine against one TextBlob per token
+
+usage: python benchmarks/bench_token_sentiment.py [--words 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_analyzer as ta
+from textblob import TextBlob
+
+WORDS = ("good bad happy sad terrible wonderful great awful nice poor love hate "
+         "city house river table window morning evening quickly slowly run ran running "
+         "beautiful ugly amazing boring interesting dull bright dark").split()
+
+def make_text(word_count, seed=42):
+    """build a deterministic synthetic text"""
+    rng = random.Random(seed)
+    sentences = []
+    written = 0
+    while written < word_count:
+        length = rng.randint(6, 18)
+        words = [rng.choice(WORDS) for _ in range(length)]
+        sentences.append(" ".join(words).capitalize() + ".")
+        written += length
+    return " ".join(sentences)
+
+def reference_unique_sentiment_by_tokens(doc, n=10, highest=True):
+    """the original implementation: one TextBlob per token and a full sort"""
+    sentiment_dict = {}
+    for token in doc:
+        if not token.is_stop and not token.is_punct and not token.is_space:
+            key = token.lemma_.lower()
+            sentiment = TextBlob(token.text).sentiment.polarity
+            if key not in sentiment_dict or abs(sentiment) > abs(sentiment_dict[key][1]):
+                sentiment_dict[key] = (token.text, sentiment)
+    sentiment_scores = list(sentiment_dict.values())
+    sentiment_scores.sort(key=lambda x: x[1], reverse=highest)
+    return sentiment_scores[:n]
+
+def timed(func, *args, **kwargs):
+    """run func once and return (result, seconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=200000, help="approximate number of words")
+    args = parser.parse_args()
+    
+    text = make_text(args.words)
+    nlp = ta.get_nlp()
+    nlp.max_length = max(nlp.max_length, len(text) + 1)
+    doc = nlp(text)
+    print(f"document: {len(doc)} tokens")
+    
+    # menu options 4 and 5 before: two full passes with one TextBlob per token
+    (old_high, old_low), old_seconds = timed(lambda: (
+        reference_unique_sentiment_by_tokens(doc, highest=True),
+        reference_unique_sentiment_by_tokens(doc, highest=False)))
+    
+    # after: one memoized pass through the session, ranked with bounded heaps
+    session = ta.AnalysisSession(doc)
+    (new_high, new_low), new_seconds = timed(lambda: (
+        session.unique_sentiment_by_tokens(highest=True),
+        session.unique_sentiment_by_tokens(highest=False)))
+    
+    assert new_high == old_high, "highest sentiment tokens differ from the reference"
+    assert new_low == old_low, "lowest sentiment tokens differ from the reference"
+    
+    print(f"one TextBlob per token (options 4 + 5): {old_seconds:.3f}s")
+    print(f"token sentiment engine (options 4 + 5): {new_seconds:.3f}s")
+    print(f"speedup: {old_seconds / new_seconds:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_analyzer as ta
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """the text_analyzer module with its database and cache directories in a fresh temp directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ta, "DB_NAME", str(tmp_path / "test.db"))
+    ta.init_database()
+    yield ta
+    ta.close_db_connection()
+
+@pytest.fixture
+def sentencizer():
+    """a blank English pipeline with rule-based sentence boundaries, independent of the installed model"""
+    import spacy
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
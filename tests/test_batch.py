@@ -0,0 +1,66 @@
+import csv
+import os
+
+import text_analyzer as ta
+
+def read_summary(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return {row["file_path"]: row for row in csv.DictReader(f)}
+
+def write_files(tmp_path, names):
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        path.write_text(f"{name} is a short file. It has two sentences.", encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+def fail_reports_of(monkeypatch, name):
+    """make writing the report of every file whose name contains name fail"""
+    export = ta.export_analysis_results
+    def failing_export(doc, report_path, **kwargs):
+        if name in os.path.basename(report_path):
+            raise RuntimeError("disk full")
+        return export(doc, report_path, **kwargs)
+    monkeypatch.setattr(ta, "export_analysis_results", failing_export)
+
+def test_a_failing_file_does_not_stop_the_batch(app, tmp_path, monkeypatch):
+    bad, good = write_files(tmp_path, ["bad.txt", "good.txt"])
+    missing = str(tmp_path / "missing.txt")
+    fail_reports_of(monkeypatch, "bad")
+    messages = []
+    
+    result = ta.run_batch([missing, bad, good], ["statistics"], str(tmp_path / "reports"),
+                          say=lambda message, error=False: messages.append((message, error)))
+    assert (result["processed"], result["failed"]) == (1, 2)
+    summary = read_summary(result["summary_path"])
+    assert summary[good]["status"] == "ok" and summary[good]["error"] == ""
+    assert os.path.isfile(summary[good]["report_path"])
+    assert summary[bad]["status"] == "error" and summary[bad]["error"] == "disk full"
+    assert summary[missing]["status"] == "error"
+    assert [error for _, error in messages] == [True, True]
+
+def test_the_cli_exits_non_zero_when_a_file_failed(app, tmp_path, monkeypatch):
+    (tmp_path / "in").mkdir()
+    write_files(tmp_path / "in", ["bad.txt", "good.txt"])
+    output_dir = str(tmp_path / "reports")
+    args = ["batch", str(tmp_path / "in"), "--analyses", "statistics", "--output-dir", output_dir,
+            "--processes", "1", "--quiet"]
+    assert ta.run_cli(args) == 0
+    
+    fail_reports_of(monkeypatch, "bad")
+    assert ta.run_cli(args) == 1
+    statuses = {os.path.basename(path): row["status"]
+                for path, row in read_summary(os.path.join(output_dir, "batch_summary.csv")).items()}
+    assert statuses == {"bad.txt": "error", "good.txt": "ok"}
+
+def test_the_cli_writes_structured_reports(app, tmp_path):
+    (tmp_path / "in").mkdir()
+    write_files(tmp_path / "in", ["one.txt"])
+    output_dir = str(tmp_path / "reports")
+    assert ta.run_cli(["batch", str(tmp_path / "in"), "--analyses", "statistics", "--output-dir", output_dir,
+                       "--processes", "1", "--quiet", "--format", "csv"]) == 0
+    summary = read_summary(os.path.join(output_dir, "batch_summary.csv"))
+    report_paths = [row["report_path"] for row in summary.values()]
+    assert len(report_paths) == 1 and report_paths[0].endswith("_document.csv")
+    assert os.path.isfile(report_paths[0])
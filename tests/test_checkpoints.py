@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+import text_analyzer as ta
+
+ANALYSES = ['tokens', 'statistics']
+MAX_CHARS = 2000
+
+class Killed(Exception):
+    pass
+
+@pytest.fixture
+def text_file(app, tmp_path):
+    path = tmp_path / "long.txt"
+    paragraphs = [f"Paragraph {i} is about rivers, cities and the {i % 7} old bridges. It ends here.\n\n"
+                  for i in range(300)]
+    path.write_text("".join(paragraphs), encoding="utf-8")
+    return str(path)
+
+def count_updates(monkeypatch, fail_after=None):
+    """count accumulated chunks, raising Killed once fail_after chunks were counted"""
+    calls = []
+    update = ta.AnalysisAccumulator.update
+    def counting_update(self, doc):
+        if fail_after is not None and len(calls) == fail_after:
+            raise Killed()
+        calls.append(doc)
+        return update(self, doc)
+    monkeypatch.setattr(ta.AnalysisAccumulator, "update", counting_update)
+    return calls
+
+def test_a_killed_run_resumes_with_the_same_result(text_file, monkeypatch):
+    expected = ta.analyze_file_resumable(text_file, ANALYSES, max_chars=MAX_CHARS, checkpoint_seconds=1e9)
+    total_chunks = len(list(ta.iter_file_chunks(text_file, MAX_CHARS)))
+    
+    with monkeypatch.context() as patch:
+        count_updates(patch, fail_after=3)
+        with pytest.raises(Killed):
+            ta.analyze_file_resumable(text_file, ANALYSES, max_chars=MAX_CHARS, checkpoint_seconds=0)
+    assert len(os.listdir(ta.get_checkpoint_dir())) == 1
+    
+    calls = count_updates(monkeypatch)
+    resumed = ta.analyze_file_resumable(text_file, ANALYSES, max_chars=MAX_CHARS, checkpoint_seconds=0)
+    assert len(calls) == total_chunks - 3
+    assert resumed.to_dict() == expected.to_dict()
+    assert os.listdir(ta.get_checkpoint_dir()) == []
+
+def test_a_changed_file_starts_over(text_file, monkeypatch):
+    with monkeypatch.context() as patch:
+        count_updates(patch, fail_after=2)
+        with pytest.raises(Killed):
+            ta.analyze_file_resumable(text_file, ANALYSES, max_chars=MAX_CHARS, checkpoint_seconds=0)
+    with open(text_file, "a", encoding="utf-8") as f:
+        f.write("One more paragraph.\n")
+    calls = count_updates(monkeypatch)
+    ta.analyze_file_resumable(text_file, ANALYSES, max_chars=MAX_CHARS, checkpoint_seconds=0)
+    assert len(calls) == len(list(ta.iter_file_chunks(text_file, MAX_CHARS)))
+
+@pytest.mark.parametrize("checkpoint_seconds", [None, 0])
+def test_checkpoints_can_be_turned_off(text_file, monkeypatch, checkpoint_seconds):
+    def resumable(*args, **kwargs):
+        raise AssertionError("checkpointing should be off")
+    monkeypatch.setattr(ta, "analyze_file_resumable", resumable)
+    ta.analyze_file_streaming(text_file, ANALYSES, checkpoint_seconds=checkpoint_seconds)
+    monkeypatch.setattr(ta, "CHECKPOINT_SECONDS", checkpoint_seconds)
+    ta.analyze_file_streaming(text_file, ANALYSES)
+    assert not os.path.exists(ta.get_checkpoint_dir())
+
+def test_checkpoints_live_next_to_the_database(app, tmp_path, monkeypatch):
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    path = ta.get_checkpoint_path("notes.txt", "tokens", MAX_CHARS)
+    assert os.path.dirname(path) == os.path.join(os.path.dirname(ta.DB_NAME), ta.CHECKPOINT_DIR)
@@ -0,0 +1,76 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import text_analyzer as ta
+
+def random_vectors(n_files, n_terms, seed=0):
+    """sorted (term ids, counts) per file, some files sharing no terms with the others"""
+    rng = np.random.default_rng(seed)
+    vectors = []
+    for row in range(n_files):
+        size = int(rng.integers(1, n_terms // 2))
+        term_ids = np.sort(rng.choice(n_terms, size=size, replace=False)).astype('<i4') * 3 + 7
+        vectors.append((term_ids, rng.integers(1, 20, size=size).astype('<i4')))
+    vectors.append((np.array([10 ** 6], dtype='<i4'), np.array([4], dtype='<i4')))
+    return vectors
+
+def dense_reference(vectors):
+    """the tf-idf weights and cosine similarities computed on a dense matrix"""
+    term_ids = np.unique(np.concatenate([ids for ids, _ in vectors]))
+    matrix = np.zeros((len(vectors), len(term_ids)))
+    for row, (ids, counts) in enumerate(vectors):
+        matrix[row, np.searchsorted(term_ids, ids)] = counts
+    idf = np.log((1 + len(vectors)) / (1 + (matrix > 0).sum(axis=0))) + 1
+    weights = matrix / matrix.sum(axis=1, keepdims=True) * idf
+    weights /= np.linalg.norm(weights, axis=1, keepdims=True)
+    return term_ids, matrix, weights, weights @ weights.T
+
+@pytest.fixture
+def corpus():
+    vectors = random_vectors(25, 60)
+    return ta.CorpusIndex([f"file{i}" for i in range(len(vectors))], vectors), dense_reference(vectors)
+
+def test_similarities_match_the_dense_computation(corpus):
+    index, (_, _, _, similarities) = corpus
+    for row in range(len(index)):
+        assert np.allclose(index.similarities(row), similarities[row])
+    assert index.similarities(len(index) - 1)[:-1].max() == 0
+
+def test_rankings_match_the_dense_computation(corpus):
+    index, (term_ids, matrix, weights, similarities) = corpus
+    totals = matrix.sum(axis=0)
+    assert [count for _, count in index.frequent_terms(10)] == sorted(totals, reverse=True)[:10]
+    for term_id, count in index.frequent_terms(10):
+        assert totals[np.searchsorted(term_ids, term_id)] == count
+    
+    row = 3
+    expected = sorted(weights[row][weights[row] > 0], reverse=True)[:5]
+    assert np.allclose([weight for _, weight in index.distinctive_terms(row, 5)], expected)
+    
+    pairs = [(similarities[i, j], i, j) for i in range(len(index)) for j in range(i + 1, len(index))
+             if similarities[i, j] > 0]
+    best = sorted(pairs, reverse=True)[:5]
+    found = index.most_similar_pairs(5)
+    assert np.allclose([score for _, _, score in found], [score for score, _, _ in best])
+    assert all(np.isclose(similarities[i, j], score) for i, j, score in found)
+
+def test_a_user_corpus_is_built_from_stored_vectors(app, tmp_path):
+    ta.create_user("reader", "secret")
+    user_id = ta.get_user_id("reader")
+    texts = {"a.txt": Counter(river=3, mill=1), "b.txt": Counter(river=1, water=2), "c.txt": None}
+    for name, counts in texts.items():
+        path = tmp_path / name
+        path.write_text(name)
+        content_hash = ta.compute_content_hash(name)
+        if counts:
+            ta.save_term_vector(content_hash, "lemmas", counts)
+        ta.add_to_history(user_id, str(path), name, content_hash=content_hash)
+    
+    index, files, missing = ta.build_user_corpus(user_id)
+    assert sorted(name for name, _ in files) == ["a.txt", "b.txt"]
+    assert [name for name, _ in missing] == ["c.txt"]
+    terms = ta.get_terms(term_id for term_id, _ in index.frequent_terms())
+    assert {terms[term_id]: count for term_id, count in index.frequent_terms()} == {"river": 4, "water": 2, "mill": 1}
+    assert 0 < index.similarities(0)[1] < 1
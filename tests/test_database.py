@@ -0,0 +1,79 @@
+import threading
+
+import text_analyzer as ta
+
+def run_in_threads(func, count):
+    """call func once on each of count new threads, one after another like menu actions"""
+    for _ in range(count):
+        thread = threading.Thread(target=func)
+        thread.start()
+        thread.join()
+
+def test_threads_share_one_connection(app):
+    ta.create_user("reader", "secret")
+    connections = set()
+    def lookup():
+        with ta.db_connection() as conn:
+            connections.add(id(conn))
+        assert ta.get_user_id("reader") is not None
+    run_in_threads(lookup, 10)
+    assert len(connections) == 1
+    assert len(ta._db_connections) == 1
+
+def test_concurrent_writes_all_land(app):
+    ta.create_user("writer", "secret")
+    user_id = ta.get_user_id("writer")
+    def write(n):
+        for i in range(20):
+            ta.add_many_to_history(user_id, [(f"/files/{n}/{i}.txt", f"{i}.txt", None, None)], [0])
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert ta.count_user_history(user_id) == 80
+
+def test_close_drops_the_shared_connection(app):
+    with ta.db_connection() as conn:
+        pass
+    ta.close_db_connection()
+    assert ta._db_connections == {}
+    with ta.db_connection() as reopened:
+        assert reopened is not conn
+
+def test_a_database_from_before_migrations_is_upgraded(app, tmp_path, monkeypatch):
+    ta.close_db_connection()
+    monkeypatch.setattr(ta, "DB_NAME", str(tmp_path / "legacy.db"))
+    with ta.db_connection() as conn:
+        with conn:
+            # the schema the app created before versioned migrations
+            ta._migrate_create_tables(conn.cursor())
+            conn.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                         ("old", ta.hash_password("secret")))
+            conn.execute("INSERT INTO analysis_history (user_id, filename, file_path, file_size) "
+                         "VALUES (1, 'a.txt', '/files/a.txt', 10)")
+    
+    ta.init_database()
+    ta.init_database()
+    with ta.db_connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(ta.SCHEMA_MIGRATIONS)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(analysis_history)")}
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'doc_cache_key', 'content_hash'} <= columns
+    assert {'analysis_results', 'paragraph_results', 'profile_runs', 'terms', 'term_vectors'} <= tables
+    assert ta.authenticate_user("old", "secret") == 1
+    assert ta.get_user_history(1)[0][:3] == ('a.txt', '/files/a.txt', 10)
+
+def test_history_entries_are_refreshed_not_duplicated(app, tmp_path):
+    ta.create_user("reader", "secret")
+    user_id = ta.get_user_id("reader")
+    path = tmp_path / "notes.txt"
+    path.write_text("short")
+    ta.add_to_history(user_id, str(path), path.name)
+    path.write_text("a little longer")
+    ta.add_to_history(user_id, str(path), path.name, "cache-key", "content-hash")
+    ta.add_to_history(user_id, str(path), path.name)
+    assert ta.count_user_history(user_id) == 1
+    _, _, file_size, _, doc_cache_key = ta.get_user_history(user_id)[0]
+    assert (file_size, doc_cache_key) == (len("a little longer"), "cache-key")
+    assert ta.get_user_history_hashes(user_id) == [(path.name, str(path), "content-hash")]
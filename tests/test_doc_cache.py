@@ -0,0 +1,49 @@
+import os
+
+import text_analyzer as ta
+
+TEXT = "The river runs past the old mill. Children play by the water every summer."
+
+def test_the_key_follows_the_content_and_the_analyzer_version(app, monkeypatch):
+    key = ta.get_doc_cache_key(TEXT)
+    assert ta.get_doc_cache_key(TEXT) == key
+    assert ta.get_doc_cache_key(TEXT + " More.") != key
+    monkeypatch.setattr(ta, "ANALYZER_VERSION", ta.ANALYZER_VERSION + "-next")
+    assert ta.get_doc_cache_key(TEXT) != key
+
+def test_a_cached_doc_is_loaded_with_its_annotations(app, monkeypatch):
+    key = ta.get_doc_cache_key(TEXT)
+    doc = ta.preprocess_text(TEXT, key, ('pos',))
+    assert ta.doc_cache_exists(key)
+    
+    def make_doc(text):
+        raise AssertionError("the doc should come from the cache")
+    monkeypatch.setattr(ta.get_nlp(), "make_doc", make_doc)
+    cached = ta.preprocess_text(TEXT, key, ('pos',))
+    assert [token.pos_ for token in cached] == [token.pos_ for token in doc]
+    assert ta.get_applied_pipes(cached) == ta.get_applied_pipes(doc)
+    
+    # annotations added later are written back to the entry
+    ta.preprocess_text(TEXT, key, ('lemmas',))
+    assert 'lemmatizer' in ta.get_applied_pipes(ta.load_cached_doc(key))
+
+def test_a_corrupt_entry_is_a_miss(app):
+    key = ta.get_doc_cache_key(TEXT)
+    os.makedirs(ta.DOC_CACHE_DIR, exist_ok=True)
+    with open(ta.get_doc_cache_path(key), "wb") as f:
+        f.write(b"not a DocBin")
+    assert ta.load_cached_doc(key) is None
+    assert ta.preprocess_text(TEXT, key, ()).text == TEXT
+    assert ta.load_cached_doc(key).text == TEXT
+
+def test_eviction_drops_the_least_recently_used_entries(app):
+    keys = []
+    for i in range(3):
+        key = ta.get_doc_cache_key(f"{TEXT} {i}")
+        ta.preprocess_text(f"{TEXT} {i}", key, ())
+        os.utime(ta.get_doc_cache_path(key), (1000 + i, 1000 + i))
+        keys.append(key)
+    ta.load_cached_doc(keys[0])  # touched, now the most recent
+    size = os.path.getsize(ta.get_doc_cache_path(keys[0]))
+    assert ta.evict_doc_cache(max_bytes=size * 2) == 1
+    assert [ta.doc_cache_exists(key) for key in keys] == [True, False, True]
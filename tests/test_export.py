@@ -0,0 +1,50 @@
+import csv
+import json
+
+import text_analyzer as ta
+
+TEXT = "The river city wakes early. Markets open, and the teachers walk slowly to school!\n\nIt is a good day."
+
+def expected_tables(text):
+    """the rows of every table, straight from the row generators"""
+    session = ta.AnalysisSession(ta.preprocess_text(text, None, ()))
+    return session, {
+        "document": [row for batch in ta.iter_document_rows(session) for row in batch],
+        "tokens": [row for batch in ta.iter_token_rows(session) for row in batch],
+        "sentences": [row for batch in ta.iter_sentence_rows(session) for row in batch],
+    }
+
+def typed(name, row):
+    """a row read back from text, converted with the table schema"""
+    convert = {"int64": int, "float64": float, "string": str, "bool": lambda value: value == "True"}
+    return tuple(None if value == "" and kind == "float64" else convert[kind](value)
+                 for value, (_, kind) in zip(row, ta.EXPORT_SCHEMAS[name]))
+
+def test_jsonl_round_trip(app, tmp_path):
+    session, expected = expected_tables(TEXT)
+    path = str(tmp_path / "report.jsonl")
+    assert ta.export_structured(None, path, "jsonl", session=session, tables=ta.EXPORT_TABLES) == [path]
+    read = {name: [] for name in expected}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            name = record.pop("record")
+            assert list(record) == [column for column, _ in ta.EXPORT_SCHEMAS[name]]
+            read[name].append(tuple(record.values()))
+    assert read == {name: [tuple(row) for row in rows] for name, rows in expected.items()}
+
+def test_csv_round_trip(app, tmp_path):
+    session, expected = expected_tables(TEXT)
+    paths = ta.export_structured(None, str(tmp_path / "report.csv"), output_format="csv", session=session,
+                                 tables=ta.EXPORT_TABLES)
+    assert paths == [str(tmp_path / f"report_{name}.csv") for name in ("document",) + ta.EXPORT_TABLES]
+    for name, path in zip(("document",) + ta.EXPORT_TABLES, paths):
+        with open(path, encoding="utf-8", newline="") as f:
+            header, *rows = list(csv.reader(f))
+        assert header == [column for column, _ in ta.EXPORT_SCHEMAS[name]]
+        assert [typed(name, row) for row in rows] == [tuple(row) for row in expected[name]]
+
+def test_an_unknown_format_writes_nothing(app, tmp_path):
+    session, _ = expected_tables(TEXT)
+    assert ta.export_structured(None, str(tmp_path / "report.xml"), "xml", session=session) is None
+    assert not list(tmp_path.glob("report*"))
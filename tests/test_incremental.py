@@ -0,0 +1,74 @@
+import text_analyzer as ta
+
+PARAGRAPHS = [f"Paragraph {i} talks about the river city. The markets open early! Teachers walk slowly to school.\n\n"
+              for i in range(12)]
+TEXT = "".join(PARAGRAPHS)
+
+def count_pipe_calls(monkeypatch, components=None):
+    """count the texts that go through nlp.pipe, and record the components enabled for them"""
+    nlp = ta.get_nlp()
+    pipe = nlp.pipe
+    seen = []
+    def counting_pipe(texts, *args, **kwargs):
+        texts = list(texts)
+        seen.extend(texts)
+        if components is not None:
+            components.append(set(nlp.pipe_names))
+        return pipe(texts, *args, **kwargs)
+    monkeypatch.setattr(nlp, "pipe", counting_pipe)
+    return seen
+
+def incremental_session(text):
+    return ta.AnalysisSession(None, load_doc=lambda: (ta.preprocess_text(text, None, ()), None),
+                              accumulate=lambda analyses: ta.analyze_paragraphs(text, analyses))
+
+def test_statistics_only_run_the_components_they_need(app, monkeypatch):
+    components = []
+    seen = count_pipe_calls(monkeypatch, components)
+    session = incremental_session(TEXT)
+    session.text_statistics()
+    session.readability_scores()
+    assert len(seen) == len(PARAGRAPHS)
+    assert components == [set(ta.plan_pipeline(['readability', 'statistics']))]
+    assert not {'tagger', 'parser', 'lemmatizer'} & components[0]
+    assert session.has_result('get_readability_scores')
+    assert not session.has_result('get_token_counts')
+    assert session._doc is None
+
+def test_an_unchanged_paragraph_is_not_annotated_again(app, monkeypatch):
+    components = []
+    seen = count_pipe_calls(monkeypatch, components)
+    incremental_session(TEXT).text_statistics()
+    # a later analysis only runs its own components, and nothing runs for results already stored
+    session = incremental_session(TEXT)
+    session.pos_distribution()
+    session.text_statistics()
+    session.readability_sections()
+    assert len(seen) == 2 * len(PARAGRAPHS)
+    assert components[1] == set(ta.plan_pipeline(['pos']))
+    edited = PARAGRAPHS[:]
+    edited[3] = "A brand new paragraph replaced the old one.\n\n"
+    del seen[:]
+    session = incremental_session("".join(edited))
+    session.pos_distribution()
+    session.text_statistics()
+    # one pass for each of the two analyses, over the changed paragraph only
+    assert seen == [edited[3], edited[3]]
+
+def test_sections_add_up_to_the_statistics(app):
+    session = incremental_session(TEXT)
+    sections = session.readability_sections(section_sentences=7)
+    statistics = session.text_statistics()
+    assert sum(section['words'] for section in sections) == statistics['total_words']
+    assert sum(section['sentences'] for section in sections) == statistics['total_sentences']
+    assert sections[0]['start_char'] == 0 and sections[-1]['end_char'] == len(TEXT)
+    assert all(section['sentences'] >= 7 for section in sections[:-1])
+
+def test_an_edited_text_only_analyzes_changed_paragraphs(app, monkeypatch):
+    ta.analyze_text_incremental(TEXT)
+    seen = count_pipe_calls(monkeypatch)
+    edited = PARAGRAPHS[:]
+    edited[3] = "A brand new paragraph replaced the old one.\n\n"
+    accumulator = ta.analyze_text_incremental("".join(edited))
+    assert seen == [edited[3]]
+    assert accumulator.total_words == ta.analyze_text_incremental("".join(edited)).total_words
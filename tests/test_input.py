@@ -0,0 +1,63 @@
+import bz2
+import gzip
+import lzma
+import mmap
+
+import pytest
+
+import text_analyzer as ta
+
+TEXT = "Café crème, naïve façade — “quoted” text.\r\nA second line\rand a third.\n\n" * 50
+EXPECTED = TEXT.replace("\r\n", "\n").replace("\r", "\n")
+
+@pytest.fixture(params=["plain", "gzip", "bz2", "xz"])
+def text_file(request, tmp_path):
+    data = TEXT.encode("utf-8")
+    compress = {"plain": lambda data: data, "gzip": gzip.compress, "bz2": bz2.compress, "xz": lzma.compress}
+    path = tmp_path / f"input.{request.param}"
+    path.write_bytes(compress[request.param](data))
+    return str(path), request.param
+
+def test_every_input_loads_like_text_mode(text_file):
+    path, _ = text_file
+    assert ta.load_text_file(path) == EXPECTED
+
+def test_small_blocks_decode_the_same_text(text_file):
+    path, _ = text_file
+    # blocks that cut multi-byte characters and \r\n pairs in half
+    for block_size in (1, 7, 64):
+        assert "".join(ta.iter_text_blocks(path, block_size=block_size)) == EXPECTED
+
+def test_plain_files_are_memory_mapped(text_file):
+    path, kind = text_file
+    with ta.open_binary_input(path) as source:
+        assert isinstance(source, mmap.mmap) == (kind == "plain")
+    assert (ta.get_input_size(path) is None) == (kind != "plain")
+
+@pytest.mark.parametrize("encoding", ["utf-16", "utf-8-sig"])
+def test_encodings_with_a_bom_are_detected(tmp_path, encoding):
+    text = "Café crème and naïve façade.\n"
+    path = tmp_path / "encoded.txt"
+    path.write_bytes(text.encode(encoding))
+    assert ta.load_text_file(str(path)) == text
+
+def test_a_legacy_encoding_can_be_given(tmp_path):
+    text = "Café crème and naïve façade.\n"
+    path = tmp_path / "legacy.txt"
+    path.write_bytes(text.encode("cp1252"))
+    assert ta.load_text_file(str(path), encoding="cp1252") == text
+    # a guess for text that is not UTF-8 still reads every character
+    assert len(ta.load_text_file(str(path))) == len(text)
+
+def test_an_empty_file_loads_as_empty_text(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    assert ta.load_text_file(str(path)) == ""
+    assert list(ta.iter_file_chunks(str(path))) == []
+
+def test_chunks_are_paragraph_aligned_and_join_back(text_file):
+    path, _ = text_file
+    chunks = list(ta.iter_file_chunks(path, max_chars=500))
+    assert "".join(chunks) == EXPECTED
+    assert len(chunks) > 1 and all(len(chunk) <= 500 for chunk in chunks)
+    assert all(chunk.endswith("\n\n") for chunk in chunks)
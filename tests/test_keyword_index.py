@@ -0,0 +1,68 @@
+import gc
+import weakref
+
+import text_analyzer as ta
+
+TEXT = "The cats were running home. A cat runs fast, and the old cat ran again.\n\n" * 5
+
+def test_index_keeps_no_reference_to_the_doc(app):
+    doc = ta.preprocess_text(TEXT, None, ('kwic_lemma',))
+    index = ta.build_keyword_index(doc)
+    expected = [ta.build_keyword_index(doc).search("cat", context=2)]
+    ref = weakref.ref(doc)
+    del doc
+    gc.collect()
+    assert ref() is None
+    assert [index.search("cat", context=2)] == expected
+    assert index.count("the old cat") == 5
+
+def test_released_session_still_searches(app):
+    session = ta.AnalysisSession(None, load_doc=lambda: (ta.preprocess_text(TEXT, None, ()), None))
+    session.keyword_index()
+    session.token_table('kwic_lemma')
+    assert session.release_doc()
+    assert session._doc is None
+    results, total = session.keyword_in_context("cat", context=1)
+    assert total == 10
+    assert results[:2] == ["A cat runs", "old cat ran"]
+    _, lemma_total = session.keyword_in_context("cat", lemma=True)
+    assert lemma_total >= total
+    assert session._doc is None
+
+def test_precompute_releases_the_doc_when_done(app, monkeypatch):
+    monkeypatch.setattr(ta, "PRECOMPUTE_TASKS", [(('6',), 'text_statistics', ()), (('11',), 'keyword_index', ())])
+    session = ta.AnalysisSession(None, load_doc=lambda: (ta.preprocess_text(TEXT, None, ()), None))
+    scheduler = ta.start_precompute(session)
+    for thread in scheduler._threads:
+        thread.join()
+    assert scheduler.completed == ['text_statistics', 'keyword_index']
+    assert session._doc is None
+    assert session.keyword_in_context("cats")[1] == 5
+
+def naive_search(doc, query, lemma=False, context=3):
+    """every hit of the query by checking each token position of the doc"""
+    words = [token.text.lower() for token in ta.get_nlp().tokenizer(query) if not token.is_space]
+    results = []
+    for i in range(len(doc) - len(words) + 1):
+        forms = [(token.lemma_ if lemma else token.text).lower() for token in doc[i:i + len(words)]]
+        if forms == words:
+            results.append(' '.join(token.text for token in doc[max(0, i - context):i + len(words) + context]))
+    return results
+
+def test_searches_match_a_scan_of_every_token(app):
+    doc = ta.preprocess_text(TEXT, None, ('kwic_lemma',))
+    index = ta.build_keyword_index(doc)
+    for query, lemma in [("cat", False), ("The", False), ("old cat", False), ("THE OLD CAT", False),
+                         ("cat ran again", False), ("dog", False), ("cat dog", False),
+                         ("run", True), ("cat", True), ("cat run", True)]:
+        for context in (0, 2, 5):
+            expected = naive_search(doc, query, lemma, context)
+            assert index.search(query, lemma, context, limit=None) == (expected, len(expected))
+
+def test_pages_cover_every_hit(app):
+    index = ta.build_keyword_index(ta.preprocess_text(TEXT, None, ()))
+    everything, total = index.search("the", limit=None)
+    pages = [index.search("the", offset=offset, limit=3) for offset in range(0, total + 3, 3)]
+    assert all(page_total == total for _, page_total in pages)
+    assert [result for page, _ in pages for result in page] == everything
+    assert total == 10
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+import text_analyzer as ta
+
+TEXT = "The quick brown fox jumps over the lazy dog. My old friend bought a red car.\n\n" * 10
+
+def tokenized_session():
+    return ta.AnalysisSession(ta.preprocess_text(TEXT, None, ()))
+
+@pytest.mark.parametrize("mode", ["parser", "fast"])
+def test_parallel_counts_match_the_serial_counts(app, monkeypatch, mode):
+    # several chunks, so the work is really split between the worker processes
+    monkeypatch.setattr(ta, "STREAM_CHUNK_CHARS", 200)
+    serial = ta.count_noun_phrases(ta.preprocess_text(TEXT, None, (f"noun_phrases_{mode}",)), mode)
+    assert ta.get_noun_phrase_counts_parallel(TEXT, mode, n_process=1) == serial
+    assert ta.get_noun_phrase_counts_parallel(TEXT, mode, n_process=2) == serial
+
+def test_parallel_counts_are_off_by_default(app):
+    assert ta.NOUN_PHRASE_PARALLEL_MIN_CHARS is None
+    assert not ta.use_parallel_noun_phrases(ta.preprocess_text(TEXT * 1000, None, ()))
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="needs several CPUs")
+def test_long_texts_use_the_parallel_counts(app, monkeypatch):
+    monkeypatch.setattr(ta, "NOUN_PHRASE_PARALLEL_MIN_CHARS", 100)
+    session = tokenized_session()
+    counts = session.run(ta.get_noun_phrase_counts)
+    # the doc was never parsed
+    assert 'parser' not in ta.get_applied_pipes(session.doc)
+    monkeypatch.setattr(ta, "NOUN_PHRASE_PARALLEL_MIN_CHARS", None)
+    assert tokenized_session().run(ta.get_noun_phrase_counts) == counts
+
+def test_annotated_docs_count_in_place(app, monkeypatch):
+    monkeypatch.setattr(ta, "NOUN_PHRASE_PARALLEL_MIN_CHARS", 100)
+    doc = ta.preprocess_text(TEXT, None, ('noun_phrases',))
+    assert not ta.use_parallel_noun_phrases(doc)
@@ -0,0 +1,55 @@
+import pytest
+
+import text_analyzer as ta
+
+TEXT = ("The old city sleeps by the river. Morning markets open early and the teachers walk to school! "
+        "Does anyone remember the garden behind the station? Evening comes slowly over the bridges.\n\n") * 20
+
+@pytest.fixture
+def nlp():
+    nlp = ta.get_nlp()
+    if 'senter' not in nlp.component_names:
+        pytest.skip("the installed model has no senter")
+    return nlp
+
+def sentence_counts(doc):
+    return len(list(doc.sents)), ta.get_token_table(doc).sentence_count()
+
+def test_the_senter_only_stands_in_for_a_skipped_parser(nlp):
+    assert 'senter' in ta.plan_pipeline(['statistics']) and 'parser' not in ta.plan_pipeline(['statistics'])
+    with_parser = ta.plan_pipeline(['statistics', 'noun_phrases_parser'])
+    assert 'parser' in with_parser and 'senter' not in with_parser
+
+def test_a_parser_plan_keeps_the_baseline_sentences(app, nlp):
+    baseline = [sent.start for sent in nlp(TEXT).sents]
+    with ta.planned_pipeline(['statistics', 'noun_phrases_parser']) as pipes:
+        together = nlp(TEXT)
+    ta.set_applied_pipes(together, pipes)
+    statistics_first = ta.preprocess_text(TEXT, "a", ['statistics'])
+    ta.annotate_doc(statistics_first, ['noun_phrases_parser'])
+    parser_first = ta.preprocess_text(TEXT, "b", ['noun_phrases_parser'])
+    ta.annotate_doc(parser_first, ['statistics'])
+    
+    for doc in (together, statistics_first, parser_first):
+        assert [sent.start for sent in doc.sents] == baseline
+        assert sentence_counts(doc) == (len(baseline), len(baseline))
+
+def test_session_table_is_rebuilt_after_the_parser_runs(app, nlp):
+    baseline = len(list(nlp(TEXT).sents))
+    session = ta.AnalysisSession(ta.preprocess_text(TEXT, None, ()))
+    table = session.token_table('statistics')
+    session.require('noun_phrases_parser')
+    assert session.token_table('statistics') is not table
+    assert sentence_counts(session.doc) == (baseline, baseline)
+    
+    other = ta.AnalysisSession(ta.preprocess_text(TEXT, None, ()))
+    other.require('noun_phrases_parser')
+    assert other.text_statistics()['total_sentences'] == baseline
+
+def test_the_first_token_always_starts_a_sentence(sentencizer):
+    doc = sentencizer("One two three. Four five six.")
+    # a senter can mark the first token as inside a sentence
+    doc[0].is_sent_start = False
+    table = ta.get_token_table(doc)
+    assert table.sentence_count() == len(list(doc.sents)) == 2
+    assert table.sentence_word_counts().tolist() == [3, 3]
@@ -0,0 +1,92 @@
+import threading
+
+import text_analyzer as ta
+
+TEXT = "The river city wakes early. Markets open and the teachers walk to school!\n\n" * 5
+TASKS = [(('1',), 'first', ()), (('2',), 'second', ()), (('3', '4'), 'third', ()), (('5',), 'fourth', ())]
+
+class RecordingSession:
+    """a session whose analyses record their order, the first one waits until released"""
+    
+    def __init__(self, fail=()):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+        self.fail = fail
+        self.released_doc = False
+    
+    def __getattr__(self, name):
+        def analysis(*args):
+            if name == 'first':
+                self.started.set()
+                assert self.release.wait(10)
+            self.calls.append(name)
+            if name in self.fail:
+                raise RuntimeError(name)
+        return analysis
+    
+    def has_result(self, name):
+        return True
+    
+    def release_doc(self):
+        self.released_doc = True
+
+def run(scheduler):
+    for thread in scheduler._threads:
+        thread.join(10)
+
+def test_tasks_run_in_priority_order():
+    session = RecordingSession()
+    session.release.set()
+    scheduler = ta.AnalysisScheduler(session, TASKS).start()
+    run(scheduler)
+    assert session.calls == scheduler.completed == ['first', 'second', 'third', 'fourth']
+    assert session.released_doc
+
+def test_a_menu_choice_moves_its_tasks_to_the_front():
+    session = RecordingSession()
+    scheduler = ta.AnalysisScheduler(session, TASKS).start()
+    assert session.started.wait(10)
+    scheduler.prioritize('4')
+    session.release.set()
+    run(scheduler)
+    assert session.calls == ['first', 'third', 'second', 'fourth']
+
+def test_switching_files_cancels_the_pending_tasks():
+    session = RecordingSession()
+    scheduler = ta.AnalysisScheduler(session, TASKS).start()
+    assert session.started.wait(10)
+    scheduler.cancel()
+    assert scheduler.pending_count() == 0
+    session.release.set()
+    run(scheduler)
+    assert session.calls == ['first']
+    assert not session.released_doc
+
+def test_a_failing_task_does_not_stop_the_others():
+    session = RecordingSession(fail=('second',))
+    session.release.set()
+    scheduler = ta.AnalysisScheduler(session, TASKS).start()
+    run(scheduler)
+    assert scheduler.completed == ['first', 'third', 'fourth']
+    assert isinstance(scheduler.failed['second'], RuntimeError)
+
+def test_precomputed_menu_choices_need_no_doc(app):
+    session = ta.AnalysisSession(None, load_doc=lambda: (ta.preprocess_text(TEXT, None, ()), None))
+    scheduler = ta.start_precompute(session)
+    run(scheduler)
+    assert scheduler.completed == [name for _, name, _ in ta.PRECOMPUTE_TASKS] and not scheduler.failed
+    assert session._doc is None
+    def fail_to_load():
+        raise AssertionError("the doc should not be needed")
+    session._load_doc = fail_to_load
+    for _, name, args in ta.PRECOMPUTE_TASKS:
+        getattr(session, name)(*args)
+
+def test_streamed_files_skip_the_choices_they_cannot_show(app):
+    accumulator = ta.analyze_chunks([TEXT])
+    scheduler = ta.start_precompute(ta.AnalysisSession(None, accumulator=accumulator))
+    run(scheduler)
+    expected = [name for choices, name, _ in ta.PRECOMPUTE_TASKS
+                if not set(choices) & ta.STREAMING_UNAVAILABLE_CHOICES]
+    assert scheduler.completed == expected
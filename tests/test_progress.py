@@ -0,0 +1,52 @@
+import json
+import time
+
+import pytest
+
+import text_analyzer as ta
+
+def test_events_follow_the_reported_work():
+    events = []
+    progress = ta.Progress([events.append])
+    progress.start("Counting", 4, "chunks")
+    for _ in range(4):
+        progress.advance()
+    progress.finish()
+    assert [event["event"] for event in events] == ["stage"] + ["progress"] * 4 + ["finish"]
+    assert [event["done"] for event in events[1:5]] == [1, 2, 3, 4]
+    assert all(event["total"] == 4 and event["unit"] == "chunks" for event in events)
+    assert events[-1]["eta"] == 0 and progress.fraction() == 1.0
+    assert json.loads(json.dumps(events)) == events
+
+def test_an_unknown_total_has_no_eta():
+    progress = ta.Progress()
+    progress.start("Reading")
+    progress.advance(10)
+    assert progress.eta() is None and progress.fraction() is None
+
+def test_fast_work_returns_at_once_without_drawing(capsys):
+    started = time.perf_counter()
+    assert ta.run_with_loading_animation(lambda a, b: a + b, 2, 3) == 5
+    assert time.perf_counter() - started < ta.PROGRESS_DRAW_DELAY + 0.5
+    assert capsys.readouterr().out == ""
+    with pytest.raises(KeyError):
+        ta.run_with_loading_animation(lambda: {}["missing"])
+
+def test_streamed_chunks_report_their_bytes(app):
+    chunks = [f"Chunk {i} has a few words. And a second sentence.\n\n" for i in range(5)]
+    events = []
+    progress = ta.Progress([events.append])
+    with ta.reporting_progress(progress):
+        ta.analyze_chunks(chunks, ['tokens'])
+    assert events[-1]["done"] == sum(len(chunk.encode('utf-8')) for chunk in chunks)
+    assert ta.get_progress() is not progress
+
+def test_json_batch_output_is_one_event_per_line(app, tmp_path, capsys):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "one.txt").write_text("A short file. It has two sentences.", encoding="utf-8")
+    assert ta.run_cli(["batch", str(tmp_path / "in"), "--analyses", "statistics", "--processes", "1",
+                       "--output-dir", str(tmp_path / "reports"), "--json"]) == 0
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    kinds = {event["event"] for event in events}
+    assert {"message", "stage", "progress", "summary"} <= kinds
+    assert events[-1]["event"] == "summary" and events[-1]["processed"] == 1
@@ -0,0 +1,23 @@
+import text_analyzer as ta
+
+TEXT = " ".join(f"Sentence number {i} describes a beautiful, complicated river." for i in range(23))
+
+def test_an_empty_text_has_no_sections(sentencizer):
+    doc = sentencizer("")
+    assert ta.get_readability_sections(doc) == []
+    assert set(ta.get_readability_scores(doc).values()) == {0}
+
+def test_sections_cover_the_text_and_add_up_to_the_document(sentencizer):
+    doc = sentencizer(TEXT)
+    sections = ta.get_readability_sections(doc, section_sentences=5)
+    assert [section["sentences"] for section in sections] == [5, 5, 5, 5, 3]
+    assert sections[0]["start_char"] == 0 and sections[-1]["end_char"] == len(TEXT)
+    assert all(a["end_char"] == b["start_char"] for a, b in zip(sections, sections[1:]))
+    
+    table = ta.get_token_table(doc)
+    whole = ta.get_readability_totals(table)[0]
+    parts = ta.get_readability_totals(table, 5)
+    for key in whole:
+        assert sum(part[key] for part in parts) == whole[key]
+    assert sum(section["words"] for section in sections) == whole["total_words"]
+    assert ta.get_readability_scores(doc) == ta.readability_scores(**whole)
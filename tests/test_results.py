@@ -0,0 +1,46 @@
+from collections import Counter
+
+import pytest
+
+import text_analyzer as ta
+
+TEXT = "The river runs past the old mill. Children play by the water every summer.\n\n" * 3
+
+def fail_to_load():
+    raise AssertionError("the doc should not be needed")
+
+def session_for(text, load_doc):
+    return ta.AnalysisSession(None, content_hash=ta.compute_content_hash(text), load_doc=load_doc)
+
+def test_results_survive_the_json_round_trip():
+    value = {"counts": Counter({"river": 2, ("old", "mill"): 1}), ("a", 1): [(1.5, "x"), {"n": None}]}
+    assert ta.decode_result(ta.encode_result(value)) == value
+    assert isinstance(ta.decode_result(ta.encode_result(value))["counts"], Counter)
+
+def test_a_new_session_reuses_stored_results_without_spacy(app):
+    first = session_for(TEXT, lambda: (ta.preprocess_text(TEXT, None, ()), None))
+    statistics = first.text_statistics()
+    tokens = first.most_frequent_tokens(5)
+    first.keyword_index()
+    
+    second = session_for(TEXT, fail_to_load)
+    assert second.text_statistics() == statistics
+    assert second.most_frequent_tokens(5) == tokens
+    assert not second.has_result('build_keyword_index')
+
+def test_stored_results_are_kept_apart_per_analyzer_version(app, monkeypatch):
+    session_for(TEXT, lambda: (ta.preprocess_text(TEXT, None, ()), None)).text_statistics()
+    monkeypatch.setattr(ta, "ANALYZER_VERSION", ta.ANALYZER_VERSION + "-next")
+    assert session_for(TEXT, fail_to_load).stored_result_count() == 0
+
+@pytest.mark.parametrize("in_history", [True, False])
+def test_pruning_keeps_results_of_files_in_the_history(app, tmp_path, in_history):
+    content_hash = ta.compute_content_hash(TEXT)
+    ta.save_analysis_result(content_hash, 'get_text_statistics', (), {"total_words": 1})
+    if in_history:
+        ta.create_user("reader", "secret")
+        path = tmp_path / "notes.txt"
+        path.write_text(TEXT)
+        ta.add_to_history(ta.get_user_id("reader"), str(path), path.name, content_hash=content_hash)
+    ta.prune_analysis_results()
+    assert bool(ta.load_analysis_results(content_hash)) == in_history
@@ -0,0 +1,37 @@
+import pytest
+
+import text_analyzer as ta
+
+REVIEW = ("I bought this blender last month. It arrives in a box with the manual and two jars. "
+          "The motor is powerful and the smoothies come out great. Cleaning it takes about five minutes. "
+          "The lid is not bad, though it sometimes leaks. I use it every morning before work. "
+          "Overall I am very happy with it and would recommend it to friends.")
+
+def test_sentence_mode_matches_textblob_on_the_whole_text(sentencizer):
+    doc = sentencizer(REVIEW)
+    document = ta.get_overall_sentiment(doc, "document")
+    sentence = ta.get_overall_sentiment(doc, "sentence")
+    assert sentence == pytest.approx(document)
+    # the labels option 3 prints must not flip
+    assert sentence[0] > 0.1 and sentence[1] > 0.5
+
+def test_sentences_without_sentiment_words_do_not_dilute_the_score():
+    scored = [(0, 10, 5, 0.8, 0.75, 1), (11, 40, 20, 0.0, 0.0, 0), (41, 60, 8, 0.2, 0.5, 1)]
+    assert ta.combine_sentence_sentiments(scored) == pytest.approx((0.5, 0.625))
+    assert ta.combine_sentence_sentiments([(0, 10, 5, 0.0, 0.0, 0)]) == (0.0, 0.0)
+
+def test_sentiment_by_position_skips_slices_without_sentiment_words():
+    scored = [(0, 10, 3, 0.0, 0.0, 0), (50, 60, 3, 0.5, 0.5, 2)]
+    assert ta.get_sentiment_by_position(scored, 100, buckets=2) == [None, 0.5]
+
+def test_sentence_scores_count_assessments():
+    (polarity, subjectivity, assessments), = ta.score_sentence_words([["not", "bad", "and", "great"]])
+    assert assessments == 2
+    assert polarity > 0
+
+def test_the_default_mode_scores_the_whole_text(app):
+    from textblob import TextBlob
+    session = ta.AnalysisSession(ta.preprocess_text(REVIEW, None, ()))
+    assert ta.SENTIMENT_MODE == "document"
+    assert session.overall_sentiment() == tuple(TextBlob(REVIEW).sentiment)
+    assert not session.has_result('get_sentence_sentiments')
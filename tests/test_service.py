@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+import text_analyzer as ta
+
+def make_request(user_id, text, **options):
+    request = ta.parse_service_request(None, json.dumps({"text": text, **options}).encode())
+    request['user_id'] = user_id
+    return request
+
+@pytest.fixture
+def user_id(app):
+    ta.create_user("client", "secret")
+    return ta.get_user_id("client")
+
+def test_requests_are_validated(app):
+    for body, message in [(b"[1]", "JSON object"), (b'{"text": " "}', "'text'"),
+                          (b'{"text": "hi", "analyses": ["nope"]}', "unknown analyses"),
+                          (b'{"text": "hi", "analyses": ["kwic"]}', "keyword"),
+                          (b'{"text": "hi", "n": -1}', "'n'")]:
+        with pytest.raises(ValueError, match=message):
+            ta.parse_service_request(None, body)
+    request = ta.parse_service_request(None, b'{"text": "hi"}')
+    assert 'kwic' not in request['analyses']
+
+def test_a_batch_answers_every_request_in_order(user_id):
+    texts = ["The cat sat on the mat.", "Dogs bark loudly at night.", "The cat sat on the mat."]
+    requests = [make_request(user_id, text, analyses=["tokens", "statistics"], n=3) for text in texts]
+    responses = ta.process_service_batch(requests)
+    assert [status for status, _ in responses] == [200, 200, 200]
+    assert all(payload['batch_size'] == 3 for _, payload in responses)
+    for (_, payload), text in zip(responses, texts):
+        session = ta.AnalysisSession(ta.preprocess_text(text, None, ('tokens', 'statistics')))
+        expected = ta.SERVICE_ANALYSES['tokens'](session, {'n': 3})
+        assert json.loads(json.dumps(payload['results']['tokens'])) == json.loads(json.dumps(expected))
+        assert payload['results']['statistics']['total_words'] == session.text_statistics()['total_words']
+
+def test_service_texts_stay_out_of_the_history_menu(user_id, tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("A file the user opened.")
+    ta.add_to_history(user_id, str(path), path.name)
+    texts = [f"Service text number {i}." for i in range(5)]
+    ta.process_service_batch([make_request(user_id, text, analyses=["tokens"]) for text in texts])
+    
+    assert ta.count_user_history(user_id) == 1
+    assert [row[1] for row in ta.get_user_history(user_id)] == [str(path)]
+    assert ta.count_user_history(user_id, service=True) == 5
+    assert all(row[1].startswith(ta.SERVICE_HISTORY_PREFIX) for row in ta.get_user_history(user_id, service=True))
+    # still part of the corpus comparison
+    assert len(ta.get_user_history_hashes(user_id)) == 5
+
+def test_analyses_must_be_names(app):
+    for analyses in ([["tokens"]], [{"name": "tokens"}], ["tokens", 1]):
+        with pytest.raises(ValueError, match="list of names"):
+            ta.parse_service_request(None, json.dumps({"text": "hi", "analyses": analyses}).encode())
+
+def test_a_failing_request_gets_a_500_and_keeps_the_connection(user_id, monkeypatch):
+    import asyncio
+    import base64
+    def failing_parse(analyses, body):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(ta, "parse_service_request", failing_parse)
+    auth = base64.b64encode(b"client:secret").decode()
+    
+    async def request(reader, writer, path):
+        writer.write(f"POST {path} HTTP/1.1\r\nAuthorization: Basic {auth}\r\nContent-Length: 2\r\n\r\n{{}}".encode())
+        head = (await reader.readuntil(b"\r\n\r\n")).decode()
+        length = int(head.lower().split("content-length: ")[1].split("\r\n")[0])
+        return int(head.split(" ")[1]), json.loads(await reader.readexactly(length))
+    
+    async def run():
+        ready = asyncio.Event()
+        service = ta.AnalysisService("127.0.0.1", 0)
+        serving = asyncio.ensure_future(service.serve(ready=lambda _: ready.set()))
+        await asyncio.wait_for(ready.wait(), 60)
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.port)
+        try:
+            return [await request(reader, writer, "/analyze"), await request(reader, writer, "/nope")]
+        finally:
+            writer.close()
+            serving.cancel()
+    
+    (status, payload), (second_status, _) = asyncio.run(run())
+    assert status == 500 and "boom" in payload["error"]
+    assert second_status == 404
@@ -0,0 +1,52 @@
+import functools
+
+import text_analyzer as ta
+
+TEXT = ("The new library is wonderful and the staff are very friendly. The old building was dark and cold. "
+        "Readers love the bright reading room! Sadly the cafe closes early.\n\n") * 4
+
+def count_calls(monkeypatch, *names):
+    """count the calls of module level analysis functions, by name"""
+    calls = {name: 0 for name in names}
+    for name in names:
+        func = getattr(ta, name)
+        @functools.wraps(func)
+        def counted(*args, _name=name, _func=func, **kwargs):
+            calls[_name] += 1
+            return _func(*args, **kwargs)
+        monkeypatch.setattr(ta, name, counted)
+    return calls
+
+def test_menu_choices_and_the_export_compute_each_result_once(app, tmp_path, monkeypatch):
+    calls = count_calls(monkeypatch, 'get_token_counts', 'get_text_statistics', 'get_overall_sentiment',
+                        'get_pos_distribution')
+    session = ta.AnalysisSession(ta.preprocess_text(TEXT, None, ()))
+    session.most_frequent_tokens(5)
+    session.most_frequent_tokens(10)
+    session.text_statistics()
+    session.overall_sentiment()
+    session.overall_sentiment()
+    session.pos_distribution()
+    ta.export_analysis_results(session.doc, str(tmp_path / "report.txt"), session=session)
+    assert calls == dict.fromkeys(calls, 1)
+
+def test_results_match_the_plain_functions(app):
+    doc = ta.preprocess_text(TEXT, None, ())
+    session = ta.AnalysisSession(doc)
+    highest = session.unique_sentiment_by_tokens(5)
+    lowest = session.unique_sentiment_by_tokens(5, highest=False)
+    ta.annotate_doc(doc, ['tokens', 'lemmas', 'pos', 'statistics', 'token_sentiment'])
+    assert session.most_frequent_tokens(5) == ta.get_most_frequent_tokens(doc, 5)
+    assert session.most_frequent_lemmas(5) == ta.get_most_frequent_lemmas(doc, 5)
+    assert session.text_statistics() == ta.get_text_statistics(doc)
+    assert session.pos_distribution() == ta.get_pos_distribution(doc)
+    assert highest == ta.get_unique_sentiment_by_tokens(doc, 5)
+    assert lowest == ta.get_unique_sentiment_by_tokens(doc, 5, highest=False)
+    assert highest != lowest
+
+def test_defaults_and_explicit_parameters_share_one_entry(app):
+    session = ta.AnalysisSession(ta.preprocess_text(TEXT, None, ()))
+    assert session.run(ta.get_readability_sections) is session.run(ta.get_readability_sections,
+                                                                   section_sentences=ta.READABILITY_SECTION_SENTENCES)
+    assert session.has_result('get_readability_sections', ('section_sentences', ta.READABILITY_SECTION_SENTENCES))
+    assert not session.has_result('get_readability_sections', ('section_sentences', 2))
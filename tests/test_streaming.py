@@ -0,0 +1,44 @@
+import pytest
+
+import text_analyzer as ta
+
+PARAGRAPHS = [f"Paragraph {i} is about rivers, cities and the {i % 7} old bridges. Mary walked to the market "
+              f"early! Did the teachers enjoy the long summer?\n\n" for i in range(300)]
+TEXT = "".join(PARAGRAPHS)
+
+# chunks are paragraph-aligned, so the counts and totals that only look at tokens and sentences
+# match exactly. the tagger and parser see a few tokens of context across a paragraph break,
+# so POS and noun phrase counts may differ by up to this share of their total
+CONTEXT_TOLERANCE = 0.02
+
+@pytest.fixture
+def results(app, tmp_path, monkeypatch):
+    """(streamed, single doc) results of every analysis a streamed file provides"""
+    path = tmp_path / "long.txt"
+    path.write_text(TEXT, encoding="utf-8")
+    monkeypatch.setattr(ta, "STREAM_CHUNK_CHARS", 3000)
+    accumulator = ta.analyze_file_streaming(str(path), checkpoint_seconds=None)
+    assert accumulator.chunks > 10
+    session = ta.AnalysisSession(ta.preprocess_text(TEXT, None, ()))
+    return {name: (extract(accumulator), session.run(getattr(ta, name)))
+            for name, extract in ta.AnalysisSession.STREAMED_RESULTS.items()}
+
+def test_token_based_results_match_the_single_doc(results):
+    for name in ('get_token_counts', 'get_lemma_counts', 'get_text_statistics'):
+        streamed, single = results[name]
+        assert streamed == single
+    for name in ('get_readability_score', 'get_readability_scores'):
+        streamed, single = results[name]
+        assert streamed == pytest.approx(single)
+
+def test_contextual_counts_match_within_the_tolerance(results):
+    for name in ('get_pos_distribution', 'get_noun_phrase_counts'):
+        streamed, single = results[name]
+        difference = sum(abs(streamed[key] - single[key]) for key in set(streamed) | set(single))
+        assert difference <= CONTEXT_TOLERANCE * sum(single.values())
+
+def test_a_text_too_long_for_one_doc_is_still_analyzed(app, monkeypatch):
+    monkeypatch.setattr(ta.get_nlp(), "max_length", 5000)
+    accumulator = ta.analyze_chunks(ta.split_text_into_chunks(TEXT, 5000), ['tokens', 'statistics'])
+    assert accumulator.total_chars == len(TEXT)
+    assert accumulator.token_counts["bridges"] == len(PARAGRAPHS)
@@ -0,0 +1,43 @@
+from textblob import TextBlob
+
+import text_analyzer as ta
+
+TEXT = ("The wonderful staff were kind, but the food was terrible and the room was awful. "
+        "Great views, good coffee :) and a bad, noisy street. Nice people! Horrible parking, "
+        "happy kids, sad dogs and an excellent, beautiful garden.")
+
+def textblob_ranking(doc, n, highest):
+    """the ranking as it was computed before the engine, one TextBlob per token and a full sort"""
+    sentiment_dict = {}
+    for token in doc:
+        if not token.is_stop and not token.is_punct and not token.is_space:
+            key = token.lemma_.lower()
+            sentiment = TextBlob(token.text).sentiment.polarity
+            if key not in sentiment_dict or abs(sentiment) > abs(sentiment_dict[key][1]):
+                sentiment_dict[key] = (token.text, sentiment)
+    scores = list(sentiment_dict.values())
+    scores.sort(key=lambda x: x[1], reverse=highest)
+    return scores[:n]
+
+def test_rankings_match_one_textblob_per_token(app):
+    doc = ta.preprocess_text(TEXT, None, ('token_sentiment',))
+    for n in (0, 1, 3, 10, 1000):
+        for highest in (True, False):
+            assert ta.get_unique_sentiment_by_tokens(doc, n, highest) == textblob_ranking(doc, n, highest)
+
+def test_scores_match_textblob_and_are_computed_once():
+    engine = ta.TokenSentimentEngine()
+    analyzer = engine._analyzer
+    calls = []
+    engine._analyzer = lambda text: calls.append(text) or analyzer(text)
+    for text in ("good", "Good", "terrible", ":)", ":-(", "table"):
+        assert engine.polarity(text) == TextBlob(text).sentiment.polarity
+        assert engine.polarity(text) == TextBlob(text).sentiment.polarity
+    assert calls == ["good", "Good", "terrible", ":)", ":-(", "table"]
+
+def test_ties_keep_first_seen_order():
+    sentiment_dict = {f"w{i}": (f"w{i}", score) for i, score in enumerate([0.5, -0.5, 0.5, 0.0, -0.5, 0.5])}
+    values = list(sentiment_dict.values())
+    highest, lowest = ta.rank_token_sentiment_extremes(sentiment_dict, 3)
+    assert highest == sorted(values, key=lambda x: x[1], reverse=True)[:3]
+    assert lowest == sorted(values, key=lambda x: x[1])[:3]
@@ -0,0 +1,53 @@
+import gc
+import weakref
+from collections import Counter
+
+import text_analyzer as ta
+
+TEXT = ("The Cats were running home, and the cat ran again!  Dogs bark; dogs BARK loudly.\n\n"
+        "Is it 3 o'clock? \"Yes,\" said the old man -- it is.\n") * 3
+
+def loop_results(doc):
+    """the results as they were computed before the table, one loop over the tokens each"""
+    content = [token for token in doc if not token.is_stop and not token.is_punct and not token.is_space]
+    words = [token for token in doc if not token.is_punct and not token.is_space]
+    return {
+        "tokens": Counter(token.text for token in content),
+        "lemmas": Counter(token.lemma_.lower() for token in content),
+        "pos": Counter(token.pos_ for token in words),
+        "statistics": {
+            "total_characters": len(doc.text),
+            "total_tokens": len([token for token in doc if not token.is_space]),
+            "total_words": len(words),
+            "unique_words": len(set(token.text.lower() for token in words)),
+            "total_sentences": len(list(doc.sents)),
+        },
+    }
+
+def test_counts_match_the_token_loops(app):
+    doc = ta.get_nlp()(TEXT)
+    expected = loop_results(doc)
+    # same keys in the same order, so most_common breaks ties the same way
+    assert list(ta.get_token_counts(doc).items()) == list(expected["tokens"].items())
+    assert list(ta.get_lemma_counts(doc).items()) == list(expected["lemmas"].items())
+    assert list(ta.get_pos_distribution(doc).items()) == list(expected["pos"].items())
+    assert ta.get_most_frequent_tokens(doc, 3) == expected["tokens"].most_common(3)
+    statistics = ta.get_text_statistics(doc)
+    assert {key: statistics[key] for key in expected["statistics"]} == expected["statistics"]
+
+def test_sentence_word_counts_match_doc_sents(sentencizer):
+    doc = sentencizer(TEXT)
+    table = ta.get_token_table(doc)
+    assert table.sentence_word_counts().tolist() == [
+        len([token for token in sent if not token.is_punct and not token.is_space]) for sent in doc.sents]
+
+def test_the_table_outlives_its_doc(sentencizer):
+    doc = sentencizer(TEXT)
+    table = ta.get_token_table(doc)
+    assert ta.get_token_table(doc) is table
+    counts = ta.get_token_counts(doc)
+    ref = weakref.ref(doc)
+    del doc
+    gc.collect()
+    assert ref() is None
+    assert ta.get_token_counts(table) == counts
@@ -0,0 +1,56 @@
+import functools
+import os
+
+import pytest
+
+import text_analyzer as ta
+
+FREQUENCIES = {"river": 12, "city": 9, "bridge": 7, "market": 4, "garden": 2}
+
+def count_renders(monkeypatch):
+    calls = []
+    render = ta.render_wordcloud
+    @functools.wraps(render)
+    def counting_render(frequencies, output_path):
+        calls.append(output_path)
+        return render(frequencies, output_path)
+    monkeypatch.setattr(ta, "render_wordcloud", counting_render)
+    return calls
+
+def test_png_and_svg_are_rendered_headless(app, tmp_path):
+    png = ta.generate_wordcloud(FREQUENCIES, str(tmp_path / "out" / "cloud.png"))
+    svg = ta.generate_wordcloud(FREQUENCIES, str(tmp_path / "cloud.svg"))
+    with open(png, 'rb') as f:
+        assert f.read(8) == b"\x89PNG\r\n\x1a\n"
+    with open(svg, encoding='utf-8') as f:
+        assert f.read().lstrip().startswith("<svg")
+    import matplotlib
+    assert matplotlib.get_backend().lower() == "agg"
+    assert not list(tmp_path.glob("**/*.tmp"))
+    with pytest.raises(ValueError, match="unsupported"):
+        ta.render_wordcloud(FREQUENCIES, str(tmp_path / "cloud.gif"))
+
+def test_images_are_cached_per_content_source_and_settings(app, tmp_path, monkeypatch):
+    calls = count_renders(monkeypatch)
+    first = ta.generate_wordcloud(FREQUENCIES, str(tmp_path / "a.png"), "hash", "tokens")
+    second = ta.generate_wordcloud(FREQUENCIES, str(tmp_path / "b.png"), "hash", "tokens")
+    assert len(calls) == 1
+    with open(first, 'rb') as a, open(second, 'rb') as b:
+        assert a.read() == b.read()
+    
+    ta.generate_wordcloud(FREQUENCIES, str(tmp_path / "c.png"), "hash", "lemmas")
+    ta.generate_wordcloud(FREQUENCIES, str(tmp_path / "d.png"), "other", "tokens")
+    monkeypatch.setitem(ta.WORDCLOUD_SETTINGS, "max_words", 3)
+    ta.generate_wordcloud(FREQUENCIES, str(tmp_path / "e.png"), "hash", "tokens")
+    assert len(calls) == 4
+    assert all(os.path.dirname(path) == ta.WORDCLOUD_CACHE_DIR for path in calls)
+
+def test_a_session_renders_from_its_counts(app, tmp_path, monkeypatch):
+    calls = count_renders(monkeypatch)
+    text = "The river city has a river market by the river bridge."
+    session = ta.AnalysisSession(ta.preprocess_text(text, None, ()))
+    path = session.wordcloud(str(tmp_path / "cloud.png"))
+    assert os.path.isfile(path)
+    session.wordcloud(str(tmp_path / "again.png"))
+    assert len(calls) == 1
+    assert session.has_result('get_token_counts')
@@ -1,25 +1,386 @@
-import spacy
 from collections import Counter
 import sys
 import os
 import time
 import threading
-from textblob import TextBlob
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
-import numpy as np
+import inspect
+import re
+import glob
+import csv
+import argparse
+import heapq
 import sqlite3
 import hashlib
+import codecs
+import mmap
+import importlib
+import importlib.util
+import shutil
+import json
+import functools
+import atexit
+import weakref
 from datetime import datetime
+from contextlib import contextmanager
 
 # database setup
 DB_NAME = "text_analysis.db"
+DB_BUSY_TIMEOUT = 30  # seconds to wait for another writer's lock
+HISTORY_PAGE_SIZE = 20  # rows per history menu page
+HISTORY_WRITE_BATCH = 200  # batch mode history rows per transaction
 
-def init_database():
-    """initialize the database with required tables"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+# instrumentation setup, off unless TEXT_ANALYZER_PROFILE (or --profile) is "1"; "cprofile=<name>"
+# or "tracemalloc=<name>" also captures a profile of every run of that one operation into PROFILE_DIR
+PROFILE_ENV_VAR = "TEXT_ANALYZER_PROFILE"
+PROFILE_DIR = "profiles"
+PROFILE_CAPTURE_MODES = ('cprofile', 'tracemalloc')
+PROFILE_TOP_ALLOCATIONS = 25  # lines written for a tracemalloc capture
+
+# persisted analysis results setup, bump ANALYZER_VERSION whenever an analysis changes its output
+ANALYZER_VERSION = "7"
+UNPERSISTED_RESULTS = {'build_keyword_index'}  # session results that are not stored in the database
+
+# incremental analysis setup: counts are stored per paragraph, so an edited file only re-runs
+# spaCy on its new or changed paragraphs. opt-in, since sentiment, keyword in context and
+# token sentiment still annotate the whole doc
+INCREMENTAL_ANALYSIS = False
+# paragraph analyses stored together, statistics and readability share one senter pass
+PARAGRAPH_RESULT_UNITS = (('tokens',), ('lemmas',), ('pos',), ('readability', 'statistics'), ('noun_phrases',))
+PARAGRAPH_RESULTS_MAX_AGE_DAYS = 90  # drop per-paragraph counts not reused for this long
+PARAGRAPH_QUERY_CHUNK = 500  # paragraph hashes per SQL IN (...) lookup
+
+# spaCy model setup, loaded on a background thread by start_model_warmup
+MODEL_NAME = "en_core_web_sm"
+
+# processed doc cache setup
+DOC_CACHE_DIR = "doc_cache"
+DOC_CACHE_MAX_BYTES = 500 * 1024 * 1024  # evict least recently used docs above this size
+
+# input setup: plain files are memory-mapped, compressed ones decompressed on the fly
+TEXT_FILE_EXTENSIONS = ('.txt', '.txt.gz', '.txt.bz2', '.txt.xz')  # listed by the file picker
+COMPRESSION_MAGIC = {'gzip': b'\x1f\x8b', 'bz2': b'BZh', 'lzma': b'\xfd7zXZ\x00'}  # module: magic bytes
+INPUT_ENCODING = None  # None detects each file's encoding, or force one such as "latin-1"
+ENCODING_SAMPLE_BYTES = 64 * 1024
+READ_BLOCK_BYTES = 1024 * 1024
+
+# streaming analysis setup (used for files larger than spaCy's max_length)
+STREAM_CHUNK_CHARS = 100000
+STREAM_BATCH_SIZE = 4
+PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n\s*')
+SENTENCE_BREAK = re.compile(r'[.!?]["\')\]]*\s+')
+WHITESPACE_BREAK = re.compile(r'\s+')
+STREAMING_UNAVAILABLE_CHOICES = {'3', '4', '5', '11'}  # menu options that need the full doc
+# a streamed file's running totals and read position are checkpointed, so a killed run continues
+# where it stopped the next time the same unchanged file is streamed
+CHECKPOINT_DIR = "checkpoints"  # a relative path is taken from the directory of DB_NAME
+CHECKPOINT_SECONDS = 30  # save at most this often, None or 0 turns checkpoints off
+
+# batch mode setup
+BATCH_SIZE = 8  # documents per nlp.pipe batch
+
+# service mode setup: the model stays loaded behind a localhost HTTP API and
+# concurrent requests are gathered into micro-batches for nlp.pipe
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8750
+SERVICE_MAX_BATCH = 16  # requests per nlp.pipe call
+SERVICE_BATCH_WAIT = 0.005  # seconds the first request of a batch waits for others
+SERVICE_MAX_HEADER_BYTES = 16384
+SERVICE_MAX_BODY_BYTES = 8 * 1024 * 1024
+SERVICE_HISTORY_PREFIX = "service:"  # history file_path of a text sent to the service, followed by its hash
+
+# sentiment setup
+# "document": TextBlob on the whole text, "sentence": spaCy sentences weighted like TextBlob,
+# which also shows sentiment by position in the document
+SENTIMENT_MODE = "document"
+SENTIMENT_PARALLEL_MIN_SENTENCES = 5000  # score sentences in a process pool above this count
+SENTIMENT_POSITION_BUCKETS = 10
+
+# keyword in context setup
+KWIC_PAGE_SIZE = 10
+
+# corpus analytics setup: every analyzed file keeps sparse token and lemma count vectors,
+# so comparing the files of a history never runs spaCy again
+TERM_VECTOR_RESULTS = {'get_token_counts': 'tokens', 'get_lemma_counts': 'lemmas'}
+CORPUS_QUERY_CHUNK = 500  # ids per IN (...) query, below SQLite's variable limit
+CORPUS_TOP_N = 15
+
+# noun phrase setup, "parser": doc.noun_chunks from the dependency parse, "fast": part-of-speech
+# patterns that only need the tagger. stored results are kept apart per mode and normalization
+NOUN_PHRASE_MODE = "parser"
+NOUN_PHRASE_NORMALIZE = None  # None keeps the phrase text, "lower" lowercases it, "lemma" joins lowercased lemmas
+# tag unannotated texts longer than this in worker processes. off (None) until
+# benchmarks/bench_noun_phrases.py shows a gain, the workers fork a process that runs threads
+NOUN_PHRASE_PARALLEL_MIN_CHARS = None
+NOUN_PHRASE_PATTERNS = [
+    # optional determiner or possessive pronoun, any modifiers, ending in a noun
+    [{"TAG": "PRP$", "OP": "?"},
+     {"POS": "DET", "OP": "?"},
+     {"POS": {"IN": ["ADJ", "NUM", "NOUN", "PROPN"]}, "IS_SPACE": False, "OP": "*"},
+     {"POS": {"IN": ["NOUN", "PROPN"]}, "IS_SPACE": False}],
+    # pronouns are noun phrases of their own, as in doc.noun_chunks
+    [{"POS": "PRON", "TAG": {"NOT_IN": ["PRP$"]}, "IS_SPACE": False}],
+]
+
+# background precompute setup: once a file is open, menu analyses are computed while the
+# user reads the menu. (menu choices, session method, args), cheapest and most used first
+PRECOMPUTE_ANALYSES = True
+PRECOMPUTE_WORKERS = 1  # analyses share the session lock, more workers only help when it is free
+PRECOMPUTE_TASKS = [
+    (('6',), 'text_statistics', ()),
+    (('1', '8'), 'most_frequent_tokens', (15,)),
+    (('3',), 'overall_sentiment', ()),
+    (('3',), 'sentiment_by_position', ()),
+    (('7',), 'pos_distribution', ()),
+    (('10',), 'readability_scores', ()),
+    (('10',), 'readability_sections', ()),
+    (('2',), 'most_frequent_lemmas', (15,)),
+    (('4', '5'), 'unique_sentiment_by_tokens', ()),
+    (('11',), 'keyword_index', ()),
+    # the dependency parser is the slowest component, so noun phrases go last
+    (('9',), 'most_common_noun_phrases', ()),
+]
+
+# readability setup
+READABILITY_SECTION_SENTENCES = 100  # sentences per section in the per-section scores
+SYLLABLE_CACHE_SIZE = 200000  # distinct words whose syllable and letter counts are kept
+READABILITY_LABELS = {
+    'flesch_reading_ease': "Flesch Reading Ease",
+    'flesch_kincaid_grade': "Flesch-Kincaid Grade",
+    'gunning_fog': "Gunning Fog Index",
+    'smog': "SMOG Index",
+    'coleman_liau': "Coleman-Liau Index",
+    'ari': "Automated Readability Index",
+}
+
+# word cloud setup, rendered headless from frequency counts and cached per content and settings
+WORDCLOUD_CACHE_DIR = "wordcloud_cache"
+WORDCLOUD_SETTINGS = {
+    'width': 800,
+    'height': 400,
+    'background_color': 'white',
+    'max_words': 200,
+    'random_state': 42,  # fixed layout, so a cached image matches a fresh render
+}
+WORDCLOUD_FORMATS = ('png', 'svg')
+
+# progress reporting setup
+PROGRESS_BAR_WIDTH = 40
+PROGRESS_REFRESH = 0.1  # seconds between redraws of a progress bar
+PROGRESS_DRAW_DELAY = 0.2  # work that finishes sooner never draws a bar
+SENTIMENT_PROGRESS_STEP = 500  # sentences scored between progress updates
+
+# pipeline planner setup: the components each analysis needs on top of the tokenizer,
+# "sentences" resolves to the parser when it runs anyway and to the faster senter otherwise
+TAGGING_COMPONENTS = ['tok2vec', 'tagger', 'attribute_ruler']
+ANALYSIS_COMPONENTS = {
+    'tokens': [],
+    'wordcloud': [],
+    'kwic': [],
+    'statistics': ['sentences'],
+    'readability': ['sentences'],
+    'sentiment': ['sentences'],
+    'pos': TAGGING_COMPONENTS,
+    'lemmas': TAGGING_COMPONENTS + ['lemmatizer'],
+    'token_sentiment': TAGGING_COMPONENTS + ['lemmatizer'],
+    'kwic_lemma': TAGGING_COMPONENTS + ['lemmatizer'],
+    # 'noun_phrases' resolves to one of these by NOUN_PHRASE_MODE
+    'noun_phrases_parser': TAGGING_COMPONENTS + ['parser'],
+    'noun_phrases_fast': TAGGING_COMPONENTS,
+}
+APPLIED_PIPES_KEY = "text_analyzer_applied_pipes"  # doc.user_data entry, kept in the doc cache
+
+_profile_enabled = False
+_profile_capture = None  # (mode, operation name) to capture, or None
+_profile_capturing = False  # profilers can't nest, only one capture runs at a time
+_profile_run_id = None
+_profile_records = []  # (category, name, wall_seconds, cpu_seconds, memory_delta, recorded_at)
+_profile_flushed = 0  # records already written to the database
+_profile_lock = threading.Lock()
+
+def configure_instrumentation(spec):
+    """turn instrumentation on or off from a spec: "1", "cprofile=<name>", "tracemalloc=<name>" or "0" """
+    global _profile_enabled, _profile_capture
+    spec = (spec or "").strip()
+    _profile_enabled = spec.lower() not in ("", "0", "false", "off")
+    _profile_capture = None
+    if _profile_enabled and "=" in spec:
+        mode, name = (part.strip() for part in spec.split("=", 1))
+        if mode.lower() in PROFILE_CAPTURE_MODES:
+            _profile_capture = (mode.lower(), name)
+        else:
+            print(f"Unknown profile capture mode '{mode}', recording timings only.")
+    return _profile_enabled
+
+def instrumentation_enabled():
+    """check whether timings are being recorded"""
+    return _profile_enabled
+
+def get_memory_usage():
+    """return the resident memory of the process in bytes, 0 when it can't be read"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def save_profile_capture(mode, name, profiler):
+    """write a cProfile or tracemalloc capture of one operation to PROFILE_DIR"""
+    import tracemalloc
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    if mode == 'cprofile':
+        path = os.path.join(PROFILE_DIR, f"{name}_{stamp}.prof")
+        profiler.dump_stats(path)
+        return path
+    
+    snapshot = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    path = os.path.join(PROFILE_DIR, f"{name}_{stamp}_memory.txt")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"Peak traced memory: {peak / 1024:.1f} KB\n\n")
+        for stat in snapshot.statistics('lineno')[:PROFILE_TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+    return path
+
+@contextmanager
+def timed(category, name):
+    """record wall time, CPU time and memory delta of the block when instrumentation is on"""
+    global _profile_capturing
+    if not _profile_enabled:
+        yield
+        return
+    
+    capture = None
+    profiler = None
+    if _profile_capture and _profile_capture[1] == name and not _profile_capturing:
+        _profile_capturing = True
+        capture = _profile_capture[0]
+        if capture == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+        else:
+            import tracemalloc
+            tracemalloc.start()
+    
+    start_memory = get_memory_usage()
+    start_cpu = time.thread_time()
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        wall = time.perf_counter() - start
+        # thread time, the work runs on a worker thread next to the progress bar
+        cpu = time.thread_time() - start_cpu
+        record = (category, name, wall, cpu, get_memory_usage() - start_memory,
+                  datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        with _profile_lock:
+            _profile_records.append(record)
+        if capture:
+            try:
+                save_profile_capture(capture, name, profiler)
+            finally:
+                _profile_capturing = False
+
+def instrumented(category):
+    """decorator that times every call of the function under its own name"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _profile_enabled:
+                return func(*args, **kwargs)
+            with timed(category, func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def get_timing_records():
+    """every timing recorded in this run so far"""
+    with _profile_lock:
+        return list(_profile_records)
+
+def summarize_timings(records):
+    """total the records per (category, name), slowest first
+    
+    returns (category, name, calls, wall_seconds, cpu_seconds, memory_delta) tuples
+    """
+    totals = {}
+    for category, name, wall, cpu, memory_delta, _ in records:
+        calls, total_wall, total_cpu, total_memory = totals.get((category, name), (0, 0.0, 0.0, 0))
+        totals[(category, name)] = (calls + 1, total_wall + wall, total_cpu + cpu, total_memory + memory_delta)
+    summary = [(category, name, *values) for (category, name), values in totals.items()]
+    return sorted(summary, key=lambda row: row[3], reverse=True)
+
+def flush_instrumentation():
+    """store the timings recorded since the last flush under this run's id"""
+    global _profile_run_id, _profile_flushed
+    if not _profile_enabled:
+        return
+    with _profile_lock:
+        pending = _profile_records[_profile_flushed:]
+        flushed = len(_profile_records)
+    if not pending:
+        return
+    try:
+        # straight on the connection, so storing timings records no timings of its own
+        with db_connection() as conn:
+            with conn:
+                if _profile_run_id is None:
+                    cursor = conn.execute(
+                        "INSERT INTO profile_runs (command, analyzer_version) VALUES (?, ?)",
+                        (" ".join(sys.argv[1:]) or "interactive", ANALYZER_VERSION))
+                    _profile_run_id = cursor.lastrowid
+                conn.executemany('''
+                INSERT INTO profile_timings
+                (run_id, category, name, wall_seconds, cpu_seconds, memory_delta, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', [(_profile_run_id, *record) for record in pending])
+            _profile_flushed = flushed
+    except Exception as e:
+        print(f"Error saving timings: {e}")
+
+_db_connections = {}  # one long-lived connection per database file, shared by every thread
+_db_lock = threading.RLock()  # a connection is used by one thread at a time
+
+@contextmanager
+def db_connection():
+    """the shared connection to DB_NAME, opened and configured on first use
     
+    worker threads come and go with every menu action, so they all share one
+    connection and hold the lock while they use it
+    """
+    with _db_lock:
+        conn = _db_connections.get(DB_NAME)
+        if conn is None:
+            conn = sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+            # WAL lets the menu read history while a batch run is writing
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            _db_connections[DB_NAME] = conn
+        yield conn
+
+def close_db_connection():
+    """close the shared database connections"""
+    with _db_lock:
+        for conn in _db_connections.values():
+            conn.close()
+        _db_connections.clear()
+
+# exit handlers run last registered first, the timings are flushed before the connection closes
+atexit.register(close_db_connection)
+configure_instrumentation(os.environ.get(PROFILE_ENV_VAR))
+atexit.register(flush_instrumentation)
+
+def _migrate_create_tables(cursor):
     # users table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS users (
@@ -43,111 +404,664 @@ def init_database():
         FOREIGN KEY (user_id) REFERENCES users (id)
     )
     ''')
+
+def _migrate_add_doc_cache_key(cursor):
+    # databases created before the doc cache existed may already have the column
+    cursor.execute("PRAGMA table_info(analysis_history)")
+    columns = [row[1] for row in cursor.fetchall()]
+    if 'doc_cache_key' not in columns:
+        cursor.execute("ALTER TABLE analysis_history ADD COLUMN doc_cache_key TEXT")
+
+def _migrate_add_history_index(cursor):
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_analysis_history_user_date
+    ON analysis_history (user_id, analysis_date DESC)
+    ''')
+
+def _migrate_add_analysis_results(cursor):
+    # history rows point at the content they were last analyzed with
+    cursor.execute("ALTER TABLE analysis_history ADD COLUMN content_hash TEXT")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS analysis_results (
+        content_hash TEXT NOT NULL,
+        analysis TEXT NOT NULL,
+        params TEXT NOT NULL,
+        analyzer_version TEXT NOT NULL,
+        result TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (content_hash, analyzer_version, analysis, params)
+    )
+    ''')
+
+def _migrate_add_profile_tables(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS profile_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        command TEXT,
+        analyzer_version TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS profile_timings (
+        run_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        name TEXT NOT NULL,
+        wall_seconds REAL NOT NULL,
+        cpu_seconds REAL NOT NULL,
+        memory_delta INTEGER,
+        recorded_at TIMESTAMP,
+        FOREIGN KEY (run_id) REFERENCES profile_runs (id)
+    )
+    ''')
+    # trends are looked up per operation
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_profile_timings_name
+    ON profile_timings (category, name, recorded_at)
+    ''')
+
+def _migrate_add_paragraph_results(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS paragraph_results (
+        paragraph_hash TEXT NOT NULL,
+        analyzer_version TEXT NOT NULL,
+        analyses TEXT NOT NULL,
+        accumulator TEXT NOT NULL,
+        used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (paragraph_hash, analyzer_version, analyses)
+    )
+    ''')
+
+def _migrate_add_term_vectors(cursor):
+    # one shared vocabulary, vectors store term ids and counts as packed int32 arrays
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS terms (
+        id INTEGER PRIMARY KEY,
+        term TEXT NOT NULL UNIQUE
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS term_vectors (
+        content_hash TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        analyzer_version TEXT NOT NULL,
+        term_ids BLOB NOT NULL,
+        counts BLOB NOT NULL,
+        total INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (content_hash, kind)
+    )
+    ''')
+
+# schema migrations, applied in order; PRAGMA user_version records how many have run
+SCHEMA_MIGRATIONS = [
+    _migrate_create_tables,
+    _migrate_add_doc_cache_key,
+    _migrate_add_history_index,
+    _migrate_add_analysis_results,
+    _migrate_add_paragraph_results,
+    _migrate_add_profile_tables,
+    _migrate_add_term_vectors,
+]
+
+@instrumented("db")
+def init_database():
+    """initialize the database, bringing its schema up to date"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        
+        for number, migrate in enumerate(SCHEMA_MIGRATIONS[version:], version + 1):
+            with conn:
+                migrate(cursor)
+                # PRAGMA does not take parameters, number is always an int from enumerate
+                cursor.execute(f"PRAGMA user_version = {number}")
     
-    conn.commit()
-    conn.close()
+    prune_analysis_results()
+    prune_paragraph_results()
+    prune_term_vectors()
 
 def hash_password(password):
     """hash a password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+@instrumented("db")
 def create_user(username, password):
     """create a new user in the database"""
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        password_hash = hash_password(password)
-        cursor.execute(
-            "INSERT INTO users (username, password_hash) VALUES (?, ?)",
-            (username, password_hash)
-        )
-        conn.commit()
-        conn.close()
-        return True
+        with db_connection() as conn:
+            password_hash = hash_password(password)
+            with conn:
+                conn.execute(
+                    "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                    (username, password_hash)
+                )
+            return True
     except sqlite3.IntegrityError:
         return False  # Username already exists
     except Exception as e:
         print(f"Error creating user: {e}")
         return False
 
+@instrumented("db")
 def authenticate_user(username, password):
     """authenticate a user"""
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        password_hash = hash_password(password)
-        cursor.execute(
-            "SELECT id FROM users WHERE username = ? AND password_hash = ?",
-            (username, password_hash)
-        )
-        user = cursor.fetchone()
-        conn.close()
-        return user[0] if user else None
+        with db_connection() as conn:
+            password_hash = hash_password(password)
+            user = conn.execute(
+                "SELECT id FROM users WHERE username = ? AND password_hash = ?",
+                (username, password_hash)
+            ).fetchone()
+            return user[0] if user else None
     except Exception as e:
         print(f"Error authenticating user: {e}")
         return None
 
-def add_to_history(user_id, file_path, filename):
+@instrumented("db")
+def get_user_id(username):
+    """look up a user's id by username"""
+    try:
+        with db_connection() as conn:
+            user = conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+            return user[0] if user else None
+    except Exception as e:
+        print(f"Error looking up user: {e}")
+        return None
+
+def add_to_history(user_id, file_path, filename, doc_cache_key=None, content_hash=None):
     """add a file analysis to user's history"""
+    return add_many_to_history(user_id, [(file_path, filename, doc_cache_key, content_hash)])
+
+@instrumented("db")
+def add_many_to_history(user_id, entries, file_sizes=None):
+    """add (file_path, filename, doc_cache_key, content_hash) entries to user's history in one transaction
+    
+    file_sizes gives the sizes for entries that aren't files on disk, like texts sent to the service
+    """
     try:
-        file_size = os.path.getsize(file_path)
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        # use INSERT OR IGNORE to avoid duplicates
-        cursor.execute('''
-        INSERT OR IGNORE INTO analysis_history 
-        (user_id, filename, file_path, file_size) 
-        VALUES (?, ?, ?, ?)
-        ''', (user_id, filename, file_path, file_size))
-        
-        conn.commit()
-        conn.close()
-        return True
+        if file_sizes is None:
+            file_sizes = [os.path.getsize(file_path) for file_path, _, _, _ in entries]
+        rows = [(user_id, filename, file_path, file_size, doc_cache_key, content_hash)
+                for (file_path, filename, doc_cache_key, content_hash), file_size in zip(entries, file_sizes)]
+        with db_connection() as conn:
+            with conn:
+                # a file is listed once per user, re-analyzing it refreshes its size, cache link and content hash
+                conn.executemany('''
+                INSERT INTO analysis_history
+                (user_id, filename, file_path, file_size, doc_cache_key, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, file_path) DO UPDATE SET
+                    file_size = excluded.file_size,
+                    doc_cache_key = COALESCE(excluded.doc_cache_key, doc_cache_key),
+                    content_hash = COALESCE(excluded.content_hash, content_hash)
+                ''', rows)
+            return True
     except Exception as e:
         print(f"Error adding to history: {e}")
         return False
 
-def get_user_history(user_id):
-    """get analysis history for a user"""
+@instrumented("db")
+def get_user_history(user_id, limit=None, offset=0, service=False):
+    """get a page of a user's analyzed files, or with service=True of the texts sent to the service, newest first"""
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('''
-        SELECT filename, file_path, file_size, analysis_date 
-        FROM analysis_history 
-        WHERE user_id = ? 
-        ORDER BY analysis_date DESC
-        ''', (user_id,))
-        
-        history = cursor.fetchall()
-        conn.close()
-        return history
+        with db_connection() as conn:
+            history = conn.execute(f'''
+            SELECT filename, file_path, file_size, analysis_date, doc_cache_key 
+            FROM analysis_history 
+            WHERE user_id = ? AND file_path {"" if service else "NOT "}LIKE ?
+            ORDER BY analysis_date DESC
+            LIMIT ? OFFSET ?
+            ''', (user_id, SERVICE_HISTORY_PREFIX + "%", -1 if limit is None else limit, offset)).fetchall()
+            return history
+    except Exception as e:
+        print(f"Error getting history: {e}")
+        return []
+
+@instrumented("db")
+def get_user_history_hashes(user_id):
+    """(filename, file_path, content_hash) of every history entry with known content, newest first"""
+    try:
+        with db_connection() as conn:
+            return conn.execute('''
+            SELECT filename, file_path, content_hash
+            FROM analysis_history
+            WHERE user_id = ? AND content_hash IS NOT NULL
+            ORDER BY analysis_date DESC
+            ''', (user_id,)).fetchall()
     except Exception as e:
         print(f"Error getting history: {e}")
         return []
 
-# initialize database
-init_database()
+@instrumented("db")
+def count_user_history(user_id, service=False):
+    """count the files in a user's analysis history, or with service=True the texts sent to the service"""
+    try:
+        with db_connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM analysis_history WHERE user_id = ? "
+                                f"AND file_path {'' if service else 'NOT '}LIKE ?",
+                                (user_id, SERVICE_HISTORY_PREFIX + "%")).fetchone()[0]
+    except Exception as e:
+        print(f"Error counting history: {e}")
+        return 0
+
+def get_results_version():
+    """identify the analyzer and model that produced stored results, without loading spaCy"""
+    from importlib import metadata
+    try:
+        model_version = metadata.version(MODEL_NAME)
+    except metadata.PackageNotFoundError:
+        model_version = "unknown"
+    version = f"{ANALYZER_VERSION}:{MODEL_NAME}-{model_version}"
+    if NOUN_PHRASE_MODE != "parser" or NOUN_PHRASE_NORMALIZE:
+        version += f":noun_phrases={NOUN_PHRASE_MODE},{NOUN_PHRASE_NORMALIZE}"
+    return version
+
+def encode_result(value):
+    """convert an analysis result to JSON-safe data, tagging the types JSON would lose"""
+    if isinstance(value, Counter):
+        return {"__counter__": [[encode_result(k), v] for k, v in value.items()]}
+    if isinstance(value, tuple):
+        return {"__tuple__": [encode_result(item) for item in value]}
+    if isinstance(value, list):
+        return [encode_result(item) for item in value]
+    if isinstance(value, dict):
+        return {"__dict__": [[encode_result(k), encode_result(v)] for k, v in value.items()]}
+    return value
+
+def decode_result(value):
+    """rebuild an analysis result from encode_result data"""
+    if isinstance(value, list):
+        return [decode_result(item) for item in value]
+    if isinstance(value, dict):
+        if "__counter__" in value:
+            return Counter({decode_result(k): v for k, v in value["__counter__"]})
+        if "__tuple__" in value:
+            return tuple(decode_result(item) for item in value["__tuple__"])
+        return {decode_result(k): decode_result(v) for k, v in value["__dict__"]}
+    return value
+
+@instrumented("db")
+def load_analysis_results(content_hash):
+    """load every stored result for the content, keyed like AnalysisSession results"""
+    try:
+        with db_connection() as conn:
+            rows = conn.execute('''
+            SELECT analysis, params, result FROM analysis_results
+            WHERE content_hash = ? AND analyzer_version = ?
+            ''', (content_hash, get_results_version())).fetchall()
+            return {(analysis, decode_result(json.loads(params))): decode_result(json.loads(result))
+                    for analysis, params, result in rows}
+    except Exception as e:
+        print(f"Error loading analysis results: {e}")
+        return {}
+
+@instrumented("db")
+def save_analysis_result(content_hash, analysis, params, result):
+    """store one analysis result for the content"""
+    try:
+        with db_connection() as conn:
+            with conn:
+                conn.execute('''
+                INSERT OR REPLACE INTO analysis_results
+                (content_hash, analysis, params, analyzer_version, result)
+                VALUES (?, ?, ?, ?, ?)
+                ''', (content_hash, analysis, json.dumps(encode_result(params)), get_results_version(),
+                      json.dumps(encode_result(result))))
+            return True
+    except Exception as e:
+        print(f"Error saving analysis result: {e}")
+        return False
+
+@instrumented("db")
+def prune_analysis_results():
+    """drop results from other analyzer versions and for content no history entry points at"""
+    try:
+        with db_connection() as conn:
+            with conn:
+                conn.execute('''
+                DELETE FROM analysis_results
+                WHERE analyzer_version != ?
+                OR content_hash NOT IN (
+                    SELECT content_hash FROM analysis_history WHERE content_hash IS NOT NULL
+                )
+                ''', (get_results_version(),))
+            return True
+    except Exception as e:
+        print(f"Error pruning analysis results: {e}")
+        return False
+
+@instrumented("db")
+def load_paragraph_results(paragraph_hashes, analyses_key):
+    """load the stored accumulator data of each paragraph hash that has one, marking them used"""
+    try:
+        with db_connection() as conn:
+            version = get_results_version()
+            hashes = list(dict.fromkeys(paragraph_hashes))
+            stored = {}
+            with conn:
+                for i in range(0, len(hashes), PARAGRAPH_QUERY_CHUNK):
+                    chunk = hashes[i:i + PARAGRAPH_QUERY_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = conn.execute(f'''
+                    SELECT paragraph_hash, accumulator FROM paragraph_results
+                    WHERE analyzer_version = ? AND analyses = ? AND paragraph_hash IN ({placeholders})
+                    ''', (version, analyses_key, *chunk)).fetchall()
+                    conn.execute(f'''
+                    UPDATE paragraph_results SET used_at = CURRENT_TIMESTAMP
+                    WHERE analyzer_version = ? AND analyses = ? AND paragraph_hash IN ({placeholders})
+                    ''', (version, analyses_key, *chunk))
+                    for paragraph_hash, accumulator in rows:
+                        stored[paragraph_hash] = json.loads(accumulator)
+            return stored
+    except Exception as e:
+        print(f"Error loading paragraph results: {e}")
+        return {}
+
+@instrumented("db")
+def save_paragraph_results(entries, analyses_key):
+    """store (paragraph_hash, accumulator data) entries in one transaction"""
+    try:
+        with db_connection() as conn:
+            version = get_results_version()
+            with conn:
+                conn.executemany('''
+                INSERT OR REPLACE INTO paragraph_results
+                (paragraph_hash, analyzer_version, analyses, accumulator)
+                VALUES (?, ?, ?, ?)
+                ''', [(paragraph_hash, version, analyses_key, json.dumps(data)) for paragraph_hash, data in entries])
+            return True
+    except Exception as e:
+        print(f"Error saving paragraph results: {e}")
+        return False
+
+@instrumented("db")
+def prune_paragraph_results():
+    """drop per-paragraph counts from other analyzer versions or not reused for a long time"""
+    try:
+        with db_connection() as conn:
+            with conn:
+                conn.execute('''
+                DELETE FROM paragraph_results
+                WHERE analyzer_version != ? OR used_at < datetime('now', ?)
+                ''', (get_results_version(), f"-{PARAGRAPH_RESULTS_MAX_AGE_DAYS} days"))
+            return True
+    except Exception as e:
+        print(f"Error pruning paragraph results: {e}")
+        return False
+
+def _get_term_ids(conn, terms):
+    """map terms to their vocabulary ids, adding the ones not seen before"""
+    conn.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)", ((term,) for term in terms))
+    ids = {}
+    for i in range(0, len(terms), CORPUS_QUERY_CHUNK):
+        chunk = terms[i:i + CORPUS_QUERY_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        ids.update((term, term_id) for term_id, term in conn.execute(
+            f"SELECT id, term FROM terms WHERE term IN ({placeholders})", chunk))
+    return ids
 
-#loading spacy
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    print("Downloading the 'en_core_web_sm' model for spaCy...")
-    from spacy.cli import download
-    download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+@instrumented("db")
+def save_term_vector(content_hash, kind, counts):
+    """store the token or lemma counts of one content as a sparse vector"""
+    import numpy as np
+    try:
+        with db_connection() as conn:
+            terms = list(counts)
+            with conn:
+                ids = _get_term_ids(conn, terms)
+                # sorted by term id, vectors merge into the corpus matrix without re-sorting
+                pairs = sorted((ids[term], counts[term]) for term in terms)
+                term_ids = np.array([term_id for term_id, _ in pairs], dtype='<i4')
+                values = np.array([count for _, count in pairs], dtype='<i4')
+                conn.execute('''
+                INSERT OR REPLACE INTO term_vectors
+                (content_hash, kind, analyzer_version, term_ids, counts, total)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', (content_hash, kind, get_results_version(), term_ids.tobytes(), values.tobytes(),
+                      int(values.sum())))
+            return True
+    except Exception as e:
+        print(f"Error saving term vector: {e}")
+        return False
+
+@instrumented("db")
+def load_term_vectors(content_hashes, kind):
+    """load the stored (term_ids, counts) arrays of each content hash that has a vector"""
+    import numpy as np
+    try:
+        with db_connection() as conn:
+            version = get_results_version()
+            hashes = list(dict.fromkeys(content_hashes))
+            vectors = {}
+            for i in range(0, len(hashes), CORPUS_QUERY_CHUNK):
+                chunk = hashes[i:i + CORPUS_QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for content_hash, term_ids, counts in conn.execute(f'''
+                SELECT content_hash, term_ids, counts FROM term_vectors
+                WHERE kind = ? AND analyzer_version = ? AND content_hash IN ({placeholders})
+                ''', (kind, version, *chunk)):
+                    vectors[content_hash] = (np.frombuffer(term_ids, dtype='<i4'), np.frombuffer(counts, dtype='<i4'))
+            return vectors
+    except Exception as e:
+        print(f"Error loading term vectors: {e}")
+        return {}
+
+@instrumented("db")
+def backfill_term_vectors(content_hashes, kind):
+    """build vectors from counts stored in analysis_results before vectors existed, return how many"""
+    analysis = next(name for name, vector_kind in TERM_VECTOR_RESULTS.items() if vector_kind == kind)
+    try:
+        with db_connection() as conn:
+            version = get_results_version()
+            rows = []
+            for i in range(0, len(content_hashes), CORPUS_QUERY_CHUNK):
+                chunk = content_hashes[i:i + CORPUS_QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(conn.execute(f'''
+                SELECT content_hash, result FROM analysis_results
+                WHERE analysis = ? AND params = ? AND analyzer_version = ? AND content_hash IN ({placeholders})
+                ''', (analysis, json.dumps(encode_result(())), version, *chunk)).fetchall())
+    except Exception as e:
+        print(f"Error loading stored counts: {e}")
+        return 0
+    for content_hash, result in rows:
+        save_term_vector(content_hash, kind, decode_result(json.loads(result)))
+    return len(rows)
+
+@instrumented("db")
+def prune_term_vectors():
+    """drop term vectors made by another analyzer or model version"""
+    try:
+        with db_connection() as conn:
+            with conn:
+                conn.execute("DELETE FROM term_vectors WHERE analyzer_version != ?", (get_results_version(),))
+            return True
+    except Exception as e:
+        print(f"Error pruning term vectors: {e}")
+        return False
+
+@instrumented("db")
+def get_terms(term_ids):
+    """map vocabulary ids back to their terms"""
+    try:
+        with db_connection() as conn:
+            ids = [int(term_id) for term_id in dict.fromkeys(term_ids)]
+            terms = {}
+            for i in range(0, len(ids), CORPUS_QUERY_CHUNK):
+                chunk = ids[i:i + CORPUS_QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                terms.update(conn.execute(f"SELECT id, term FROM terms WHERE id IN ({placeholders})", chunk))
+            return terms
+    except Exception as e:
+        print(f"Error loading terms: {e}")
+        return {}
+
+_nlp = None
+_nlp_thread = None
+_nlp_lock = threading.Lock()
+
+def load_nlp():
+    """load the spaCy model, downloading it first if it isn't installed"""
+    import spacy
+    try:
+        nlp = spacy.load(MODEL_NAME)
+    except OSError:
+        print(f"Downloading the '{MODEL_NAME}' model for spaCy...")
+        from spacy.cli import download
+        download(MODEL_NAME)
+        nlp = spacy.load(MODEL_NAME)
+    return nlp
+
+def _warm_up_model():
+    """background thread body, load the model into the module cache"""
+    global _nlp
+    try:
+        model = load_nlp()
+    except Exception:
+        # get_nlp retries in the foreground and reports the error there
+        return
+    with _nlp_lock:
+        if _nlp is None:
+            _nlp = model
+
+def start_model_warmup():
+    """start loading the spaCy model on a background thread, so it is ready by the first analysis"""
+    global _nlp_thread
+    with _nlp_lock:
+        if _nlp is None and _nlp_thread is None:
+            _nlp_thread = threading.Thread(target=_warm_up_model, daemon=True)
+            _nlp_thread.start()
+
+def get_nlp():
+    """return the spaCy model, waiting for the background warm-up if it is still running"""
+    global _nlp
+    if _nlp is None:
+        start_model_warmup()
+        _nlp_thread.join()
+        with _nlp_lock:
+            if _nlp is None:
+                _nlp = load_nlp()
+    return _nlp
 
 def clear_screen():
     """clearing the terminal screen"""
     os.system('cls' if os.name == 'nt' else 'clear')
 
-def load_text_file(file_path):
-    """load and return the content of a text file"""
+def detect_compression(file_path):
+    """return the module that decompresses the file (by its magic bytes), None for plain text"""
+    with open(file_path, 'rb') as f:
+        head = f.read(6)
+    for module_name, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return module_name
+    return None
+
+@contextmanager
+def open_binary_input(file_path):
+    """open a file for reading raw bytes: memory-mapped when plain, decompressed on the fly when compressed"""
+    module_name = detect_compression(file_path)
+    if module_name:
+        with importlib.import_module(module_name).open(file_path, 'rb') as f:
+            yield f
+        return
+    with open(file_path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            yield f
+            return
+        with mapped:
+            yield mapped
+
+def detect_encoding(sample):
+    """guess the encoding of a file from its first bytes"""
+    for bom, encoding in ((codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+                          (codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'),
+                          (codecs.BOM_UTF16_BE, 'utf-16')):
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # not final: a character cut off at the end of the sample is fine
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    try:
+        from charset_normalizer import from_bytes
+        match = from_bytes(sample).best()
+        if match is not None:
+            return match.encoding
+    except ImportError:
+        pass
+    return 'cp1252'
+
+def normalize_newlines(text):
+    """translate \r\n and \r line endings to \n, like reading in text mode"""
+    if '\r' not in text:
+        return text
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+def iter_text_blocks(file_path, encoding=None, block_size=READ_BLOCK_BYTES):
+    """yield the decoded text of a plain or compressed file in blocks, never holding the whole file"""
+    for text, _ in iter_text_block_positions(file_path, encoding, block_size):
+        yield text
+
+def iter_text_block_positions(file_path, encoding=None, block_size=READ_BLOCK_BYTES, start=None):
+    """yield (text, position) for each decoded block, position being where the block starts
+    
+    a position holds the byte offset, the encoding, the decoder state and a carried \r,
+    everything needed to decode the rest of the file again from there with start=position
+    """
+    with open_binary_input(file_path) as source:
+        if start is None:
+            offset = 0
+            block = source.read(block_size)
+            encoding = encoding or INPUT_ENCODING or detect_encoding(block[:ENCODING_SAMPLE_BYTES])
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            carried_cr = ''
+        else:
+            # compressed inputs seek by decompressing up to the offset, still far cheaper than spaCy
+            offset = start['offset']
+            encoding = start['encoding']
+            source.seek(offset)
+            block = source.read(block_size)
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            decoder.setstate((bytes.fromhex(start['pending']), start['flag']))
+            carried_cr = '\r' if start['carried_cr'] else ''
+        while True:
+            pending, flag = decoder.getstate()
+            position = {'offset': offset, 'encoding': encoding, 'pending': pending.hex(), 'flag': flag,
+                        'carried_cr': bool(carried_cr)}
+            final = not block
+            text = carried_cr + decoder.decode(block, final=final)
+            # a \r at the end of a block may be the first half of a \r\n
+            carried_cr = '\r' if text.endswith('\r') and not final else ''
+            text = normalize_newlines(text[:-1] if carried_cr else text)
+            if text:
+                yield text, position
+            if final:
+                return
+            offset += len(block)
+            block = source.read(block_size)
+
+def get_input_size(file_path):
+    """return the byte size of a plain file, None for compressed files whose size isn't known up front"""
+    if detect_compression(file_path):
+        return None
+    return os.path.getsize(file_path)
+
+@instrumented("load")
+def load_text_file(file_path, encoding=None):
+    """load and return the content of a text file (plain or compressed, in any detected encoding)"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        with open_binary_input(file_path) as source:
+            if isinstance(source, mmap.mmap):
+                # decode straight from the mapped pages instead of reading a copy of the bytes first
+                encoding = encoding or INPUT_ENCODING or detect_encoding(source[:ENCODING_SAMPLE_BYTES])
+                return normalize_newlines(str(source, encoding, 'replace'))
+        return ''.join(iter_text_blocks(file_path, encoding))
     except FileNotFoundError:
         print(f"Error: The file '{file_path}' was not found.")
         return None
@@ -155,50 +1069,453 @@ def load_text_file(file_path):
         print(f"Error reading file: {e}")
         return None
 
-def preprocess_text(text):
-    """process text with spacy, return the doc object"""
-    return nlp(text)
+def find_chunk_boundary(buffer, max_chars):
+    """return where to cut the buffer, preferring paragraph, then sentence, then word boundaries"""
+    window = buffer[:max_chars]
+    for pattern in (PARAGRAPH_BREAK, SENTENCE_BREAK, WHITESPACE_BREAK):
+        cut = 0
+        for match in pattern.finditer(window):
+            cut = match.end()
+        if cut:
+            return cut
+    # a single "word" longer than the chunk size, cut it anyway
+    return max_chars
+
+def iter_text_chunks(blocks, max_chars=STREAM_CHUNK_CHARS):
+    """regroup an iterable of text blocks into chunks of at most max_chars
+    
+    the chunks concatenate back to the exact input and depend only on the text,
+    not on how it was split into blocks
+    """
+    buffer = ''
+    for block in blocks:
+        buffer += block
+        while len(buffer) > max_chars:
+            cut = find_chunk_boundary(buffer, max_chars)
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+def iter_chunk_positions(blocks, max_chars=STREAM_CHUNK_CHARS, skip=0):
+    """regroup (text, position) blocks into the same chunks as iter_text_chunks, yield (chunk, resume)
+    
+    resume is (position, skip) for the text right after the chunk: the position of the
+    block it starts in and how many characters of that block come before it. passing
+    them back as the start of iter_text_block_positions and skip here gives the chunks
+    that would have followed, because a chunk only depends on the text that follows it
+    """
+    buffer = ''
+    starts = []  # [position, index in buffer where the block starts], negative once its start is cut off
+    
+    def resume(cut):
+        for entry in starts:
+            entry[1] -= cut
+        # keep only the block the rest of the buffer starts in, and the ones after it
+        while len(starts) > 1 and starts[1][1] <= 0:
+            starts.pop(0)
+        return starts[0][0], -starts[0][1]
+    
+    for text, position in blocks:
+        starts.append([position, len(buffer) - skip])
+        buffer += text[skip:]
+        skip = 0
+        while len(buffer) > max_chars:
+            cut = find_chunk_boundary(buffer, max_chars)
+            chunk, buffer = buffer[:cut], buffer[cut:]
+            yield chunk, resume(cut)
+    if buffer:
+        yield buffer, resume(len(buffer))
+
+def split_paragraphs(text):
+    """split text into paragraphs, each keeping its trailing blank lines, so they join back to the text"""
+    paragraphs = []
+    start = 0
+    for match in PARAGRAPH_BREAK.finditer(text):
+        paragraphs.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        paragraphs.append(text[start:])
+    return paragraphs
+
+def split_text_into_chunks(text, max_chars=STREAM_CHUNK_CHARS):
+    """split a string into paragraph-aligned chunks"""
+    return iter_text_chunks([text], max_chars)
+
+def iter_file_chunks(file_path, max_chars=STREAM_CHUNK_CHARS, encoding=None):
+    """read a plain or compressed text file lazily and yield paragraph-aligned chunks"""
+    return iter_text_chunks(iter_text_blocks(file_path, encoding), max_chars)
+
+def needs_streaming(file_path):
+    """check whether a file is too large to process as a single doc"""
+    nlp = get_nlp()
+    size = get_input_size(file_path)
+    if size is not None:
+        # the byte size is an upper bound on the character count
+        return size > nlp.max_length
+    # the decompressed size isn't stored up front, read just past the limit to find out
+    remaining = nlp.max_length + 1
+    with open_binary_input(file_path) as source:
+        while remaining > 0:
+            block = source.read(min(remaining, READ_BLOCK_BYTES))
+            if not block:
+                return False
+            remaining -= len(block)
+    return True
+
+def compute_content_hash(text):
+    """return the SHA-256 hex digest of the text content"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def compute_file_hash(file_path, block_size=1024 * 1024):
+    """return the SHA-256 hex digest of a file's raw bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_doc_cache_key(text):
+    """build the doc cache key from the content hash, the loaded model name/version and the analyzer version"""
+    nlp = get_nlp()
+    model_id = f"{nlp.meta.get('lang', '')}_{nlp.meta.get('name', '')}-{nlp.meta.get('version', '')}"
+    import spacy
+    key_source = f"{compute_content_hash(text)}:{model_id}:spacy-{spacy.__version__}:{ANALYZER_VERSION}"
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+def get_doc_cache_path(cache_key):
+    """return the file path of a doc cache entry"""
+    return os.path.join(DOC_CACHE_DIR, f"{cache_key}.spacy")
+
+def doc_cache_exists(cache_key):
+    """check whether a doc cache entry exists"""
+    return bool(cache_key) and os.path.isfile(get_doc_cache_path(cache_key))
+
+@instrumented("cache")
+def load_cached_doc(cache_key):
+    """load a processed doc from the cache, return None on a miss"""
+    cache_path = get_doc_cache_path(cache_key)
+    if not os.path.isfile(cache_path):
+        return None
+    try:
+        from spacy.tokens import DocBin
+        with open(cache_path, 'rb') as f:
+            doc_bin = DocBin(store_user_data=True).from_bytes(f.read())
+        doc = next(doc_bin.get_docs(get_nlp().vocab))
+        # touch the entry so eviction treats it as recently used
+        os.utime(cache_path, None)
+        return doc
+    except Exception as e:
+        print(f"Error loading cached doc: {e}")
+        return None
+
+@instrumented("cache")
+def save_cached_doc(cache_key, doc):
+    """serialize a processed doc into the cache and enforce the size limit"""
+    try:
+        from spacy.tokens import DocBin
+        os.makedirs(DOC_CACHE_DIR, exist_ok=True)
+        doc_bin = DocBin(store_user_data=True)
+        doc_bin.add(doc)
+        cache_path = get_doc_cache_path(cache_key)
+        # write to a temporary file first so a crash never leaves a partial entry
+        temp_path = f"{cache_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(doc_bin.to_bytes())
+        os.replace(temp_path, cache_path)
+        evict_doc_cache()
+        return True
+    except Exception as e:
+        print(f"Error saving doc to cache: {e}")
+        return False
+
+def evict_doc_cache(max_bytes=None):
+    """remove least recently used cache entries until the cache fits in max_bytes"""
+    if max_bytes is None:
+        max_bytes = DOC_CACHE_MAX_BYTES
+    if not os.path.isdir(DOC_CACHE_DIR):
+        return 0
+    
+    entries = []
+    for name in os.listdir(DOC_CACHE_DIR):
+        if name.endswith('.spacy'):
+            path = os.path.join(DOC_CACHE_DIR, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    
+    total_size = sum(size for _, size, _ in entries)
+    removed = 0
+    # oldest access time first
+    for _, size, path in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        os.remove(path)
+        total_size -= size
+        removed += 1
+    return removed
+
+def preprocess_text(text, cache_key=None, analyses=None):
+    """process text with spacy, return the doc object (loaded from the doc cache when possible)
+    
+    with analyses given, only the pipeline components those analyses need are run,
+    the rest can be added later with annotate_doc
+    """
+    if cache_key is None:
+        cache_key = get_doc_cache_key(text)
+    
+    doc = load_cached_doc(cache_key)
+    if doc is None:
+        nlp = get_nlp()
+        if analyses is None and instrumentation_enabled():
+            # the same steps as nlp(text), timed one component at a time
+            with timed("component", "tokenizer"):
+                doc = nlp.make_doc(text)
+            for name, component in nlp.pipeline:
+                with timed("component", name):
+                    doc = component(doc)
+        elif analyses is None:
+            doc = nlp(text)
+        else:
+            with timed("component", "tokenizer"):
+                doc = nlp.make_doc(text)
+            set_applied_pipes(doc, [])
+            annotate_doc(doc, analyses)
+        save_cached_doc(cache_key, doc)
+    elif analyses is not None:
+        if annotate_doc(doc, analyses):
+            save_cached_doc(cache_key, doc)
+    return doc
+
+def plan_pipeline(analyses):
+    """return the smallest list of pipeline components the analyses need, in pipeline order"""
+    nlp = get_nlp()
+    needed = set()
+    for analysis in analyses:
+        if analysis == 'noun_phrases':
+            analysis = f"noun_phrases_{NOUN_PHRASE_MODE}"
+            if NOUN_PHRASE_NORMALIZE == "lemma":
+                needed.update(ANALYSIS_COMPONENTS['lemmas'])
+        needed.update(ANALYSIS_COMPONENTS.get(analysis, nlp.pipe_names))
+    
+    if 'sentences' in needed:
+        needed.discard('sentences')
+        # the parser's boundaries when it runs anyway, the senter only stands in for a skipped parser
+        if 'parser' not in needed:
+            needed.add('senter' if 'senter' in nlp.component_names else 'parser')
+    return [name for name in nlp.component_names if name in needed]
+
+def get_applied_pipes(doc):
+    """return the pipeline components that have already run on the doc"""
+    # docs made by a plain nlp() call (or cached before the planner existed) ran the default pipeline
+    return list(doc.user_data.get(APPLIED_PIPES_KEY, get_nlp().pipe_names))
+
+def set_applied_pipes(doc, names):
+    """record which pipeline components have run on the doc"""
+    doc.user_data[APPLIED_PIPES_KEY] = list(names)
+
+def annotate_doc(doc, analyses):
+    """run only the missing components the analyses need on the doc, return True if any ran"""
+    nlp = get_nlp()
+    applied = get_applied_pipes(doc)
+    missing = [name for name in plan_pipeline(analyses) if name not in applied]
+    if not missing:
+        return False
+    
+    # listeners read the shared tok2vec output, which the doc cache doesn't keep
+    needs_tok2vec = any(name in ('tagger', 'parser') for name in missing)
+    if needs_tok2vec and 'tok2vec' not in missing and (doc.tensor is None or doc.tensor.size == 0):
+        missing.insert(0, 'tok2vec')
+    
+    progress = get_progress()
+    progress.start("Annotating", len(missing), "components")
+    for name in nlp.component_names:
+        if name in missing:
+            with timed("component", name):
+                doc = nlp.get_pipe(name)(doc)
+            progress.advance()
+    set_applied_pipes(doc, [name for name in nlp.component_names if name in applied or name in missing])
+    return True
+
+_pipeline_lock = threading.RLock()
+
+@contextmanager
+def planned_pipeline(analyses):
+    """temporarily enable exactly the components the analyses need, e.g. around nlp.pipe"""
+    nlp = get_nlp()
+    needed = plan_pipeline(analyses)
+    # the enabled components are shared, so background work and the menu take turns
+    with _pipeline_lock:
+        previously_disabled = list(nlp.disabled)
+        for name in nlp.component_names:
+            if name in needed and name in nlp.disabled:
+                nlp.enable_pipe(name)
+            elif name not in needed and name not in nlp.disabled:
+                nlp.disable_pipe(name)
+        try:
+            yield needed
+        finally:
+            for name in nlp.component_names:
+                if name in previously_disabled and name not in nlp.disabled:
+                    nlp.disable_pipe(name)
+                elif name not in previously_disabled and name in nlp.disabled:
+                    nlp.enable_pipe(name)
 
-def display_loading_animation():
-    """display a loading animation that transitions from red to green"""
-    width = 40
-    duration = 1.5  # seconds
-    steps = 20
-    interval = duration / steps
+class Progress:
+    """progress of one operation, reported by the code doing the work
     
-    for i in range(steps + 1):
-        progress = i / steps
+    the work is split into stages, each with a unit and an optional total;
+    listeners get every change as an event dict with done/total, rate and ETA
+    """
+    
+    def __init__(self, listeners=()):
+        self._lock = threading.Lock()
+        self._listeners = list(listeners)
+        self.stage = ""
+        self.unit = "items"
+        self.total = None
+        self.done = 0
+        self.started = time.perf_counter()
+        self.stage_started = self.started
+    
+    def subscribe(self, listener):
+        """call listener(event) on every change"""
+        self._listeners.append(listener)
+    
+    def start(self, stage, total=None, unit="items"):
+        """begin a new stage of the work, total None when it isn't known up front"""
+        with self._lock:
+            self.stage = stage
+            self.total = total
+            self.unit = unit
+            self.done = 0
+            self.stage_started = time.perf_counter()
+        self._emit("stage")
+    
+    def advance(self, units=1):
+        """record finished units of the current stage"""
+        with self._lock:
+            self.done += units
+        self._emit("progress")
+    
+    def finish(self):
+        """record that the whole operation is done"""
+        self._emit("finish")
+    
+    def rate(self):
+        """units per second in the current stage"""
+        elapsed = time.perf_counter() - self.stage_started
+        return self.done / elapsed if elapsed > 0 else 0.0
+    
+    def eta(self):
+        """estimated seconds left in the current stage, None when it can't be known"""
+        rate = self.rate()
+        if self.total is None or rate <= 0:
+            return None
+        return max(0.0, (self.total - self.done) / rate)
+    
+    def fraction(self):
+        """share of the current stage that is done, None without a total"""
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+    
+    def snapshot(self, event="progress"):
+        """the current state as a JSON-safe event dict"""
+        with self._lock:
+            eta = self.eta()
+            return {
+                "event": event,
+                "stage": self.stage,
+                "unit": self.unit,
+                "done": self.done,
+                "total": self.total,
+                "rate": round(self.rate(), 3),
+                "eta": None if eta is None else round(eta, 3),
+                "elapsed": round(time.perf_counter() - self.started, 3),
+            }
+    
+    def _emit(self, event):
+        if self._listeners:
+            snapshot = self.snapshot(event)
+            for listener in self._listeners:
+                listener(snapshot)
+
+_progress_local = threading.local()  # the Progress each thread's work reports into
+
+def get_progress():
+    """return the progress the current thread reports into, a detached one when nobody watches"""
+    progress = getattr(_progress_local, 'progress', None)
+    return progress if progress is not None else Progress()
+
+@contextmanager
+def reporting_progress(progress):
+    """make work on this thread report into progress"""
+    previous = getattr(_progress_local, 'progress', None)
+    _progress_local.progress = progress
+    try:
+        yield progress
+    finally:
+        _progress_local.progress = previous
+
+def format_progress_bar(snapshot, frame=0):
+    """render a progress event as one colored bar line"""
+    width = PROGRESS_BAR_WIDTH
+    total = snapshot["total"]
+    if total:
+        progress = min(1.0, snapshot["done"] / total)
         filled = int(width * progress)
-        empty = width - filled
-        
-        # calculate color transition 
-        r = int(255 * (1 - progress))
-        g = int(255 * progress)
-        b = 0
-        
-        # create the loading bar with ANSI color codes
-        bar = "█" * filled + "░" * empty
-        color_code = f"\033[38;2;{r};{g};{b}m"
-        reset_code = "\033[0m"
-        
-        # print the loading bar
-        sys.stdout.write(f"\r{color_code}[{bar}] {int(progress*100)}%{reset_code}")
-        sys.stdout.flush()
-        time.sleep(interval)
+        bar = "█" * filled + "░" * (width - filled)
+        detail = f"{int(progress*100)}% {snapshot['done']:,}/{total:,} {snapshot['unit']}"
+        if snapshot["eta"] is not None:
+            detail += f", {snapshot['rate']:,.0f}/s, ETA {snapshot['eta']:.0f}s"
+    else:
+        # unknown total: a block sweeping back and forth along the bar
+        progress = 0.5
+        span = width - 8
+        position = frame % (2 * span)
+        position = position if position < span else 2 * span - position
+        bar = "░" * position + "█" * 8 + "░" * (span - position)
+        detail = f"{snapshot['elapsed']:.1f}s"
+    
+    # calculate color transition from red to green
+    r = int(255 * (1 - progress))
+    g = int(255 * progress)
+    b = 0
+    color_code = f"\033[38;2;{r};{g};{b}m"
+    reset_code = "\033[0m"
+    stage = f"{snapshot['stage']} " if snapshot["stage"] else ""
+    return f"{color_code}[{bar}] {stage}{detail}{reset_code}"
+
+def display_progress(progress, thread, stream=None):
+    """draw the progress bar until the worker thread finishes, return right after it does"""
+    stream = stream or sys.stdout
+    thread.join(PROGRESS_DRAW_DELAY)
+    line_length = 0
+    frame = 0
+    while thread.is_alive():
+        line = format_progress_bar(progress.snapshot(), frame)
+        stream.write("\r" + line.ljust(line_length))
+        stream.flush()
+        line_length = max(line_length, len(line))
+        frame += 1
+        thread.join(PROGRESS_REFRESH)
     
-    # clear the loading line
-    sys.stdout.write("\r" + " " * (width + 10) + "\r")
-    sys.stdout.flush()
+    # clear the progress line
+    if line_length:
+        stream.write("\r" + " " * line_length + "\r")
+        stream.flush()
 
 def run_with_loading_animation(func, *args, **kwargs):
-    """run a function with the loading animation"""
+    """run a function with a progress bar fed by the work itself, returning as soon as it finishes"""
     result = None
     exception = None
+    progress = Progress()
     
     def worker():
         nonlocal result, exception
         try:
-            result = func(*args, **kwargs)
+            with reporting_progress(progress):
+                result = func(*args, **kwargs)
         except Exception as e:
             exception = e
     
@@ -206,8 +1523,8 @@ def run_with_loading_animation(func, *args, **kwargs):
     thread = threading.Thread(target=worker)
     thread.start()
     
-    # display loading animation while the function is running
-    display_loading_animation()
+    # display the progress the function reports while it is running
+    display_progress(progress, thread)
     
     # wait for the thread to complete
     thread.join()
@@ -305,253 +1622,1890 @@ def signup_user():
         return None
 
 def display_history_menu(user_id):
-    """display analysis history for the user"""
-    clear_screen()
-    print("="*60)
-    print("ANALYSIS HISTORY")
-    print("="*60)
-    
-    history = get_user_history(user_id)
-    
-    if not history:
-        print("No analysis history found.")
-        return None
+    """display analysis history for the user, one page at a time
     
-    print(f"{'#':<3} {'Filename':<30} {'Size':<10} {'Date':<15}")
-    print("-"*60)
+    texts sent to the service have no file to re-open, they are only counted
+    here and take part in the corpus comparison
+    """
+    total = count_user_history(user_id)
+    service_total = count_user_history(user_id, service=True)
+    offset = 0
     
-    for i, (filename, file_path, file_size, analysis_date) in enumerate(history, 1):
-        # format file size
-        size_str = f"{file_size/1024:.1f}KB" if file_size < 1024*1024 else f"{file_size/(1024*1024):.1f}MB"
+    while True:
+        clear_screen()
+        print("="*60)
+        print("ANALYSIS HISTORY")
+        print("="*60)
         
-        # format date
-        date_obj = datetime.strptime(analysis_date, '%Y-%m-%d %H:%M:%S')
-        date_str = date_obj.strftime('%Y-%m-%d')
+        history = get_user_history(user_id, HISTORY_PAGE_SIZE, offset)
         
-        print(f"{i:<3} {filename[:28]:<30} {size_str:<10} {date_str:<15}")
-    
-    print("="*60)
-    print("\nEnter the number to re-analyze a file, or 'b' to go back.")
-    
-    while True:
-        choice = input("Your choice: ").strip().lower()
-        if choice == 'b':
+        if not history and not service_total:
+            print("No analysis history found.")
             return None
-        try:
-            index = int(choice) - 1
-            if 0 <= index < len(history):
-                return history[index][1]  # Return file_path
+        
+        print(f"{'#':<5} {'Filename':<28} {'Size':<10} {'Date':<11} {'Cached':<6}")
+        print("-"*60)
+        
+        for i, (filename, file_path, file_size, analysis_date, doc_cache_key) in enumerate(history, offset + 1):
+            # format file size
+            size_str = f"{file_size/1024:.1f}KB" if file_size < 1024*1024 else f"{file_size/(1024*1024):.1f}MB"
+            
+            # format date
+            date_obj = datetime.strptime(analysis_date, '%Y-%m-%d %H:%M:%S')
+            date_str = date_obj.strftime('%Y-%m-%d')
+            
+            cached_str = "yes" if doc_cache_exists(doc_cache_key) else "no"
+            
+            print(f"{i:<5} {filename[:26]:<28} {size_str:<10} {date_str:<11} {cached_str:<6}")
+        
+        print("="*60)
+        if history:
+            print(f"Showing {offset + 1}-{offset + len(history)} of {total}")
+        if service_total:
+            print(f"{service_total} texts sent to the service are not listed, they are included in 'c'.")
+        print("\nEnter the number to re-analyze a file, 'n'/'p' for the next/previous page,")
+        print("'c' to compare all your files, or 'b' to go back.")
+        
+        while True:
+            choice = input("Your choice: ").strip().lower()
+            if choice == 'b':
+                return None
+            if choice == 'c':
+                display_corpus_menu(user_id)
+                break
+            if choice == 'n':
+                if offset + HISTORY_PAGE_SIZE < total:
+                    offset += HISTORY_PAGE_SIZE
+                    break
+                print("This is the last page.")
+                continue
+            if choice == 'p':
+                if offset > 0:
+                    offset = max(0, offset - HISTORY_PAGE_SIZE)
+                    break
+                print("This is the first page.")
+                continue
+            try:
+                index = int(choice) - 1 - offset
+                if 0 <= index < len(history):
+                    return history[index][1]  # Return file_path
+                else:
+                    print("Invalid selection. Please choose a number on this page.")
+            except ValueError:
+                print("Please enter a number, 'n', 'p', 'c' or 'b' to go back.")
+
+def choose_corpus_file(files):
+    """ask for a file of the corpus by number, 'l' lists them, return its row or None"""
+    while True:
+        choice = input(f"File number (1-{len(files)}, 'l' to list, Enter to cancel): ").strip().lower()
+        if not choice:
+            return None
+        if choice == 'l':
+            for i, (filename, file_path) in enumerate(files, 1):
+                print(f"{i:<5} {filename[:26]:<28} {file_path}")
+            continue
+        if choice.isdigit() and 1 <= int(choice) <= len(files):
+            return int(choice) - 1
+        print("Invalid selection.")
+
+def display_corpus_menu(user_id):
+    """compare the files of a user's history from their stored count vectors"""
+    kind = "lemmas"
+    corpora = {}  # built once per kind while the menu is open
+    while True:
+        if kind not in corpora:
+            clear_screen()
+            print("Loading stored count vectors...")
+            corpora[kind] = run_with_loading_animation(build_user_corpus, user_id, kind)
+        index, files, missing = corpora[kind]
+        clear_screen()
+        print("="*60)
+        print(f"CORPUS ANALYTICS ({kind})")
+        print("="*60)
+        print(f"{len(index)} files, {index.term_count()} distinct {kind}")
+        if missing:
+            print(f"{len(missing)} files have no stored counts yet, open them once to include them.")
+        print("\n1. Most frequent terms across all files")
+        print("2. Distinctive terms of a file (TF-IDF)")
+        print("3. Files most similar to a file")
+        print("4. Most similar pairs of files")
+        print(f"5. Switch to {'tokens' if kind == 'lemmas' else 'lemmas'}")
+        print("b. Back")
+        print("="*60)
+        choice = input("Your choice: ").strip().lower()
+        if choice == 'b':
+            return
+        if choice == '5':
+            kind = "tokens" if kind == "lemmas" else "lemmas"
+            continue
+        if choice not in ('1', '2', '3', '4'):
+            continue
+        if not len(index):
+            print("No files with stored counts yet.")
+        elif choice == '1':
+            top = index.frequent_terms()
+            terms = get_terms(term_id for term_id, _ in top)
+            print(f"\nMost frequent {kind} across {len(index)} files:")
+            for i, (term_id, count) in enumerate(top, 1):
+                print(f"{i}. {terms.get(term_id, '?')}: {count}")
+        elif choice == '2':
+            row = choose_corpus_file(files)
+            if row is not None:
+                top = index.distinctive_terms(row)
+                terms = get_terms(term_id for term_id, _ in top)
+                print(f"\nDistinctive {kind} of {files[row][0]}:")
+                for i, (term_id, weight) in enumerate(top, 1):
+                    print(f"{i}. {terms.get(term_id, '?')}: {weight:.3f}")
+        elif choice == '3':
+            row = choose_corpus_file(files)
+            if row is not None:
+                print(f"\nFiles most similar to {files[row][0]}:")
+                for other, score in index.most_similar(row):
+                    print(f"{score:.3f}  {files[other][0]}  ({files[other][1]})")
+        else:
+            print("\nMost similar pairs of files:")
+            for row, other, score in run_with_loading_animation(index.most_similar_pairs):
+                print(f"{score:.3f}  {files[row][0]}  <->  {files[other][0]}")
+        input("\nPress Enter to continue...")
+
+def display_menu(username):
+    """display the menu options"""
+    print("="*60)
+    print(f"TEXT ANALYSIS MENU - Welcome, {username}")
+    print("="*60)
+    print("1.  Display most frequent tokens")
+    print("2.  Display most frequent lemmas")
+    print("3.  Display overall sentiment analysis")
+    print("4.  Display top sentiment value tokens")
+    print("5.  Display lowest sentiment value tokens")
+    print("6.  Display text statistics")
+    print("7.  Display part-of-speech distribution")
+    print("8.  Generate word cloud")
+    print("9.  Display most common noun phrases")
+    print("10. Display readability scores")
+    print("11. Display keyword in context (KWIC)")
+    print("12. Export analysis results to file")
+    print("13. View analysis history")
+    print("14. Analyze new file")
+    print("15. Logout")
+    print("="*60)
+
+
+class TokenTable:
+    """the token attributes the counting analyses read, as one numpy column each
+    
+    built once per doc with doc.to_array, so counts are masks and np.unique calls
+    instead of loops over Token objects. the table keeps no reference to the doc
+    """
+    
+    def __init__(self, doc):
+        import numpy as np
+        from spacy.attrs import ORTH, LOWER, LEMMA, POS, IS_STOP, IS_PUNCT, IS_SPACE, SENT_START, IDX
+        self.strings = doc.vocab.strings
+        self.text_length = len(doc.text)
+        columns = doc.to_array([ORTH, LOWER, LEMMA, POS, IS_STOP, IS_PUNCT, IS_SPACE, SENT_START, IDX])
+        self.orth, self.lower, self.lemma = columns[:, 0], columns[:, 1], columns[:, 2]
+        self.pos = columns[:, 3].astype(np.int32)
+        self.is_stop = columns[:, 4].astype(bool)
+        self.is_punct = columns[:, 5].astype(bool)
+        self.is_space = columns[:, 6].astype(bool)
+        self.idx = columns[:, 8].astype(np.int64)
+        # sentence ids only exist once the senter or parser has run
+        self.sent_ids = None
+        if doc.has_annotation("SENT_START"):
+            starts = columns[:, 7] == 1
+            # the first token always starts a sentence, as in doc.sents, even where the senter says otherwise
+            starts[:1] = True
+            self.sent_ids = np.cumsum(starts, dtype=np.int32) - 1
+        
+        self.words = ~self.is_punct & ~self.is_space
+        self.content_words = self.words & ~self.is_stop
+    
+    def __len__(self):
+        return len(self.orth)
+    
+    def count(self, column, mask, to_key=None):
+        """Counter of the column's strings where mask is set, keys in order of first appearance
+        
+        the order matches counting token by token, so most_common breaks ties the same way
+        """
+        import numpy as np
+        values, first, counts = np.unique(column[mask], return_index=True, return_counts=True)
+        order = np.argsort(first, kind='stable')
+        result = Counter()
+        to_key = to_key or (lambda value: self.strings[value])
+        # keys that only differ before to_key (lemmas in another case) add up
+        for value, count in zip(values[order].tolist(), counts[order].tolist()):
+            result[to_key(value)] += count
+        return result
+    
+    def sentence_count(self):
+        """number of sentences, an error like doc.sents when there are no boundaries"""
+        if self.sent_ids is None:
+            raise ValueError("sentence boundaries unset, run the senter or parser first")
+        return int(self.sent_ids[-1]) + 1 if len(self) else 0
+    
+    def sentence_word_counts(self):
+        """words per sentence (excluding punctuation and whitespace)"""
+        import numpy as np
+        return np.bincount(self.sent_ids[self.words], minlength=self.sentence_count())
+
+_token_tables = weakref.WeakKeyDictionary()
+_token_tables_lock = threading.Lock()
+
+def get_token_table(doc):
+    """return the token table of a doc, built once per doc and set of annotations"""
+    if isinstance(doc, TokenTable):
+        return doc
+    applied = tuple(get_applied_pipes(doc))
+    with _token_tables_lock:
+        entry = _token_tables.get(doc)
+    if entry is None or entry[0] != applied:
+        entry = (applied, TokenTable(doc))
+        with _token_tables_lock:
+            _token_tables[doc] = entry
+    return entry[1]
+
+@instrumented("analysis")
+def get_token_counts(doc):
+    """count tokens (excluding stop words and punctuation)"""
+    table = get_token_table(doc)
+    return table.count(table.orth, table.content_words)
+
+@instrumented("analysis")
+def get_lemma_counts(doc):
+    """count lowercased lemmas (excluding stop words and punctuation)"""
+    table = get_token_table(doc)
+    return table.count(table.lemma, table.content_words, lambda value: table.strings[value].lower())
+
+@instrumented("analysis")
+def get_most_frequent_tokens(doc, n=10):
+    """get the most frequent tokens (excluding stop words and punctuation)"""
+    return get_token_counts(doc).most_common(n)
+
+@instrumented("analysis")
+def get_most_frequent_lemmas(doc, n=10):
+    """get the most frequent lemmas (excluding stop words and punctuation)"""
+    return get_lemma_counts(doc).most_common(n)
+
+@instrumented("analysis")
+def get_overall_sentiment(doc, mode="document"):
+    """calculate overall sentiment of the text using TextBlob"""
+    if mode == "sentence":
+        return combine_sentence_sentiments(get_sentence_sentiments(doc))
+    
+    from textblob import TextBlob
+    text = doc.text
+    blob = TextBlob(text)
+    return blob.sentiment.polarity, blob.sentiment.subjectivity
+
+def score_sentence_words(word_lists):
+    """score lists of lowercased words with TextBlob's lexicon, return (polarity, subjectivity, assessments)
+    
+    assessments is the number of lexicon hits (words or negated/intensified phrases) the
+    sentence scores are averaged over, the weight that makes combined scores match TextBlob
+    """
+    # a word list skips TextBlob's own tokenizer, the words come from spaCy
+    from textblob.en import sentiment as pattern_sentiment
+    scores = []
+    for words in word_lists:
+        score = pattern_sentiment(words)
+        scores.append((score[0], score[1], len(score.assessments)))
+    return scores
+
+@instrumented("analysis")
+def get_sentence_sentiments(doc, n_workers=None):
+    """score every sentence of the doc
+    
+    returns a list of (start_char, end_char, word_count, polarity, subjectivity, assessments)
+    tuples in document order; large docs are scored in a process pool
+    """
+    progress = get_progress()
+    spans = []
+    word_lists = []
+    word_counts = get_token_table(doc).sentence_word_counts().tolist()
+    for sent, word_count in zip(doc.sents, word_counts):
+        words = [token.text.lower() for token in sent if not token.is_space]
+        spans.append((sent.start_char, sent.end_char, word_count))
+        word_lists.append(words)
+    
+    progress.start("Scoring sentences", len(word_lists), "sentences")
+    scores = []
+    if len(word_lists) >= SENTIMENT_PARALLEL_MIN_SENTENCES and (n_workers or os.cpu_count() or 1) > 1:
+        n_workers = n_workers or os.cpu_count()
+        batch = -(-len(word_lists) // (n_workers * 4))
+        batches = [word_lists[i:i + batch] for i in range(0, len(word_lists), batch)]
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            for result in executor.map(score_sentence_words, batches):
+                scores.extend(result)
+                progress.advance(len(result))
+    else:
+        for i in range(0, len(word_lists), SENTIMENT_PROGRESS_STEP):
+            result = score_sentence_words(word_lists[i:i + SENTIMENT_PROGRESS_STEP])
+            scores.extend(result)
+            progress.advance(len(result))
+    
+    return [span + score for span, score in zip(spans, scores)]
+
+def combine_sentence_sentiments(sentence_sentiments):
+    """combine per-sentence scores into one (polarity, subjectivity)
+    
+    each sentence counts by its number of assessments, so like TextBlob on the whole
+    text the result is the mean over every lexicon hit, and sentences without any
+    sentiment words don't pull the score towards 0
+    """
+    total_weight = sum(assessments for *_, assessments in sentence_sentiments)
+    if total_weight == 0:
+        return 0.0, 0.0
+    polarity = sum(assessments * p for _, _, _, p, _, assessments in sentence_sentiments) / total_weight
+    subjectivity = sum(assessments * s for _, _, _, _, s, assessments in sentence_sentiments) / total_weight
+    return polarity, subjectivity
+
+def get_sentiment_by_position(sentence_sentiments, total_chars, buckets=SENTIMENT_POSITION_BUCKETS):
+    """average the sentence polarity over equal slices of the document, None for slices without sentiment words"""
+    weights = [0] * buckets
+    totals = [0.0] * buckets
+    for start_char, _, _, polarity, _, assessments in sentence_sentiments:
+        index = min(buckets - 1, start_char * buckets // max(total_chars, 1))
+        weights[index] += assessments
+        totals[index] += assessments * polarity
+    return [totals[i] / weights[i] if weights[i] else None for i in range(buckets)]
+
+class TokenSentimentEngine:
+    """score single tokens with TextBlob's polarity lexicon, once per distinct form
+    
+    the pattern analyzer behind TextBlob is called directly, so no TextBlob object
+    is built per token, and every score is memoized by the exact token text
+    (the analyzer's tokenizer is case sensitive for emoticons, so lowercasing
+    the key would change some scores)
+    """
+    
+    def __init__(self):
+        from textblob.en import sentiment as pattern_sentiment
+        self._analyzer = pattern_sentiment
+        self._scores = {}
+    
+    def polarity(self, text):
+        """return the polarity TextBlob(text).sentiment.polarity would give"""
+        score = self._scores.get(text)
+        if score is None:
+            score = self._analyzer(text)[0]
+            self._scores[text] = score
+        return score
+
+_token_sentiment_engine = None
+
+def get_token_sentiment_engine():
+    """return the shared token sentiment engine, its cache persists across documents"""
+    global _token_sentiment_engine
+    if _token_sentiment_engine is None:
+        _token_sentiment_engine = TokenSentimentEngine()
+    return _token_sentiment_engine
+
+@instrumented("analysis")
+def get_token_sentiments(doc):
+    """map each lemma to its token with the strongest sentiment value"""
+    sentiment_dict = {}
+    engine = get_token_sentiment_engine()
+    
+    for token in doc:
+        if not token.is_stop and not token.is_punct and not token.is_space:
+            # use lemma to group similar words
+            key = token.lemma_.lower()
+            sentiment = engine.polarity(token.text)
+            
+            # keep the highest absolute sentiment value for each lemma
+            if key not in sentiment_dict or abs(sentiment) > abs(sentiment_dict[key][1]):
+                sentiment_dict[key] = (token.text, sentiment)
+    
+    return sentiment_dict
+
+@instrumented("analysis")
+def get_unique_sentiment_by_tokens(doc, n=10, highest=True):
+    """get unique tokens with highest or lowest sentiment values"""
+    return rank_token_sentiments(get_token_sentiments(doc), n, highest)
+
+def rank_token_sentiments(sentiment_dict, n=10, highest=True):
+    """return the n highest or lowest per-lemma sentiment values"""
+    highest_scores, lowest_scores = rank_token_sentiment_extremes(sentiment_dict, n)
+    return highest_scores if highest else lowest_scores
+
+def rank_token_sentiment_extremes(sentiment_dict, n=10):
+    """return both the n highest and n lowest (token, sentiment) pairs in one pass
+    
+    two bounded heaps replace a full sort; ties keep first-seen order, exactly
+    like a stable sort of the whole list would
+    """
+    highest_heap = []
+    lowest_heap = []
+    if n <= 0:
+        return [], []
+    
+    for index, (text, sentiment) in enumerate(sentiment_dict.values()):
+        # the heap roots are the weakest kept entries, later entries lose ties
+        high_entry = (sentiment, -index, text)
+        low_entry = (-sentiment, -index, text)
+        if len(highest_heap) < n:
+            heapq.heappush(highest_heap, high_entry)
+            heapq.heappush(lowest_heap, low_entry)
+            continue
+        if high_entry > highest_heap[0]:
+            heapq.heapreplace(highest_heap, high_entry)
+        if low_entry > lowest_heap[0]:
+            heapq.heapreplace(lowest_heap, low_entry)
+    
+    highest_scores = [(text, sentiment) for sentiment, _, text in sorted(highest_heap, reverse=True)]
+    lowest_scores = [(text, -sentiment) for sentiment, _, text in sorted(lowest_heap, reverse=True)]
+    return highest_scores, lowest_scores
+
+@instrumented("analysis")
+def get_text_statistics(doc):
+    """get comprehensive text statistics"""
+    import numpy as np
+    table = get_token_table(doc)
+    total_tokens = int(np.count_nonzero(~table.is_space))
+    total_words = int(np.count_nonzero(table.words))
+    unique_words = len(np.unique(table.lower[table.words]))
+    return build_text_statistics(table.text_length, total_tokens, total_words, unique_words,
+                                 table.sentence_count())
+
+def build_text_statistics(total_chars, total_tokens, total_words, unique_words, total_sentences):
+    """assemble the text statistics from raw totals"""
+    avg_sentence_length = total_words / total_sentences if total_sentences > 0 else 0
+    lexical_diversity = unique_words / total_words if total_words > 0 else 0
+    
+    return {
+        "total_characters": total_chars,
+        "total_tokens": total_tokens,
+        "total_words": total_words,
+        "unique_words": unique_words,
+        "total_sentences": total_sentences,
+        "avg_sentence_length": avg_sentence_length,
+        "lexical_diversity": lexical_diversity
+    }
+
+@instrumented("analysis")
+def get_pos_distribution(doc):
+    """get distribution of parts of speech"""
+    table = get_token_table(doc)
+    return table.count(table.pos, table.words)
+
+def get_wordcloud_cache_path(content_hash, source, image_format):
+    """return the image cache path for the content, frequency source, format and settings"""
+    settings = ",".join(f"{key}={value}" for key, value in sorted(WORDCLOUD_SETTINGS.items()))
+    key_source = f"{content_hash}:{source}:{settings}:{ANALYZER_VERSION}"
+    cache_key = hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+    return os.path.join(WORDCLOUD_CACHE_DIR, f"{cache_key}.{image_format}")
+
+@instrumented("render")
+def render_wordcloud(frequencies, output_path):
+    """render a word cloud from {word: count} frequencies to a PNG or SVG file"""
+    image_format = os.path.splitext(output_path)[1].lstrip('.').lower()
+    if image_format not in WORDCLOUD_FORMATS:
+        raise ValueError(f"unsupported word cloud format '{image_format}', use one of: {', '.join(WORDCLOUD_FORMATS)}")
+    
+    # imported here, matplotlib and wordcloud are slow to import and rarely needed;
+    # Agg never opens a window, so this also works on servers without a display
+    import matplotlib
+    matplotlib.use("Agg")
+    from wordcloud import WordCloud
+    
+    # the counts are already filtered, no need to join them into a text for WordCloud to re-tokenize
+    wordcloud = WordCloud(**WORDCLOUD_SETTINGS).generate_from_frequencies(frequencies)
+    
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    # write to a temporary file first so a crash never leaves a partial image
+    temp_path = f"{output_path}.tmp"
+    if image_format == 'svg':
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(wordcloud.to_svg())
+    else:
+        wordcloud.to_image().save(temp_path, format='PNG')
+    os.replace(temp_path, output_path)
+    return output_path
+
+def generate_wordcloud(frequencies, output_path, content_hash=None, source="tokens"):
+    """write a word cloud image to output_path, reusing the cached image for the same content and settings"""
+    if not content_hash:
+        return render_wordcloud(frequencies, output_path)
+    
+    image_format = os.path.splitext(output_path)[1].lstrip('.').lower()
+    cache_path = get_wordcloud_cache_path(content_hash, source, image_format)
+    if not os.path.isfile(cache_path):
+        render_wordcloud(frequencies, cache_path)
+    if os.path.abspath(cache_path) != os.path.abspath(output_path):
+        shutil.copyfile(cache_path, output_path)
+    return output_path
+
+@instrumented("analysis")
+def get_noun_phrase_counts(doc):
+    """count the noun phrases in the doc"""
+    return count_noun_phrases(doc, NOUN_PHRASE_MODE, NOUN_PHRASE_NORMALIZE)
+
+_noun_phrase_matcher = None
+_noun_phrase_matcher_lock = threading.Lock()
+
+def get_noun_phrase_matcher():
+    """return the shared Matcher holding NOUN_PHRASE_PATTERNS"""
+    global _noun_phrase_matcher
+    if _noun_phrase_matcher is None:
+        with _noun_phrase_matcher_lock:
+            if _noun_phrase_matcher is None:
+                from spacy.matcher import Matcher
+                matcher = Matcher(get_nlp().vocab)
+                matcher.add("NOUN_PHRASE", NOUN_PHRASE_PATTERNS)
+                _noun_phrase_matcher = matcher
+    return _noun_phrase_matcher
+
+def match_noun_phrases(doc):
+    """find noun phrases with part-of-speech patterns, no dependency parse needed"""
+    from spacy.util import filter_spans
+    spans = [doc[start:end] for _, start, end in get_noun_phrase_matcher()(doc)]
+    # the longest match wins where patterns overlap, like one chunk per noun
+    return filter_spans(spans)
+
+def normalize_noun_phrase(span, normalize=None):
+    """the counted form of a noun phrase span"""
+    if normalize == "lower":
+        return span.text.lower()
+    if normalize == "lemma":
+        return " ".join(token.lemma_.lower() for token in span)
+    return span.text
+
+def count_noun_phrases(doc, mode="parser", normalize=None):
+    """count the doc's noun phrases from the parse or the fast patterns"""
+    spans = doc.noun_chunks if mode == "parser" else match_noun_phrases(doc)
+    return Counter(normalize_noun_phrase(span, normalize) for span in spans)
+
+@instrumented("analysis")
+def get_noun_phrase_counts_parallel(text, mode=None, normalize=None, n_process=None, batch_size=STREAM_BATCH_SIZE):
+    """count noun phrases over paragraph-aligned chunks of the text, tagged in worker processes"""
+    mode = mode or NOUN_PHRASE_MODE
+    nlp = get_nlp()
+    analyses = [f"noun_phrases_{mode}"] + (['lemmas'] if normalize == "lemma" else [])
+    chunks = list(split_text_into_chunks(text, min(STREAM_CHUNK_CHARS, nlp.max_length)))
+    n_process = min(n_process or os.cpu_count() or 1, len(chunks)) or 1
+    
+    counts = Counter()
+    progress = get_progress()
+    progress.start("Extracting noun phrases", len(chunks), "chunks")
+    with planned_pipeline(analyses):
+        for doc in nlp.pipe(chunks, n_process=n_process, batch_size=batch_size):
+            counts.update(count_noun_phrases(doc, mode, normalize))
+            progress.advance()
+    return counts
+
+def use_parallel_noun_phrases(doc):
+    """check whether the doc's noun phrases should be counted with get_noun_phrase_counts_parallel
+    
+    only pays off for long texts the pipeline still has to tag (or parse) and with several CPUs
+    """
+    if NOUN_PHRASE_PARALLEL_MIN_CHARS is None or len(doc.text) < NOUN_PHRASE_PARALLEL_MIN_CHARS:
+        return False
+    if (os.cpu_count() or 1) < 2:
+        return False
+    return not set(plan_pipeline(['noun_phrases'])) <= set(get_applied_pipes(doc))
+
+@instrumented("analysis")
+def get_most_common_noun_phrases(doc, n=10):
+    """extract the most common noun phrases"""
+    return get_noun_phrase_counts(doc).most_common(n)
+
+@instrumented("analysis")
+def get_readability_score(doc):
+    """calculate approximate readability score"""
+    return get_readability_scores(doc)['flesch_reading_ease']
+
+@instrumented("analysis")
+def get_readability_scores(doc):
+    """every readability metric of the doc, from one pass over its token table"""
+    return readability_scores(**get_readability_totals(get_token_table(doc))[0])
+
+@instrumented("analysis")
+def get_readability_sections(doc, section_sentences=READABILITY_SECTION_SENTENCES):
+    """readability metrics per block of section_sentences sentences
+    
+    returns a dict per section with its char range, word and sentence totals and the scores
+    """
+    import numpy as np
+    table = get_token_table(doc)
+    if not len(table):
+        return []
+    sections = []
+    for i, totals in enumerate(get_readability_totals(table, section_sentences)):
+        first_token = np.searchsorted(table.sent_ids, i * section_sentences)
+        next_token = np.searchsorted(table.sent_ids, (i + 1) * section_sentences)
+        start_char = int(table.idx[first_token])
+        end_char = int(table.idx[next_token]) if next_token < len(table) else table.text_length
+        sections.append({"section": i + 1, "start_char": start_char, "end_char": end_char,
+                         "words": totals["total_words"], "sentences": totals["total_sentences"],
+                         **readability_scores(**totals)})
+    return sections
+
+@functools.lru_cache(maxsize=SYLLABLE_CACHE_SIZE)
+def get_word_measures(word):
+    """(syllables, letters) of a word, cached per word type"""
+    return count_syllables(word), sum(1 for char in word if char.isalnum())
+
+def get_readability_totals(table, section_sentences=None):
+    """the totals every readability metric needs, for the whole table or per block of sentences
+    
+    syllables and letters are measured once per distinct word and spread back
+    over its occurrences, returns a list of keyword dicts for readability_scores
+    """
+    import numpy as np
+    total_sentences = table.sentence_count()
+    values, inverse = np.unique(table.orth[table.words], return_inverse=True)
+    measures = np.array([get_word_measures(table.strings[value]) for value in values.tolist()],
+                        dtype=np.int64).reshape(-1, 2)
+    syllables = measures[:, 0][inverse.ravel()]
+    letters = measures[:, 1][inverse.ravel()]
+    
+    if section_sentences is None:
+        section_ids = np.zeros(len(syllables), dtype=np.int64)
+        n_sections = 1
+        sentences = [total_sentences]
+    else:
+        section_ids = table.sent_ids[table.words] // section_sentences
+        n_sections = max(1, -(-total_sentences // section_sentences))
+        sentences = [min(section_sentences, total_sentences - i * section_sentences) for i in range(n_sections)]
+    
+    def per_section(weights=None):
+        return np.bincount(section_ids, weights=weights, minlength=n_sections).astype(np.int64).tolist()
+    
+    return [{"total_words": words, "total_sentences": sentence_count, "total_syllables": syllable_count,
+             "total_polysyllables": polysyllable_count, "total_letters": letter_count}
+            for words, sentence_count, syllable_count, polysyllable_count, letter_count
+            in zip(per_section(), sentences, per_section(syllables), per_section(syllables >= 3),
+                   per_section(letters))]
+
+def readability_scores(total_words, total_sentences, total_syllables, total_polysyllables, total_letters):
+    """compute every readability metric from raw totals, all 0 for text without words or sentences"""
+    if total_sentences <= 0 or total_words <= 0:
+        return {name: 0 for name in READABILITY_LABELS}
+    words_per_sentence = total_words / total_sentences
+    return {
+        "flesch_reading_ease": flesch_reading_ease(total_words, total_sentences, total_syllables),
+        "flesch_kincaid_grade": 0.39 * words_per_sentence + 11.8 * (total_syllables / total_words) - 15.59,
+        # words of three or more syllables count as complex
+        "gunning_fog": 0.4 * (words_per_sentence + 100 * total_polysyllables / total_words),
+        "smog": 1.043 * (total_polysyllables * 30 / total_sentences) ** 0.5 + 3.1291,
+        "coleman_liau": (0.0588 * 100 * total_letters / total_words
+                         - 0.296 * 100 * total_sentences / total_words - 15.8),
+        "ari": 4.71 * (total_letters / total_words) + 0.5 * words_per_sentence - 21.43,
+    }
+
+def flesch_reading_ease(total_words, total_sentences, total_syllables):
+    """compute the flesch reading ease score from raw totals"""
+    if total_sentences > 0 and total_words > 0:
+        # rlesch reading ease formula
+        score = 206.835 - 1.015 * (total_words / total_sentences) - 84.6 * (total_syllables / total_words)
+        return score
+    return 0
+
+def count_syllables(word):
+    """approximate syllable count for a word"""
+    word = word.lower()
+    count = 0
+    vowels = "aeiouy"
+    if word[0] in vowels:
+        count += 1
+    for index in range(1, len(word)):
+        if word[index] in vowels and word[index - 1] not in vowels:
+            count += 1
+    if word.endswith("e"):
+        count -= 1
+    if count == 0:
+        count += 1
+    return count
+
+@instrumented("analysis")
+def display_keyword_in_context(doc, keyword, context=3):
+    """display keyword in context with surrounding words"""
+    results, _ = build_keyword_index(doc).search(keyword, context=context, limit=KWIC_PAGE_SIZE)
+    return results  # return first 10 results
+
+class KeywordIndex:
+    """positional inverted index of a doc's lowercase forms and lemmas
+    
+    built once per doc with numpy: every term maps to a sorted slice of token
+    offsets, so a lookup costs O(hits) instead of a scan over the whole doc.
+    only the token table's columns are kept, so the doc can be freed once it is built
+    """
+    
+    def __init__(self, doc):
+        table = get_token_table(doc)
+        self.strings = table.strings
+        self.orth = table.orth
+        self.forms = self._build_postings(table.lower, lambda h: self.strings[h])
+        # lemma postings wait for the first lemma query, the doc may not be lemmatized yet
+        self.lemma = table.lemma
+        self.lemmas = None
+        self._hits = {}
+    
+    def set_lemmas(self, lemma):
+        """use the lemma column of a table built after lemmatizing, unless lemma postings exist"""
+        if self.lemmas is None:
+            self.lemma = lemma
+    
+    @staticmethod
+    def _build_postings(hashes, to_term):
+        """group token offsets by term, return (term ids, per-token ids, offsets sorted by term, slice bounds)"""
+        import numpy as np
+        unique_hashes, inverse = np.unique(hashes, return_inverse=True)
+        # several hashes can map to one term (lemmas differing only in case)
+        term_ids = {}
+        remap = np.empty(len(unique_hashes), dtype=np.int32)
+        for i, string_hash in enumerate(unique_hashes):
+            remap[i] = term_ids.setdefault(to_term(int(string_hash)), len(term_ids))
+        column = remap[inverse.ravel()]
+        order = np.argsort(column, kind='stable').astype(np.int32)
+        bounds = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(column, minlength=len(term_ids)), out=bounds[1:])
+        return term_ids, column, order, bounds
+    
+    def find(self, query, lemma=False):
+        """return the sorted token offsets where the query word or phrase starts"""
+        key = (query.lower(), lemma)
+        if key not in self._hits:
+            self._hits[key] = self._find(query, lemma)
+        return self._hits[key]
+    
+    def _find(self, query, lemma):
+        if lemma and self.lemmas is None:
+            self.lemmas = self._build_postings(self.lemma, lambda h: self.strings[h].lower())
+        term_ids, column, order, bounds = self.lemmas if lemma else self.forms
+        # split the query the same way the doc was tokenized
+        words = [token.text.lower() for token in get_nlp().tokenizer(query) if not token.is_space]
+        ids = [term_ids.get(word) for word in words]
+        if not ids or None in ids:
+            return []
+        if len(ids) == 1:
+            return order[bounds[ids[0]]:bounds[ids[0] + 1]]
+        
+        # start from the rarest word of the phrase and verify the others by position
+        rarest = min(range(len(ids)), key=lambda k: bounds[ids[k] + 1] - bounds[ids[k]])
+        starts = order[bounds[ids[rarest]]:bounds[ids[rarest] + 1]] - rarest
+        starts = starts[(starts >= 0) & (starts + len(ids) <= len(column))]
+        for k, term_id in enumerate(ids):
+            if k != rarest:
+                starts = starts[column[starts + k] == term_id]
+        return starts
+    
+    def count(self, query, lemma=False):
+        """number of occurrences of the query"""
+        return len(self.find(query, lemma))
+    
+    def search(self, query, lemma=False, context=3, offset=0, limit=KWIC_PAGE_SIZE):
+        """return one page of context strings and the total number of hits"""
+        starts = self.find(query, lemma)
+        phrase_length = max(1, len([t for t in get_nlp().tokenizer(query) if not t.is_space]))
+        page = starts[offset:offset + limit] if limit is not None else starts[offset:]
+        
+        results = []
+        for position in page:
+            start = max(0, int(position) - context)
+            end = min(len(self.orth), int(position) + phrase_length + context)
+            results.append(' '.join(self.strings[orth] for orth in self.orth[start:end].tolist()))
+        return results, len(starts)
+
+@instrumented("analysis")
+def build_keyword_index(doc):
+    """build the keyword in context index for a doc"""
+    return KeywordIndex(doc)
+
+class AnalysisAccumulator:
+    """mergeable running totals for analyzing a text chunk by chunk
+    
+    only the analyses listed in `analyses` are collected, so chunks don't pay
+    for counts nobody asked for
+    """
+    
+    ANALYSES = ('tokens', 'lemmas', 'pos', 'statistics', 'readability', 'noun_phrases')
+    
+    # running totals saved by to_dict, besides the analyses and the unique words set
+    FIELDS = ('token_counts', 'lemma_counts', 'pos_counts', 'noun_phrase_counts', 'total_chars',
+              'total_tokens', 'total_words', 'total_sentences', 'total_syllables', 'total_polysyllables',
+              'total_letters', 'chunks')
+    
+    def __init__(self, analyses=None):
+        self.analyses = set(analyses) if analyses else set(self.ANALYSES)
+        self.token_counts = Counter()
+        self.lemma_counts = Counter()
+        self.pos_counts = Counter()
+        self.noun_phrase_counts = Counter()
+        self.unique_words = set()
+        self.total_chars = 0
+        self.total_tokens = 0
+        self.total_words = 0
+        self.total_sentences = 0
+        self.total_syllables = 0
+        self.total_polysyllables = 0
+        self.total_letters = 0
+        self.chunks = 0
+    
+    def update(self, doc):
+        """add the counts of one processed chunk"""
+        self.chunks += 1
+        if 'tokens' in self.analyses:
+            self.token_counts.update(get_token_counts(doc))
+        if 'lemmas' in self.analyses:
+            self.lemma_counts.update(get_lemma_counts(doc))
+        if 'pos' in self.analyses:
+            self.pos_counts.update(get_pos_distribution(doc))
+        if 'noun_phrases' in self.analyses:
+            self.noun_phrase_counts.update(get_noun_phrase_counts(doc))
+        if 'statistics' in self.analyses or 'readability' in self.analyses:
+            import numpy as np
+            table = get_token_table(doc)
+            self.total_chars += table.text_length
+            self.total_sentences += table.sentence_count()
+            self.total_tokens += int(np.count_nonzero(~table.is_space))
+            word_counts = table.count(table.orth, table.words)
+            self.total_words += sum(word_counts.values())
+            self.unique_words.update(word.lower() for word in word_counts)
+            if 'readability' in self.analyses:
+                for word, count in word_counts.items():
+                    syllables, letters = get_word_measures(word)
+                    self.total_syllables += syllables * count
+                    self.total_polysyllables += count if syllables >= 3 else 0
+                    self.total_letters += letters * count
+        return self
+    
+    def merge(self, other):
+        """fold the totals of another accumulator (a later chunk) into this one"""
+        self.chunks += other.chunks
+        self.token_counts.update(other.token_counts)
+        self.lemma_counts.update(other.lemma_counts)
+        self.pos_counts.update(other.pos_counts)
+        self.noun_phrase_counts.update(other.noun_phrase_counts)
+        self.unique_words |= other.unique_words
+        self.total_chars += other.total_chars
+        self.total_tokens += other.total_tokens
+        self.total_words += other.total_words
+        self.total_sentences += other.total_sentences
+        self.total_syllables += other.total_syllables
+        self.total_polysyllables += other.total_polysyllables
+        self.total_letters += other.total_letters
+        return self
+    
+    def to_dict(self):
+        """the accumulator state as JSON-safe data"""
+        data = {name: encode_result(getattr(self, name)) for name in self.FIELDS}
+        data['analyses'] = sorted(self.analyses)
+        data['unique_words'] = sorted(self.unique_words)
+        return data
+    
+    @classmethod
+    def from_dict(cls, data):
+        """rebuild an accumulator saved with to_dict"""
+        accumulator = cls(data['analyses'])
+        for name in cls.FIELDS:
+            setattr(accumulator, name, decode_result(data[name]))
+        accumulator.unique_words = set(data['unique_words'])
+        return accumulator
+    
+    @classmethod
+    def combine(cls, parts):
+        """one accumulator from accumulators of different analyses over the same chunk"""
+        parts = list(parts)
+        combined = cls(set().union(*(part.analyses for part in parts)))
+        for part in parts:
+            combined.merge(part)
+        combined.chunks = max((part.chunks for part in parts), default=0)
+        return combined
+    
+    def text_statistics(self):
+        """text statistics over all chunks seen so far"""
+        return build_text_statistics(self.total_chars, self.total_tokens, self.total_words,
+                                     len(self.unique_words), self.total_sentences)
+    
+    def readability_score(self):
+        """flesch reading ease over all chunks seen so far"""
+        return flesch_reading_ease(self.total_words, self.total_sentences, self.total_syllables)
+    
+    def readability_scores(self):
+        """every readability metric over all chunks seen so far"""
+        return readability_scores(self.total_words, self.total_sentences, self.total_syllables,
+                                  self.total_polysyllables, self.total_letters)
+
+def analyze_chunks(chunks, analyses=None, batch_size=STREAM_BATCH_SIZE):
+    """process text chunks with nlp.pipe and collect the results without keeping the docs"""
+    nlp = get_nlp()
+    progress = get_progress()
+    accumulator = AnalysisAccumulator(analyses)
+    with planned_pipeline(accumulator.analyses):
+        for doc in nlp.pipe(chunks, batch_size=batch_size):
+            accumulator.update(doc)
+            progress.advance(len(doc.text.encode('utf-8')))
+    return accumulator
+
+@instrumented("analysis")
+def analyze_paragraphs(text, analyses=None):
+    """analyze text paragraph by paragraph, running spaCy only on paragraphs without stored counts
+    
+    the counts of every paragraph are kept in the database per PARAGRAPH_RESULT_UNITS,
+    so re-analyzing an edited file costs as much as the paragraphs that changed and a
+    paragraph only goes through the components of the analyses it is missing. returns
+    (start_char, end_char, accumulator) for every paragraph in order
+    """
+    requested = AnalysisAccumulator(analyses).analyses
+    units = [unit for unit in PARAGRAPH_RESULT_UNITS if requested & set(unit)]
+    paragraphs = split_paragraphs(text)
+    hashes = [compute_content_hash(paragraph) for paragraph in paragraphs]
+    stored = {unit: {paragraph_hash: AnalysisAccumulator.from_dict(data)
+                     for paragraph_hash, data in load_paragraph_results(hashes, ",".join(unit)).items()}
+              for unit in units}
+    
+    # each distinct paragraph goes through the pipeline once, grouped by the units it lacks
+    missing = {}
+    for paragraph, paragraph_hash in zip(paragraphs, hashes):
+        absent = tuple(unit for unit in units if paragraph_hash not in stored[unit])
+        if absent and paragraph_hash not in missing:
+            missing[paragraph_hash] = (paragraph, absent)
+    if missing:
+        nlp = get_nlp()
+        progress = get_progress()
+        progress.start("Analyzing changed paragraphs", len(missing), "paragraphs")
+        groups = {}
+        for paragraph_hash, (paragraph, absent) in missing.items():
+            groups.setdefault(absent, []).append((paragraph_hash, paragraph))
+        new_entries = {unit: [] for unit in units}
+        for absent, group in groups.items():
+            with planned_pipeline([analysis for unit in absent for analysis in unit]):
+                docs = nlp.pipe(paragraph for _, paragraph in group)
+                for (paragraph_hash, _), doc in zip(group, docs):
+                    for unit in absent:
+                        paragraph_accumulator = AnalysisAccumulator(unit).update(doc)
+                        stored[unit][paragraph_hash] = paragraph_accumulator
+                        new_entries[unit].append((paragraph_hash, paragraph_accumulator.to_dict()))
+                    progress.advance()
+        for unit, entries in new_entries.items():
+            if entries:
+                save_paragraph_results(entries, ",".join(unit))
+    
+    results = []
+    start_char = 0
+    for paragraph, paragraph_hash in zip(paragraphs, hashes):
+        accumulator = AnalysisAccumulator.combine(stored[unit][paragraph_hash] for unit in units)
+        results.append((start_char, start_char + len(paragraph), accumulator))
+        start_char += len(paragraph)
+    return results
+
+def analyze_text_incremental(text, analyses=None):
+    """analyze text paragraph by paragraph and merge the counts of all paragraphs"""
+    accumulator = AnalysisAccumulator(analyses)
+    for _, _, paragraph_accumulator in analyze_paragraphs(text, analyses):
+        accumulator.merge(paragraph_accumulator)
+    return accumulator
+
+def get_paragraph_readability_sections(paragraph_totals, section_sentences=READABILITY_SECTION_SENTENCES):
+    """readability metrics per section of whole paragraphs, like get_readability_sections
+    
+    a section closes once it holds section_sentences sentences. paragraph_totals are
+    (start_char, end_char, totals) with the readability totals of each paragraph, so the
+    sections add up to the incremental document statistics
+    """
+    grouped = []
+    current = None
+    for start_char, end_char, totals in paragraph_totals:
+        if current is None:
+            current = {"start_char": start_char, "totals": dict.fromkeys(totals, 0)}
+            grouped.append(current)
+        for key, value in totals.items():
+            current["totals"][key] += value
+        current["end_char"] = end_char
+        if current["totals"]["total_sentences"] >= section_sentences:
+            current = None
+    return [{"section": i + 1, "start_char": section["start_char"], "end_char": section["end_char"],
+             "words": section["totals"]["total_words"], "sentences": section["totals"]["total_sentences"],
+             **readability_scores(**section["totals"])}
+            for i, section in enumerate(grouped)]
+
+def get_checkpoint_dir():
+    """the checkpoint directory, next to the database unless CHECKPOINT_DIR is absolute"""
+    return os.path.join(os.path.dirname(os.path.abspath(DB_NAME)), CHECKPOINT_DIR)
+
+def get_checkpoint_path(file_path, analyses_key, max_chars, encoding=None):
+    """checkpoint file of a streamed run, one per file, analyses, chunk size and analyzer version"""
+    key_source = f"{os.path.abspath(file_path)}:{analyses_key}:{max_chars}:{encoding}:{get_results_version()}"
+    return os.path.join(get_checkpoint_dir(), hashlib.sha256(key_source.encode('utf-8')).hexdigest() + ".json")
+
+def get_file_signature(file_path):
+    """size and modification time, a checkpoint is only used while both are unchanged"""
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def save_checkpoint(checkpoint_path, data):
+    """write a checkpoint atomically, so a crash leaves either the old or the new one"""
+    try:
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+        temp_path = f"{checkpoint_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, checkpoint_path)
+        return True
+    except Exception as e:
+        print(f"Error saving checkpoint: {e}")
+        return False
+
+def load_checkpoint(checkpoint_path, signature):
+    """return the saved checkpoint, or None when there is none or the file has changed since"""
+    try:
+        with open(checkpoint_path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error reading checkpoint: {e}")
+        return None
+    if data.get('signature') != signature or data.get('block_size') != READ_BLOCK_BYTES:
+        return None
+    return data
+
+def remove_checkpoint(checkpoint_path):
+    """delete a checkpoint once its run has finished"""
+    try:
+        os.remove(checkpoint_path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error removing checkpoint: {e}")
+
+def analyze_file_resumable(file_path, analyses=None, encoding=None, max_chars=STREAM_CHUNK_CHARS,
+                           checkpoint_seconds=CHECKPOINT_SECONDS):
+    """stream a file like analyze_chunks, checkpointing the totals and where to continue
+    
+    a checkpoint is written after a chunk at most every checkpoint_seconds, and a
+    later run over the same unchanged file starts from it. the totals are restored
+    in the order they were counted, so the result is identical to an uninterrupted run
+    """
+    nlp = get_nlp()
+    progress = get_progress()
+    accumulator = AnalysisAccumulator(analyses)
+    checkpoint_path = get_checkpoint_path(file_path, ",".join(sorted(accumulator.analyses)), max_chars, encoding)
+    signature = get_file_signature(file_path)
+    checkpoint = load_checkpoint(checkpoint_path, signature)
+    start, skip, bytes_done = None, 0, 0
+    if checkpoint:
+        accumulator = AnalysisAccumulator.from_dict(checkpoint['accumulator'])
+        start, skip, bytes_done = checkpoint['position'], checkpoint['skip'], checkpoint['bytes_done']
+    
+    # the byte total is exact for utf-8 files with \n line endings, close enough otherwise
+    progress.start("Resuming stream" if checkpoint else "Streaming", get_input_size(file_path), "bytes")
+    progress.advance(bytes_done)
+    chunks = iter_chunk_positions(iter_text_block_positions(file_path, encoding, start=start), max_chars, skip)
+    last_saved = time.perf_counter()
+    with planned_pipeline(accumulator.analyses):
+        # the resume point travels with its chunk, nlp.pipe reads ahead of the docs it returns
+        for doc, (position, skip) in nlp.pipe(chunks, as_tuples=True, batch_size=STREAM_BATCH_SIZE):
+            accumulator.update(doc)
+            chunk_bytes = len(doc.text.encode('utf-8'))
+            bytes_done += chunk_bytes
+            progress.advance(chunk_bytes)
+            if time.perf_counter() - last_saved >= checkpoint_seconds:
+                with timed("stream", "save_checkpoint"):
+                    save_checkpoint(checkpoint_path, {
+                        'signature': signature, 'block_size': READ_BLOCK_BYTES, 'position': position,
+                        'skip': skip, 'bytes_done': bytes_done, 'accumulator': accumulator.to_dict()})
+                last_saved = time.perf_counter()
+    remove_checkpoint(checkpoint_path)
+    return accumulator
+
+_USE_CHECKPOINT_SECONDS = object()  # analyze_file_streaming default, read CHECKPOINT_SECONDS at call time
+
+@instrumented("stream")
+def analyze_file_streaming(file_path, analyses=None, encoding=None, checkpoint_seconds=_USE_CHECKPOINT_SECONDS):
+    """analyze a file of any size in paragraph-aligned chunks
+    
+    checkpoints are saved every CHECKPOINT_SECONDS (or checkpoint_seconds), None or 0 turns them off
+    """
+    nlp = get_nlp()
+    max_chars = min(STREAM_CHUNK_CHARS, nlp.max_length)
+    if checkpoint_seconds is _USE_CHECKPOINT_SECONDS:
+        checkpoint_seconds = CHECKPOINT_SECONDS
+    if checkpoint_seconds:
+        return analyze_file_resumable(file_path, analyses, encoding, max_chars, checkpoint_seconds)
+    # the byte total is exact for utf-8 files with \n line endings, close enough otherwise
+    get_progress().start("Streaming", get_input_size(file_path), "bytes")
+    return analyze_chunks(iter_file_chunks(file_path, max_chars, encoding), analyses)
+
+class AnalysisSession:
+    """wrap a processed doc and compute each analysis at most once
+    
+    results are stored together with the parameters they were computed with,
+    so repeated menu choices and the export reuse earlier work. with a content
+    hash they are also saved in the database and loaded again next time, and
+    the doc can be left to load_doc so spaCy only runs for results not stored yet
+    """
+    
+    # results that can be served from an AnalysisAccumulator when there is no doc
+    STREAMED_RESULTS = {
+        'get_token_counts': lambda acc: acc.token_counts,
+        'get_lemma_counts': lambda acc: acc.lemma_counts,
+        'get_pos_distribution': lambda acc: acc.pos_counts,
+        'get_noun_phrase_counts': lambda acc: acc.noun_phrase_counts,
+        'get_text_statistics': lambda acc: acc.text_statistics(),
+        'get_readability_score': lambda acc: acc.readability_score(),
+        'get_readability_scores': lambda acc: acc.readability_scores(),
+    }
+    
+    # the analysis each memoized doc function stands for, used to plan the pipeline
+    FUNCTION_ANALYSES = {
+        'get_token_counts': 'tokens',
+        'get_lemma_counts': 'lemmas',
+        'get_overall_sentiment': 'sentiment',
+        'get_sentence_sentiments': 'sentiment',
+        'get_token_sentiments': 'token_sentiment',
+        'get_text_statistics': 'statistics',
+        'get_pos_distribution': 'pos',
+        'get_noun_phrase_counts': 'noun_phrases',
+        'get_readability_score': 'readability',
+        'get_readability_scores': 'readability',
+        'get_readability_sections': 'readability',
+        'build_keyword_index': 'kwic',
+    }
+    
+    # doc functions that only read the token table, so they run without the doc once it is built
+    TABLE_FUNCTIONS = {'get_token_counts', 'get_lemma_counts', 'get_text_statistics', 'get_pos_distribution',
+                       'get_readability_score', 'get_readability_scores', 'get_readability_sections',
+                       'build_keyword_index'}
+    
+    def __init__(self, doc, accumulator=None, cache_key=None, content_hash=None, load_doc=None,
+                 accumulate=None):
+        self._doc = doc
+        self._load_doc = load_doc  # returns (doc, cache_key) the first time the doc is needed
+        self._accumulate = accumulate  # returns analyze_paragraphs results for a list of analyses
+        self._paragraph_totals = None  # (start_char, end_char, readability totals) per paragraph
+        self.cache_key = cache_key
+        self.content_hash = content_hash
+        self._results = {}
+        self._table = None
+        self._table_pipes = ()
+        self._lock = threading.RLock()
+        
+        if content_hash:
+            self._results.update(load_analysis_results(content_hash))
+        
+        # a streamed file has no doc, seed the results the chunks already produced
+        if accumulator is not None:
+            for name, extract in self.STREAMED_RESULTS.items():
+                self._store((name, ()), extract(accumulator))
+    
+    @property
+    def doc(self):
+        """the processed doc, loaded on first use when the session was given load_doc"""
+        if self._doc is None and self._load_doc is not None:
+            with self._lock:
+                if self._doc is None:
+                    self._doc, self.cache_key = self._load_doc()
+        return self._doc
+    
+    def has_result(self, name, *params):
+        """check whether a result has already been computed"""
+        return (name, tuple(params)) in self._results
+    
+    def has_streamed_results(self):
+        """check whether every result a streamed file provides is already stored"""
+        return all(self.has_result(name) for name in self.STREAMED_RESULTS)
+    
+    def stored_result_count(self):
+        """number of results available without computing anything"""
+        return len(self._results)
+    
+    def is_streamed(self):
+        """check whether the session was built from streamed chunks instead of a doc"""
+        return self._doc is None and self._load_doc is None
+    
+    def _store(self, key, result):
+        """keep a result, saving it in the database when the content is known"""
+        self._results[key] = result
+        if self.content_hash and key[0] not in UNPERSISTED_RESULTS:
+            save_analysis_result(self.content_hash, key[0], key[1], result)
+            if key[0] in TERM_VECTOR_RESULTS and not key[1]:
+                save_term_vector(self.content_hash, TERM_VECTOR_RESULTS[key[0]], result)
+    
+    def _memoize(self, name, params, compute):
+        """return the stored result for (name, params), computing it on first use"""
+        key = (name, params)
+        with self._lock:
+            if key not in self._results:
+                self._store(key, compute())
+            return self._results[key]
+    
+    def require(self, *analyses):
+        """add any pipeline annotations the analyses need that the doc doesn't have yet"""
+        if self.is_streamed():
+            return
+        with self._lock:
+            if annotate_doc(self.doc, analyses) and self.cache_key:
+                # keep the heavier annotations for the next time this file is opened
+                save_cached_doc(self.cache_key, self.doc)
+    
+    def token_table(self, *analyses):
+        """the doc's token table with the annotations the analyses need
+        
+        rebuilt whenever components ran on the doc after the table was built, since
+        a late parser replaces the senter's sentence boundaries the table holds
+        """
+        with self._lock:
+            stale = self._doc is not None and tuple(get_applied_pipes(self._doc)) != self._table_pipes
+            if self._table is None or stale or not set(plan_pipeline(analyses)) <= set(self._table_pipes):
+                self.require(*analyses)
+                self._table = get_token_table(self.doc)
+                self._table_pipes = tuple(get_applied_pipes(self.doc))
+            return self._table
+    
+    def release_doc(self):
+        """drop the doc to free its memory, keeping the token table and keyword index
+        
+        only possible when the session can load the doc again, return True if it was dropped
+        """
+        with self._lock:
+            if self._load_doc is None or self._doc is None:
+                return False
+            self._doc = None
+            return True
+    
+    def run(self, func, *args, **kwargs):
+        """run an analysis function on the doc, memoized by function and parameters"""
+        # bind with defaults so f(doc) and f(doc, n=10) share one entry,
+        # the doc itself is left out so a stored result never loads it
+        bound = inspect.signature(func).bind(None, *args, **kwargs)
+        bound.apply_defaults()
+        params = tuple(list(bound.arguments.items())[1:])
+        
+        def compute():
+            if self._accumulate is not None and func.__name__ in self.STREAMED_RESULTS and not params:
+                # counts that merge across paragraphs come from the incremental accumulator
+                analyses = [self.FUNCTION_ANALYSES[func.__name__]]
+                return self.STREAMED_RESULTS[func.__name__](self._accumulate_paragraphs(analyses, func.__name__))
+            if func is get_noun_phrase_counts and use_parallel_noun_phrases(self.doc):
+                # a long text is tagged in chunks on every CPU instead of annotating the doc
+                return get_noun_phrase_counts_parallel(self.doc.text, NOUN_PHRASE_MODE, NOUN_PHRASE_NORMALIZE)
+            if func.__name__ in self.TABLE_FUNCTIONS:
+                return func(self.token_table(self.FUNCTION_ANALYSES[func.__name__]), *args, **kwargs)
+            if func.__name__ in self.FUNCTION_ANALYSES:
+                self.require(self.FUNCTION_ANALYSES[func.__name__])
+            return func(self.doc, *args, **kwargs)
+        return self._memoize(func.__name__, params, compute)
+    
+    def _accumulate_paragraphs(self, analyses, computing=None):
+        """run the paragraph analyses and store every result the paragraphs provide
+        
+        returns the merged accumulator, the result being computed is left to the caller to store
+        """
+        with self._lock:
+            paragraphs = self._accumulate(analyses)
+            accumulator = AnalysisAccumulator(paragraphs[0][2].analyses if paragraphs else analyses)
+            for _, _, paragraph in paragraphs:
+                accumulator.merge(paragraph)
+            if 'readability' in accumulator.analyses:
+                self._paragraph_totals = [(start_char, end_char, {
+                    "total_words": paragraph.total_words, "total_sentences": paragraph.total_sentences,
+                    "total_syllables": paragraph.total_syllables,
+                    "total_polysyllables": paragraph.total_polysyllables,
+                    "total_letters": paragraph.total_letters})
+                    for start_char, end_char, paragraph in paragraphs]
+            for name, extract in self.STREAMED_RESULTS.items():
+                if (name != computing and self.FUNCTION_ANALYSES[name] in accumulator.analyses
+                        and not self.has_result(name)):
+                    self._store((name, ()), extract(accumulator))
+            return accumulator
+    
+    def most_frequent_tokens(self, n=10):
+        """most frequent tokens, sliced from the shared token counts"""
+        return self._memoize('most_frequent_tokens', (('n', n),),
+                             lambda: self.run(get_token_counts).most_common(n))
+    
+    def most_frequent_lemmas(self, n=10):
+        """most frequent lemmas, sliced from the shared lemma counts"""
+        return self._memoize('most_frequent_lemmas', (('n', n),),
+                             lambda: self.run(get_lemma_counts).most_common(n))
+    
+    def overall_sentiment(self, mode=None):
+        """overall polarity and subjectivity"""
+        mode = mode or SENTIMENT_MODE
+        if mode == "sentence":
+            # reuse the stored per-sentence scores instead of scoring again
+            return self._memoize('get_overall_sentiment', (('mode', mode),),
+                                 lambda: combine_sentence_sentiments(self.sentence_sentiments()))
+        return self.run(get_overall_sentiment, mode=mode)
+    
+    def sentence_sentiments(self):
+        """per-sentence (start_char, end_char, word_count, polarity, subjectivity, assessments) scores"""
+        return self.run(get_sentence_sentiments)
+    
+    def sentiment_by_position(self, buckets=SENTIMENT_POSITION_BUCKETS):
+        """sentence polarity averaged over equal slices of the document"""
+        return self._memoize('sentiment_by_position', (('buckets', buckets),),
+                             lambda: get_sentiment_by_position(self.sentence_sentiments(), len(self.doc.text), buckets))
+    
+    def unique_sentiment_by_tokens(self, n=10, highest=True):
+        """tokens with the highest or lowest sentiment values"""
+        # one pass over the per-lemma scores ranks both the highest and the lowest
+        extremes = self._memoize('token_sentiment_extremes', (('n', n),),
+                                 lambda: rank_token_sentiment_extremes(self.run(get_token_sentiments), n))
+        return extremes[0] if highest else extremes[1]
+    
+    def text_statistics(self):
+        """comprehensive text statistics"""
+        return self.run(get_text_statistics)
+    
+    def pos_distribution(self):
+        """part-of-speech distribution"""
+        return self.run(get_pos_distribution)
+    
+    def most_common_noun_phrases(self, n=10):
+        """most common noun phrases, sliced from the shared phrase counts"""
+        return self._memoize('most_common_noun_phrases', (('n', n),),
+                             lambda: self.run(get_noun_phrase_counts).most_common(n))
+    
+    def readability_score(self):
+        """flesch reading ease score"""
+        return self.run(get_readability_score)
+    
+    def readability_scores(self):
+        """every readability metric, keyed like READABILITY_LABELS"""
+        return self.run(get_readability_scores)
+    
+    def readability_sections(self, section_sentences=READABILITY_SECTION_SENTENCES):
+        """readability metrics per block of sentences, empty for a streamed file"""
+        if self.is_streamed():
+            return []
+        if self._accumulate is not None:
+            # from the same paragraph totals as the statistics, so the two always agree
+            def compute():
+                if self._paragraph_totals is None:
+                    self._accumulate_paragraphs(['readability'])
+                return get_paragraph_readability_sections(self._paragraph_totals, section_sentences)
+            return self._memoize('get_readability_sections', (('section_sentences', section_sentences),), compute)
+        return self.run(get_readability_sections, section_sentences=section_sentences)
+    
+    def keyword_index(self):
+        """the positional index used by every keyword in context query"""
+        return self.run(build_keyword_index)
+    
+    def keyword_in_context(self, keyword, context=3, lemma=False, offset=0, limit=KWIC_PAGE_SIZE):
+        """one page of keyword in context matches and the total number of hits"""
+        index = self.keyword_index()
+        if lemma:
+            index.set_lemmas(self.token_table('kwic_lemma').lemma)
+        return index.search(keyword, lemma, context, offset, limit)
+    
+    def wordcloud(self, output_path="wordcloud.png", source="tokens"):
+        """write a word cloud of the token or lemma counts to output_path"""
+        counts = self.run(get_lemma_counts if source == "lemmas" else get_token_counts)
+        content_hash = self.content_hash
+        if content_hash is None and not self.is_streamed():
+            content_hash = compute_content_hash(self.doc.text)
+        return generate_wordcloud(counts, output_path, content_hash, source)
+
+class CorpusIndex:
+    """sparse term-count matrix over many files, one row per file, built from stored vectors
+    
+    kept as CSR arrays plus a copy sorted by term, so aggregate frequencies, tf-idf
+    weights and cosine similarities are numpy reductions over the nonzero counts
+    """
+    
+    def __init__(self, labels, vectors):
+        import numpy as np
+        self.labels = list(labels)
+        n_rows = len(self.labels)
+        lengths = np.array([len(term_ids) for term_ids, _ in vectors], dtype=np.int64)
+        self.indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.indptr[1:])
+        ids = np.concatenate([term_ids for term_ids, _ in vectors]) if vectors else np.zeros(0, dtype='<i4')
+        self.counts = (np.concatenate([counts for _, counts in vectors]) if vectors
+                       else np.zeros(0, dtype='<i4')).astype(np.float64)
+        # vocabulary ids to dense column numbers
+        self.term_ids, columns = np.unique(ids, return_inverse=True)
+        self.columns = columns.ravel()
+        self.rows = np.repeat(np.arange(n_rows), lengths)
+        n_terms = len(self.term_ids)
+        
+        # smoothed idf, terms in every file still weigh a little
+        document_frequency = np.bincount(self.columns, minlength=n_terms)
+        self.idf = np.log((1 + n_rows) / (1 + document_frequency)) + 1
+        totals = np.bincount(self.rows, weights=self.counts, minlength=n_rows)
+        weights = self.counts / np.maximum(totals, 1)[self.rows] * self.idf[self.columns]
+        norms = np.sqrt(np.bincount(self.rows, weights=weights ** 2, minlength=n_rows))
+        self.weights = weights / np.maximum(norms, 1e-12)[self.rows]
+        
+        by_term = np.argsort(self.columns, kind='stable')
+        self.term_rows = self.rows[by_term]
+        self.term_weights = self.weights[by_term]
+        self.term_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=self.term_ptr[1:])
+    
+    def __len__(self):
+        return len(self.labels)
+    
+    def term_count(self):
+        """number of distinct terms in the corpus"""
+        return len(self.term_ids)
+    
+    def frequent_terms(self, n=CORPUS_TOP_N):
+        """the n terms with the highest total count, as (term id, count)"""
+        import numpy as np
+        totals = np.bincount(self.columns, weights=self.counts, minlength=len(self.term_ids))
+        top = np.argsort(-totals, kind='stable')[:n]
+        return [(int(self.term_ids[column]), int(totals[column])) for column in top]
+    
+    def distinctive_terms(self, row, n=CORPUS_TOP_N):
+        """the n terms with the highest tf-idf weight in one file, as (term id, weight)"""
+        import numpy as np
+        start, end = self.indptr[row], self.indptr[row + 1]
+        top = start + np.argsort(-self.weights[start:end], kind='stable')[:n]
+        return [(int(self.term_ids[self.columns[i]]), float(self.weights[i])) for i in top]
+    
+    def similarities(self, row):
+        """cosine similarity of the tf-idf vector of one file to every file"""
+        import numpy as np
+        start, end = self.indptr[row], self.indptr[row + 1]
+        columns = self.columns[start:end]
+        # only files sharing a term with this one are touched
+        lengths = self.term_ptr[columns + 1] - self.term_ptr[columns]
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        postings = np.repeat(self.term_ptr[columns], lengths) + offsets
+        products = self.term_weights[postings] * np.repeat(self.weights[start:end], lengths)
+        return np.bincount(self.term_rows[postings], weights=products, minlength=len(self.labels))
+    
+    def most_similar(self, row, n=CORPUS_TOP_N):
+        """the n files most similar to one file, as (row, similarity)"""
+        import numpy as np
+        scores = self.similarities(row)
+        scores[row] = -1
+        top = np.argsort(-scores, kind='stable')[:n]
+        return [(int(other), float(scores[other])) for other in top if scores[other] > 0]
+    
+    def most_similar_pairs(self, n=CORPUS_TOP_N):
+        """the n most similar pairs of files, as (row, row, similarity)"""
+        best = []
+        for row in range(len(self.labels)):
+            scores = self.similarities(row)
+            for other in (scores[row + 1:] > 0).nonzero()[0] + row + 1:
+                item = (float(scores[other]), -row, -int(other))
+                if len(best) < n:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+        return [(-row, -other, score) for score, row, other in sorted(best, reverse=True)]
+
+@instrumented("analysis")
+def build_user_corpus(user_id, kind="lemmas"):
+    """build the corpus index of a user's history from stored vectors
+    
+    returns (index, files, missing): files are the (filename, file_path) of each
+    row, missing the files analyzed before their counts were ever computed
+    """
+    entries = get_user_history_hashes(user_id)
+    hashes = [content_hash for _, _, content_hash in entries]
+    vectors = load_term_vectors(hashes, kind)
+    absent = [content_hash for content_hash in dict.fromkeys(hashes) if content_hash not in vectors]
+    if absent and backfill_term_vectors(absent, kind):
+        vectors.update(load_term_vectors(absent, kind))
+    
+    files = [(filename, file_path) for filename, file_path, content_hash in entries if content_hash in vectors]
+    missing = [(filename, file_path) for filename, file_path, content_hash in entries if content_hash not in vectors]
+    index = CorpusIndex(files, [vectors[content_hash] for _, _, content_hash in entries if content_hash in vectors])
+    return index, files, missing
+
+class AnalysisScheduler:
+    """compute session analyses on background workers in priority order
+    
+    workers always take the first pending task, prioritize() moves the tasks of
+    a menu choice to the front and cancel() drops every task not started yet.
+    a result computed here is memoized by the session, so the menu shows it at once
+    """
+    
+    def __init__(self, session, tasks=PRECOMPUTE_TASKS, workers=PRECOMPUTE_WORKERS):
+        self.session = session
+        self._pending = list(tasks)
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self.completed = []
+        self.failed = {}
+        self._running = workers
+        self._threads = [threading.Thread(target=self._work, name=f"precompute-{i}", daemon=True)
+                         for i in range(workers)]
+    
+    def start(self):
+        """start the workers, return the scheduler"""
+        for thread in self._threads:
+            thread.start()
+        return self
+    
+    def prioritize(self, choice):
+        """move the tasks of a menu choice to the front of the queue"""
+        with self._lock:
+            selected = [task for task in self._pending if choice in task[0]]
+            self._pending = selected + [task for task in self._pending if choice not in task[0]]
+    
+    def cancel(self):
+        """drop every pending task, a task already running finishes in the background"""
+        with self._lock:
+            self._cancelled = True
+            self._pending = []
+    
+    def pending_count(self):
+        """number of tasks not started yet"""
+        with self._lock:
+            return len(self._pending)
+    
+    def _work(self):
+        while True:
+            with self._lock:
+                if self._cancelled or not self._pending:
+                    self._running -= 1
+                    finished = not self._cancelled and self._running == 0
+                    break
+                _, name, args = self._pending.pop(0)
+            try:
+                getattr(self.session, name)(*args)
+            except Exception as e:
+                # the menu computes it again when chosen and reports the error there
+                self.failed[name] = e
             else:
-                print("Invalid selection. Please choose a valid number.")
-        except ValueError:
-            print("Please enter a number or 'b' to go back.")
+                self.completed.append(name)
+        # every menu analysis is stored and the token table and keyword index are
+        # built, the doc is only loaded again if something still needs it
+        if finished and self.session.has_result('build_keyword_index'):
+            self.session.release_doc()
 
-def display_menu(username):
-    """display the menu options"""
-    print("="*60)
-    print(f"TEXT ANALYSIS MENU - Welcome, {username}")
-    print("="*60)
-    print("1.  Display most frequent tokens")
-    print("2.  Display most frequent lemmas")
-    print("3.  Display overall sentiment analysis")
-    print("4.  Display top sentiment value tokens")
-    print("5.  Display lowest sentiment value tokens")
-    print("6.  Display text statistics")
-    print("7.  Display part-of-speech distribution")
-    print("8.  Generate word cloud")
-    print("9.  Display most common noun phrases")
-    print("10. Display readability score")
-    print("11. Display keyword in context (KWIC)")
-    print("12. Export analysis results to file")
-    print("13. View analysis history")
-    print("14. Analyze new file")
-    print("15. Logout")
-    print("="*60)
+def start_precompute(session):
+    """start computing the menu analyses of a session in the background"""
+    tasks = PRECOMPUTE_TASKS
+    if session.is_streamed():
+        tasks = [task for task in tasks if not set(task[0]) & STREAMING_UNAVAILABLE_CHOICES]
+    return AnalysisScheduler(session, tasks).start()
 
+def write_statistics_section(f, session):
+    """write the text statistics section of a report"""
+    stats = session.text_statistics()
+    f.write("TEXT STATISTICS:\n")
+    for key, value in stats.items():
+        f.write(f"{key.replace('_', ' ').title()}: {value}\n")
 
-def get_most_frequent_tokens(doc, n=10):
-    """get the most frequent tokens (excluding stop words and punctuation)"""
-    tokens = [token.text for token in doc if not token.is_stop and not token.is_punct and not token.is_space]
-    return Counter(tokens).most_common(n)
+def write_tokens_section(f, session):
+    """write the most frequent tokens section of a report"""
+    f.write("MOST FREQUENT TOKENS:\n")
+    tokens = session.most_frequent_tokens(20)
+    for i, (token, count) in enumerate(tokens, 1):
+        f.write(f"{i}. {token}: {count}\n")
 
-def get_most_frequent_lemmas(doc, n=10):
-    """get the most frequent lemmas (excluding stop words and punctuation)"""
-    lemmas = [token.lemma_.lower() for token in doc if not token.is_stop and not token.is_punct and not token.is_space]
-    return Counter(lemmas).most_common(n)
+def write_lemmas_section(f, session):
+    """write the most frequent lemmas section of a report"""
+    f.write("MOST FREQUENT LEMMAS:\n")
+    lemmas = session.most_frequent_lemmas(20)
+    for i, (lemma, count) in enumerate(lemmas, 1):
+        f.write(f"{i}. {lemma}: {count}\n")
 
-def get_overall_sentiment(doc):
-    """calculate overall sentiment of the text using TextBlob"""
-    text = doc.text
-    blob = TextBlob(text)
-    return blob.sentiment.polarity, blob.sentiment.subjectivity
+def write_sentiment_section(f, session):
+    """write the sentiment analysis section of a report"""
+    f.write("SENTIMENT ANALYSIS:\n")
+    if session.is_streamed():
+        f.write("Not available for files analyzed in streaming mode.\n")
+    else:
+        polarity, subjectivity = session.overall_sentiment()
+        f.write(f"Polarity: {polarity:.3f}\n")
+        f.write(f"Subjectivity: {subjectivity:.3f}\n")
 
-def get_unique_sentiment_by_tokens(doc, n=10, highest=True):
-    """get unique tokens with highest or lowest sentiment values"""
-    sentiment_dict = {}
-    
-    for token in doc:
-        if not token.is_stop and not token.is_punct and not token.is_space:
-            # use lemma to group similar words
-            key = token.lemma_.lower()
-            blob = TextBlob(token.text)
-            sentiment = blob.sentiment.polarity
-            
-            # keep the highest absolute sentiment value for each lemma
-            if key not in sentiment_dict or abs(sentiment) > abs(sentiment_dict[key][1]):
-                sentiment_dict[key] = (token.text, sentiment)
-    
-    # convert to list and sort by sentiment score
-    sentiment_scores = list(sentiment_dict.values())
-    sentiment_scores.sort(key=lambda x: x[1], reverse=highest)
-    
-    return sentiment_scores[:n]
+def write_pos_section(f, session):
+    """write the part-of-speech distribution section of a report"""
+    f.write("PART-OF-SPEECH DISTRIBUTION:\n")
+    pos_dist = session.pos_distribution()
+    total = sum(pos_dist.values())
+    for pos, count in pos_dist.most_common():
+        percentage = (count / total) * 100
+        f.write(f"{pos}: {count} ({percentage:.1f}%)\n")
 
-def get_text_statistics(doc):
-    """get comprehensive text statistics"""
-    total_chars = len(doc.text)
-    total_tokens = len([token for token in doc if not token.is_space])
-    total_sentences = len(list(doc.sents))
-    total_words = len([token for token in doc if not token.is_punct and not token.is_space])
-    unique_words = len(set(token.text.lower() for token in doc if not token.is_punct and not token.is_space))
-    avg_sentence_length = total_words / total_sentences if total_sentences > 0 else 0
-    lexical_diversity = unique_words / total_words if total_words > 0 else 0
+def write_noun_phrases_section(f, session):
+    """write the most common noun phrases section of a report"""
+    f.write("MOST COMMON NOUN PHRASES:\n")
+    noun_phrases = session.most_common_noun_phrases(20)
+    for i, (phrase, count) in enumerate(noun_phrases, 1):
+        f.write(f"{i}. {phrase}: {count}\n")
+
+def write_readability_section(f, session):
+    """write the readability section of a report"""
+    f.write("READABILITY SCORES:\n")
+    for name, score in session.readability_scores().items():
+        f.write(f"{READABILITY_LABELS[name]}: {score:.1f}\n")
     
-    return {
-        "total_characters": total_chars,
-        "total_tokens": total_tokens,
-        "total_words": total_words,
-        "unique_words": unique_words,
-        "total_sentences": total_sentences,
-        "avg_sentence_length": avg_sentence_length,
-        "lexical_diversity": lexical_diversity
-    }
+    sections = session.readability_sections()
+    if len(sections) > 1:
+        f.write(f"\nBy section ({READABILITY_SECTION_SENTENCES} sentences each):\n")
+        for line in format_readability_sections(sections):
+            f.write(line + "\n")
 
-def get_pos_distribution(doc):
-    """get distribution of parts of speech"""
-    pos_counts = Counter()
-    for token in doc:
-        if not token.is_punct and not token.is_space:
-            pos_counts[token.pos_] += 1
-    return pos_counts
-
-def generate_wordcloud(doc):
-    """generate a word cloud from the text"""
-    # extract text without stopwords, punctuation, and spaces
-    words = [token.text for token in doc if not token.is_stop and not token.is_punct and not token.is_space]
-    text = ' '.join(words)
-    
-    # generate word cloud
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(text)
-    
-    # display the word cloud
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.title('Word Cloud')
-    plt.tight_layout()
-    plt.show()
+def format_readability_sections(sections):
+    """lines of a per-section readability table"""
+    lines = [f"{'Section':<9} {'Chars':<17} {'FRE':>6} {'FK':>6} {'Fog':>6} {'SMOG':>6} {'CLI':>6} {'ARI':>6}"]
+    for section in sections:
+        chars = f"{section['start_char']}-{section['end_char']}"
+        lines.append(f"{section['section']:<9} {chars:<17} {section['flesch_reading_ease']:>6.1f} "
+                     f"{section['flesch_kincaid_grade']:>6.1f} {section['gunning_fog']:>6.1f} "
+                     f"{section['smog']:>6.1f} {section['coleman_liau']:>6.1f} {section['ari']:>6.1f}")
+    return lines
 
-def get_most_common_noun_phrases(doc, n=10):
-    """extract the most common noun phrases"""
-    noun_phrases = [chunk.text for chunk in doc.noun_chunks]
-    return Counter(noun_phrases).most_common(n)
+def write_wordcloud_section(f, session):
+    """write a word cloud image next to the report and link it from the report"""
+    f.write("WORD CLOUD:\n")
+    image_path = f"{os.path.splitext(f.name)[0]}_wordcloud.png"
+    try:
+        session.wordcloud(image_path)
+        f.write(f"Image: {image_path}\n")
+    except Exception as e:
+        f.write(f"Not available: {e}\n")
 
-def get_readability_score(doc):
-    """calculate approximate readability score"""
-    total_sentences = len(list(doc.sents))
-    total_words = len([token for token in doc if not token.is_punct and not token.is_space])
-    total_syllables = sum([count_syllables(token.text) for token in doc if not token.is_punct and not token.is_space])
-    
-    if total_sentences > 0 and total_words > 0:
-        # rlesch reading ease formula
-        score = 206.835 - 1.015 * (total_words / total_sentences) - 84.6 * (total_syllables / total_words)
-        return score
-    return 0
+def write_timings_section(f, session):
+    """write the instrumentation timings recorded so far in this run"""
+    f.write("PERFORMANCE TIMINGS (this run so far):\n")
+    f.write(f"{'Operation':<40} {'Calls':>5} {'Wall (s)':>9} {'CPU (s)':>9} {'Memory':>10}\n")
+    for category, name, calls, wall, cpu, memory_delta in summarize_timings(get_timing_records()):
+        f.write(f"{category + ':' + name:<40} {calls:>5} {wall:>9.3f} {cpu:>9.3f} "
+                f"{memory_delta / (1024 * 1024):>+8.1f}MB\n")
 
-def count_syllables(word):
-    """approximate syllable count for a word"""
-    word = word.lower()
-    count = 0
-    vowels = "aeiouy"
-    if word[0] in vowels:
-        count += 1
-    for index in range(1, len(word)):
-        if word[index] in vowels and word[index - 1] not in vowels:
-            count += 1
-    if word.endswith("e"):
-        count -= 1
-    if count == 0:
-        count += 1
-    return count
+# report sections in the order they are written
+EXPORT_SECTIONS = {
+    'statistics': write_statistics_section,
+    'tokens': write_tokens_section,
+    'lemmas': write_lemmas_section,
+    'sentiment': write_sentiment_section,
+    'pos': write_pos_section,
+    'noun_phrases': write_noun_phrases_section,
+    'readability': write_readability_section,
+    'wordcloud': write_wordcloud_section,
+}
+DEFAULT_EXPORT_SECTIONS = ('statistics', 'tokens', 'sentiment', 'pos')
 
-def display_keyword_in_context(doc, keyword, context=3):
-    """display keyword in context with surrounding words"""
-    keyword = keyword.lower()
-    results = []
-    
-    for i, token in enumerate(doc):
-        if token.text.lower() == keyword:
-            start = max(0, i - context)
-            end = min(len(doc), i + context + 1)
-            context_text = ' '.join([doc[j].text for j in range(start, end)])
-            results.append(context_text)
-    
-    return results[:10]  # return first 10 results
+# structured export, the document results plus optional per-token and per-sentence tables
+STRUCTURED_EXPORT_FORMATS = ('jsonl', 'csv', 'parquet')
+EXPORT_TABLES = ('tokens', 'sentences')
+EXPORT_TABLE_ANALYSES = {'tokens': ('lemmas', 'pos', 'statistics'), 'sentences': ('sentiment',)}
+EXPORT_ROW_BATCH = 10000  # rows built and written at a time, bounds the export's memory
+EXPORT_SCHEMAS = {
+    'document': [('section', 'string'), ('key', 'string'), ('value', 'float64')],
+    'tokens': [('token_id', 'int64'), ('sentence_id', 'int64'), ('start_char', 'int64'), ('text', 'string'),
+               ('lemma', 'string'), ('pos', 'string'), ('is_stop', 'bool'), ('is_punct', 'bool'),
+               ('is_space', 'bool'), ('sentiment', 'float64')],
+    'sentences': [('sentence_id', 'int64'), ('start_char', 'int64'), ('end_char', 'int64'),
+                  ('word_count', 'int64'), ('polarity', 'float64'), ('subjectivity', 'float64'),
+                  ('assessments', 'int64'), ('text', 'string')],
+}
 
-def export_analysis_results(doc, filename="text_analysis_report.txt"):
+@instrumented("export")
+def export_analysis_results(doc, filename="text_analysis_report.txt", session=None, sections=DEFAULT_EXPORT_SECTIONS):
     """export comprehensive analysis results to a file"""
+    # reuse results already computed in the interactive session
+    if session is None:
+        session = AnalysisSession(doc)
+    
     with open(filename, 'w', encoding='utf-8') as f:
         f.write("TEXT ANALYSIS REPORT\n")
         f.write("=" * 50 + "\n\n")
         
-        # basic statistics
-        stats = get_text_statistics(doc)
-        f.write("TEXT STATISTICS:\n")
-        for key, value in stats.items():
-            f.write(f"{key.replace('_', ' ').title()}: {value}\n")
-        
-        f.write("\n" + "=" * 50 + "\n\n")
-        
-        # most frequent tokens
-        f.write("MOST FREQUENT TOKENS:\n")
-        tokens = get_most_frequent_tokens(doc, 20)
-        for i, (token, count) in enumerate(tokens, 1):
-            f.write(f"{i}. {token}: {count}\n")
-        
-        f.write("\n" + "=" * 50 + "\n\n")
-        
-        # sentiment analysis
-        polarity, subjectivity = get_overall_sentiment(doc)
-        f.write("SENTIMENT ANALYSIS:\n")
-        f.write(f"Polarity: {polarity:.3f}\n")
-        f.write(f"Subjectivity: {subjectivity:.3f}\n")
+        written = [name for name in EXPORT_SECTIONS if name in sections]
+        for i, name in enumerate(written):
+            if i > 0:
+                f.write("\n" + "=" * 50 + "\n\n")
+            EXPORT_SECTIONS[name](f, session)
         
-        f.write("\n" + "=" * 50 + "\n\n")
-        
-        # part-of-speech distribution
-        f.write("PART-OF-SPEECH DISTRIBUTION:\n")
-        pos_dist = get_pos_distribution(doc)
-        total = sum(pos_dist.values())
-        for pos, count in pos_dist.most_common():
-            percentage = (count / total) * 100
-            f.write(f"{pos}: {count} ({percentage:.1f}%)\n")
+        if instrumentation_enabled():
+            f.write("\n" + "=" * 50 + "\n\n")
+            write_timings_section(f, session)
     
+    flush_instrumentation()
     return filename
 
+def get_document_rows_statistics(session):
+    """(key, value) pairs of the text statistics"""
+    return session.text_statistics().items()
+
+def get_document_rows_tokens(session):
+    """(token, count) pairs of every counted token, most frequent first"""
+    return session.run(get_token_counts).most_common()
+
+def get_document_rows_lemmas(session):
+    """(lemma, count) pairs of every counted lemma, most frequent first"""
+    return session.run(get_lemma_counts).most_common()
+
+def get_document_rows_sentiment(session):
+    """overall polarity and subjectivity plus the polarity by position"""
+    if session.is_streamed():
+        return []
+    polarity, subjectivity = session.overall_sentiment()
+    rows = [('polarity', polarity), ('subjectivity', subjectivity)]
+    for i, value in enumerate(session.sentiment_by_position(), 1):
+        rows.append((f'position_{i}', value))
+    return rows
+
+def get_document_rows_pos(session):
+    """(pos, count) pairs, most frequent first"""
+    return session.pos_distribution().most_common()
+
+def get_document_rows_noun_phrases(session):
+    """(phrase, count) pairs of every noun phrase, most frequent first"""
+    return session.run(get_noun_phrase_counts).most_common()
+
+def get_document_rows_readability(session):
+    """(metric, score) pairs of every readability metric"""
+    return session.readability_scores().items()
+
+# document level sections of a structured export, the word cloud has no rows
+STRUCTURED_SECTIONS = {
+    'statistics': get_document_rows_statistics,
+    'tokens': get_document_rows_tokens,
+    'lemmas': get_document_rows_lemmas,
+    'sentiment': get_document_rows_sentiment,
+    'pos': get_document_rows_pos,
+    'noun_phrases': get_document_rows_noun_phrases,
+    'readability': get_document_rows_readability,
+}
+
+def iter_document_rows(session, sections=DEFAULT_EXPORT_SECTIONS, batch_rows=EXPORT_ROW_BATCH):
+    """yield batches of (section, key, value) rows for the document level results"""
+    batch = []
+    for name in STRUCTURED_SECTIONS:
+        if name not in sections:
+            continue
+        for key, value in STRUCTURED_SECTIONS[name](session):
+            batch.append((name, str(key), None if value is None else float(value)))
+            if len(batch) >= batch_rows:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def iter_token_rows(session, batch_rows=EXPORT_ROW_BATCH):
+    """yield batches of per-token rows, converting only one batch of columns at a time"""
+    table = session.token_table(*EXPORT_TABLE_ANALYSES['tokens'])
+    strings = table.strings
+    engine = get_token_sentiment_engine()
+    for start in range(0, len(table), batch_rows):
+        stop = min(start + batch_rows, len(table))
+        texts = [strings[value] for value in table.orth[start:stop].tolist()]
+        lemmas = [strings[value] for value in table.lemma[start:stop].tolist()]
+        pos_tags = [strings[value] for value in table.pos[start:stop].tolist()]
+        yield list(zip(range(start, stop), table.sent_ids[start:stop].tolist(), table.idx[start:stop].tolist(),
+                       texts, lemmas, pos_tags, table.is_stop[start:stop].tolist(),
+                       table.is_punct[start:stop].tolist(), table.is_space[start:stop].tolist(),
+                       [engine.polarity(text) for text in texts]))
+
+def iter_sentence_rows(session, batch_rows=EXPORT_ROW_BATCH):
+    """yield batches of per-sentence rows with their sentiment scores"""
+    text = session.doc.text
+    batch = []
+    for i, (start_char, end_char, word_count, polarity, subjectivity, assessments) in enumerate(session.sentence_sentiments()):
+        batch.append((i, start_char, end_char, word_count, polarity, subjectivity, assessments,
+                      text[start_char:end_char]))
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def write_jsonl_tables(path, tables):
+    """write every table into one JSON Lines file, one object per row tagged with its table"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for name, batches in tables:
+            columns = [column for column, _ in EXPORT_SCHEMAS[name]]
+            for batch in batches:
+                f.writelines(json.dumps({"record": name, **dict(zip(columns, row))}, ensure_ascii=False) + "\n"
+                             for row in batch)
+    return [path]
+
+def write_csv_tables(base, tables):
+    """write each table to its own CSV file next to base"""
+    paths = []
+    for name, batches in tables:
+        path = f"{base}_{name}.csv"
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([column for column, _ in EXPORT_SCHEMAS[name]])
+            for batch in batches:
+                writer.writerows(batch)
+        paths.append(path)
+    return paths
+
+def write_parquet_tables(base, tables):
+    """write each table to its own Parquet file next to base, one row group per batch"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    types = {'int64': pa.int64(), 'float64': pa.float64(), 'string': pa.string(), 'bool': pa.bool_()}
+    paths = []
+    for name, batches in tables:
+        path = f"{base}_{name}.parquet"
+        schema = pa.schema([(column, types[kind]) for column, kind in EXPORT_SCHEMAS[name]])
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in batches:
+                arrays = [pa.array(list(values), type=field.type) for values, field in zip(zip(*batch), schema)]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        paths.append(path)
+    return paths
+
+STRUCTURED_WRITERS = {
+    'jsonl': write_jsonl_tables,
+    'csv': write_csv_tables,
+    'parquet': write_parquet_tables,
+}
+
+@instrumented("export")
+def export_structured(doc, output_path, output_format="jsonl", session=None, sections=DEFAULT_EXPORT_SECTIONS,
+                      tables=()):
+    """export the results as JSON Lines, CSV or Parquet, return the paths written
+    
+    the document results always go out, tables adds per-token and per-sentence rows.
+    rows are produced and written one batch at a time. JSON Lines puts everything in
+    output_path, CSV and Parquet write one {base}_{table} file per table
+    """
+    if output_format not in STRUCTURED_WRITERS:
+        print(f"Error exporting results: unknown format '{output_format}'")
+        return None
+    if output_format == 'parquet' and importlib.util.find_spec("pyarrow") is None:
+        print("Error exporting results: Parquet export needs pyarrow (pip install pyarrow)")
+        return None
+    if session is None:
+        session = AnalysisSession(doc)
+    
+    selected = [('document', iter_document_rows(session, sections))]
+    for name in EXPORT_TABLES:
+        if name not in tables:
+            continue
+        if session.is_streamed():
+            print(f"Skipping the {name} table, not available for files analyzed in streaming mode.")
+            continue
+        selected.append((name, iter_token_rows(session) if name == 'tokens' else iter_sentence_rows(session)))
+    
+    base = os.path.splitext(output_path)[0] if output_format != 'jsonl' else output_path
+    try:
+        paths = STRUCTURED_WRITERS[output_format](base, selected)
+    except OSError as e:
+        print(f"Error exporting results: {e}")
+        return None
+    flush_instrumentation()
+    return paths
+
 def get_file_path_from_user():
-    """get file path from user by displaying available .txt files"""
+    """get file path from user by displaying available text files, plain or compressed"""
     clear_screen()
     print("="*60)
     print("ANALYZE NEW FILE")
     print("="*60)
     
-    # get all .txt files in the current directory
+    # get all text files in the current directory
     current_dir = os.path.dirname(os.path.abspath(__file__)) or os.getcwd()
-    txt_files = [f for f in os.listdir(current_dir) 
-                if f.endswith('.txt') and os.path.isfile(os.path.join(current_dir, f))]
+    txt_files = [f for f in sorted(os.listdir(current_dir))
+                if f.lower().endswith(TEXT_FILE_EXTENSIONS) and os.path.isfile(os.path.join(current_dir, f))]
     
     if not txt_files:
-        print("No .txt files found in the current directory.")
+        print(f"No text files ({', '.join(TEXT_FILE_EXTENSIONS)}) found in the current directory.")
         print(f"Current directory: {current_dir}")
         print("\nPlease make sure your text files are in the same directory as this script.")
         time.sleep(3)
@@ -603,27 +3557,77 @@ def main_analysis_loop(user_id, username, file_path):
     """main analysis loop for a specific file"""
     # load and process the file
     filename = os.path.basename(file_path)
-    text = load_text_file(file_path)
-    if text is None:
-        return False
-    
-    # add to user's history
-    add_to_history(user_id, file_path, filename)
+    if os.path.isfile(file_path) and needs_streaming(file_path):
+        # too large for a single doc, analyze it chunk by chunk without keeping the text
+        try:
+            content_hash = compute_file_hash(file_path)
+        except Exception as e:
+            print(f"Error reading file: {e}")
+            time.sleep(1.5)
+            return False
+        add_to_history(user_id, file_path, filename, content_hash=content_hash)
+        session = AnalysisSession(None, content_hash=content_hash)
+        if not session.has_streamed_results():
+            clear_screen()
+            print("Processing large file in streaming mode...")
+            try:
+                accumulator = run_with_loading_animation(analyze_file_streaming, file_path)
+            except Exception as e:
+                print(f"Error reading file: {e}")
+                time.sleep(1.5)
+                return False
+            session = AnalysisSession(None, accumulator, content_hash=content_hash)
+    else:
+        text = load_text_file(file_path)
+        if text is None:
+            return False
+        
+        # results stored for this exact content are shown without running spaCy
+        content_hash = compute_content_hash(text)
+        add_to_history(user_id, file_path, filename, content_hash=content_hash)
+        
+        def load_doc():
+            # link the history entry to the doc cache entry for this content
+            cache_key = get_doc_cache_key(text)
+            add_to_history(user_id, file_path, filename, cache_key, content_hash)
+            # tokenize only, each menu choice adds just the annotations it needs
+            return preprocess_text(text, cache_key, ()), cache_key
+        
+        def accumulate(analyses):
+            # only the requested paragraph analyses, stored once per paragraph
+            return analyze_paragraphs(text, analyses)
+        
+        # every menu choice and the export share one set of computed results
+        session = AnalysisSession(None, content_hash=content_hash, load_doc=load_doc,
+                                  accumulate=accumulate if INCREMENTAL_ANALYSIS else None)
+        if session.stored_result_count():
+            clear_screen()
+            print(f"Loaded {session.stored_result_count()} saved results.")
+            time.sleep(1)
     
-    # preprocess the text
-    clear_screen()
-    print("Processing text...")
-    doc = run_with_loading_animation(preprocess_text, text)
+    # use the time the user spends reading the menu
+    scheduler = start_precompute(session) if PRECOMPUTE_ANALYSES else None
     
     while True:
+        # keep the timings of each menu choice even if the app is killed later
+        flush_instrumentation()
         clear_screen()
         display_menu(username)
         choice = input("Please enter your choice (1-15): ").strip()
         
+        if session.is_streamed() and choice in STREAMING_UNAVAILABLE_CHOICES:
+            clear_screen()
+            print("This analysis needs the full document and is not available in streaming mode.")
+            time.sleep(1.5)
+            continue
+        
+        if scheduler:
+            scheduler.prioritize(choice)
+        
         if choice == '1':
             clear_screen()
             print("Analyzing most frequent tokens...")
-            tokens = run_with_loading_animation(get_most_frequent_tokens, doc, 15)
+            tokens = run_with_loading_animation(session.most_frequent_tokens, 15)
             clear_screen()
             print("Most frequent tokens (excluding stop words and punctuation):\n")
             for i, (token, count) in enumerate(tokens, 1):
@@ -632,7 +3636,7 @@ def main_analysis_loop(user_id, username, file_path):
         elif choice == '2':
             clear_screen()
             print("Analyzing most frequent lemmas...")
-            lemmas = run_with_loading_animation(get_most_frequent_lemmas, doc, 15)
+            lemmas = run_with_loading_animation(session.most_frequent_lemmas, 15)
             clear_screen()
             print("Most frequent lemmas (excluding stop words and punctuation):\n")
             for i, (lemma, count) in enumerate(lemmas, 1):
@@ -641,7 +3645,7 @@ def main_analysis_loop(user_id, username, file_path):
         elif choice == '3':
             clear_screen()
             print("Calculating sentiment analysis...")
-            polarity, subjectivity = run_with_loading_animation(get_overall_sentiment, doc)
+            polarity, subjectivity = run_with_loading_animation(session.overall_sentiment)
             clear_screen()
             print("SENTIMENT ANALYSIS:\n")
             print(f"Polarity: {polarity:.3f}")
@@ -658,11 +3662,24 @@ def main_analysis_loop(user_id, username, file_path):
                 print("The text is quite subjective (personal opinions).")
             else:
                 print("The text is quite objective (factual information).")
+            
+            if SENTIMENT_MODE == "sentence":
+                # the per-sentence scores are already stored, this view is free
+                print("\nSentiment by position in the document:\n")
+                for i, polarity in enumerate(session.sentiment_by_position()):
+                    start = i * 100 // SENTIMENT_POSITION_BUCKETS
+                    end = (i + 1) * 100 // SENTIMENT_POSITION_BUCKETS
+                    if polarity is None:
+                        print(f"{start:>3}-{end:<3}%  (no sentiment words)")
+                        continue
+                    bar_length = int(round(abs(polarity) * 20))
+                    bar = ("+" if polarity >= 0 else "-") * bar_length
+                    print(f"{start:>3}-{end:<3}%  {polarity:+.3f} {bar}")
                 
         elif choice == '4':
             clear_screen()
             print("Finding tokens with highest sentiment...")
-            top_tokens = run_with_loading_animation(get_unique_sentiment_by_tokens, doc, highest=True)
+            top_tokens = run_with_loading_animation(session.unique_sentiment_by_tokens, highest=True)
             clear_screen()
             print("Tokens with highest sentiment values (unique lemmas):\n")
             for i, (token, sentiment) in enumerate(top_tokens, 1):
@@ -671,7 +3688,7 @@ def main_analysis_loop(user_id, username, file_path):
         elif choice == '5':
             clear_screen()
             print("Finding tokens with lowest sentiment...")
-            low_tokens = run_with_loading_animation(get_unique_sentiment_by_tokens, doc, highest=False)
+            low_tokens = run_with_loading_animation(session.unique_sentiment_by_tokens, highest=False)
             clear_screen()
             print("Tokens with lowest sentiment values (unique lemmas):\n")
             for i, (token, sentiment) in enumerate(low_tokens, 1):
@@ -680,7 +3697,7 @@ def main_analysis_loop(user_id, username, file_path):
         elif choice == '6':
             clear_screen()
             print("Calculating text statistics...")
-            stats = run_with_loading_animation(get_text_statistics, doc)
+            stats = run_with_loading_animation(session.text_statistics)
             clear_screen()
             print("TEXT STATISTICS:\n")
             for key, value in stats.items():
@@ -689,7 +3706,7 @@ def main_analysis_loop(user_id, username, file_path):
         elif choice == '7':
             clear_screen()
             print("Analyzing part-of-speech distribution...")
-            pos_dist = run_with_loading_animation(get_pos_distribution, doc)
+            pos_dist = run_with_loading_animation(session.pos_distribution)
             clear_screen()
             print("PART-OF-SPEECH DISTRIBUTION:\n")
             total = sum(pos_dist.values())
@@ -699,11 +3716,14 @@ def main_analysis_loop(user_id, username, file_path):
                 
         elif choice == '8':
             clear_screen()
+            image_path = input("Enter image filename, .png or .svg (or press Enter for default): ").strip()
+            if not image_path:
+                image_path = "wordcloud.png"
             print("Generating word cloud...")
             try:
-                run_with_loading_animation(generate_wordcloud, doc)
+                output_file = run_with_loading_animation(session.wordcloud, image_path)
                 clear_screen()
-                print("Word cloud generated and displayed.")
+                print(f"Word cloud saved to: {output_file}")
             except Exception as e:
                 clear_screen()
                 print(f"Error generating word cloud: {e}")
@@ -713,7 +3733,7 @@ def main_analysis_loop(user_id, username, file_path):
         elif choice == '9':
             clear_screen()
             print("Extracting noun phrases...")
-            noun_phrases = run_with_loading_animation(get_most_common_noun_phrases, doc)
+            noun_phrases = run_with_loading_animation(session.most_common_noun_phrases)
             clear_screen()
             print("MOST COMMON NOUN PHRASES:\n")
             for i, (phrase, count) in enumerate(noun_phrases, 1):
@@ -721,11 +3741,15 @@ def main_analysis_loop(user_id, username, file_path):
                 
         elif choice == '10':
             clear_screen()
-            print("Calculating readability score...")
-            score = run_with_loading_animation(get_readability_score, doc)
+            print("Calculating readability scores...")
+            scores = run_with_loading_animation(session.readability_scores)
+            sections = run_with_loading_animation(session.readability_sections)
+            score = scores['flesch_reading_ease']
             clear_screen()
-            print("READABILITY SCORE (Flesch Reading Ease):\n")
-            print(f"Score: {score:.1f}\n")
+            print("READABILITY SCORES:\n")
+            for name, value in scores.items():
+                print(f"{READABILITY_LABELS[name] + ':':<30} {value:.1f}")
+            print()
             
             if score >= 90:
                 print("Very easy to read (5th grade level)")
@@ -741,21 +3765,52 @@ def main_analysis_loop(user_id, username, file_path):
                 print("Difficult to read (college level)")
             else:
                 print("Very difficult to read (graduate level)")
+            
+            if len(sections) > 1:
+                print(f"\nBy section ({READABILITY_SECTION_SENTENCES} sentences each):")
+                for line in format_readability_sections(sections):
+                    print(line)
                 
         elif choice == '11':
             clear_screen()
+            print("Tip: search a phrase with several words, or prefix with 'lemma:' to match")
+            print("every form of a word (lemma:run also finds 'ran').\n")
             keyword = input("Enter keyword to search for: ").strip()
+            lemma = keyword.lower().startswith('lemma:')
+            if lemma:
+                keyword = keyword[len('lemma:'):].strip()
             if keyword:
-                clear_screen()
-                print(f"Searching for '{keyword}' in context...")
-                results = run_with_loading_animation(display_keyword_in_context, doc, keyword)
-                clear_screen()
-                print(f"KEYWORD IN CONTEXT: '{keyword}'\n")
-                if results:
-                    for i, context in enumerate(results, 1):
-                        print(f"{i}. ...{context}...")
-                else:
-                    print("No occurrences found.")
+                width = input("Context width in tokens (press Enter for 3): ").strip()
+                context = int(width) if width.isdigit() else 3
+                
+                # the index is built on the first search, later searches are instant
+                if not session.has_result('build_keyword_index'):
+                    clear_screen()
+                    print("Building keyword index...")
+                    run_with_loading_animation(session.keyword_index)
+                
+                offset = 0
+                while True:
+                    results, total = session.keyword_in_context(keyword, context, lemma, offset)
+                    clear_screen()
+                    label = f"lemma '{keyword}'" if lemma else f"'{keyword}'"
+                    print(f"KEYWORD IN CONTEXT: {label}\n")
+                    if not results:
+                        print("No occurrences found.")
+                        break
+                    for i, context_text in enumerate(results, offset + 1):
+                        print(f"{i}. ...{context_text}...")
+                    print(f"\nShowing {offset + 1}-{offset + len(results)} of {total} occurrences.")
+                    if total <= KWIC_PAGE_SIZE:
+                        break
+                    
+                    page_choice = input("'n' next page, 'p' previous page, Enter to finish: ").strip().lower()
+                    if page_choice == 'n' and offset + KWIC_PAGE_SIZE < total:
+                        offset += KWIC_PAGE_SIZE
+                    elif page_choice == 'p' and offset > 0:
+                        offset -= KWIC_PAGE_SIZE
+                    elif page_choice == '':
+                        break
             else:
                 clear_screen()
                 print("No keyword entered.")
@@ -764,18 +3819,39 @@ def main_analysis_loop(user_id, username, file_path):
                 
         elif choice == '12':
             clear_screen()
+            formats = ('text',) + STRUCTURED_EXPORT_FORMATS
+            export_format = input(f"Export format ({', '.join(formats)}, press Enter for text): ").strip().lower()
+            export_format = export_format or 'text'
+            if export_format not in formats:
+                print("Invalid format.")
+                time.sleep(1)
+                continue
+            extension = 'txt' if export_format == 'text' else export_format
             filename = input("Enter output filename (or press Enter for default): ").strip()
             if not filename:
-                filename = "text_analysis_report.txt"
-            print("Exporting analysis results...")
-            output_file = run_with_loading_animation(export_analysis_results, doc, filename)
+                filename = f"text_analysis_report.{extension}"
+            if export_format == 'text':
+                print("Exporting analysis results...")
+                output_file = run_with_loading_animation(export_analysis_results, None, filename, session=session)
+            else:
+                include = input("Include the per-token and per-sentence tables? (y/n): ").strip().lower()
+                tables = EXPORT_TABLES if include == 'y' else ()
+                print("Exporting analysis results...")
+                output_files = run_with_loading_animation(export_structured, None, filename, export_format,
+                                                          session=session, tables=tables)
+                output_file = ", ".join(output_files) if output_files else None
             clear_screen()
-            print(f"Analysis results exported to: {output_file}")
+            if output_file:
+                print(f"Analysis results exported to: {output_file}")
+            else:
+                print("Export failed.")
                 
         elif choice == '13':
             # riew history
             selected_file = display_history_menu(user_id)
             if selected_file:
+                if scheduler:
+                    scheduler.cancel()
                 # re-analyze the selected file
                 return selected_file  # this will break the current loop and restart with the new file
             
@@ -783,11 +3859,15 @@ def main_analysis_loop(user_id, username, file_path):
             # analyze new file
             new_file_path = get_file_path_from_user()
             if new_file_path:
+                if scheduler:
+                    scheduler.cancel()
                 return new_file_path  # this will break the current loop and restart with the new file
             
         elif choice == '15':
             clear_screen()
             print("Logging out...")
+            if scheduler:
+                scheduler.cancel()
             time.sleep(1.5)
             return None  # signal to logout
             
@@ -805,6 +3885,10 @@ def main_analysis_loop(user_id, username, file_path):
 
 def main():
     """main application entry point"""
+    # the model loads in the background while the user logs in
+    start_model_warmup()
+    init_database()
+    
     current_user = None
     current_username = None
     current_file_path = None
@@ -848,5 +3932,619 @@ def main():
                 # xwitch to different file (either from history or new file)
                 current_file_path = result
 
+def collect_batch_files(inputs, pattern="*.txt"):
+    """expand directories and glob patterns into a sorted list of files"""
+    file_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, pattern))
+        else:
+            matches = glob.glob(item)
+        file_paths.extend(sorted(os.path.abspath(m) for m in matches if os.path.isfile(m)))
+    # drop duplicates from overlapping inputs, keep the order
+    return list(dict.fromkeys(file_paths))
+
+def get_batch_report_path(output_dir, file_path, used_names, extension="txt"):
+    """choose a unique report file name for an input file"""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    name = f"{stem}_report.{extension}"
+    counter = 2
+    while name in used_names:
+        name = f"{stem}_{counter}_report.{extension}"
+        counter += 1
+    used_names.add(name)
+    return os.path.join(output_dir, name)
+
+@instrumented("batch")
+def run_batch(file_paths, analyses=DEFAULT_EXPORT_SECTIONS, output_dir="reports", user_id=None,
+              n_process=1, batch_size=BATCH_SIZE, progress=None, encoding=None, output_format="text", tables=(),
+              say=None):
+    """analyze many files headlessly and write one report per file plus a summary
+    
+    output_format "text" writes the plain report, any of STRUCTURED_EXPORT_FORMATS a structured export.
+    a file that fails is logged through say(message, error=True) and listed in the
+    summary with its error, the run goes on with the next file
+    """
+    progress = progress or Progress()
+    say = say or (lambda message, error=False: print(message))
+    progress.start("Analyzing files", len(file_paths), "files")
+    nlp = get_nlp()
+    os.makedirs(output_dir, exist_ok=True)
+    accumulator_analyses = [name for name in analyses if name in AnalysisAccumulator.ANALYSES] + ['statistics']
+    used_names = set()
+    rows = []
+    large_files = []
+    pending_history = []  # written in batches instead of one transaction per file
+    
+    def record_error(file_path, message):
+        say(f"Error analyzing {file_path}: {message}", error=True)
+        rows.append([file_path, '', 'error', 0, 0, 0, message])
+        progress.advance()
+    
+    def write_report(session, file_path, content_hash=None):
+        report_path = get_batch_report_path(output_dir, file_path, used_names,
+                                            "txt" if output_format == "text" else output_format)
+        if output_format == "text":
+            export_analysis_results(session.doc, report_path, session=session, sections=analyses)
+        else:
+            # csv and parquet write one file per table, the summary lists them all
+            report_path = ";".join(export_structured(session.doc, report_path, output_format, session=session,
+                                                     sections=analyses, tables=tables) or [])
+        if user_id is not None:
+            # keep the counts the report computed for the user's corpus analytics
+            for func in (get_token_counts, get_lemma_counts):
+                if content_hash and session.has_result(func.__name__):
+                    save_term_vector(content_hash, TERM_VECTOR_RESULTS[func.__name__], session.run(func))
+            pending_history.append((file_path, os.path.basename(file_path), None, content_hash))
+            if len(pending_history) >= HISTORY_WRITE_BATCH:
+                add_many_to_history(user_id, pending_history)
+                pending_history.clear()
+        stats = session.text_statistics()
+        if not report_path:
+            raise ValueError("the report could not be written")
+        rows.append([file_path, report_path, 'ok', stats['total_characters'],
+                     stats['total_words'], stats['total_sentences'], ''])
+        progress.advance()
+    
+    def iter_texts():
+        for file_path in file_paths:
+            try:
+                if needs_streaming(file_path):
+                    # streamed separately below so a huge file never goes to a worker whole
+                    large_files.append(file_path)
+                    continue
+                text = load_text_file(file_path, encoding)
+                if text is None:
+                    raise ValueError("the file could not be read")
+                content_hash = compute_content_hash(text) if user_id is not None else None
+            except Exception as e:
+                record_error(file_path, str(e))
+                continue
+            yield text, (file_path, content_hash)
+    
+    start_time = time.perf_counter()
+    # the summary always needs the statistics, everything else only what was asked for
+    table_analyses = [analysis for name in tables for analysis in EXPORT_TABLE_ANALYSES[name]]
+    with planned_pipeline(list(analyses) + ['statistics'] + table_analyses) as pipes:
+        for doc, (file_path, content_hash) in nlp.pipe(iter_texts(), as_tuples=True, n_process=n_process,
+                                                       batch_size=batch_size):
+            set_applied_pipes(doc, pipes)
+            try:
+                write_report(AnalysisSession(doc), file_path, content_hash)
+            except Exception as e:
+                record_error(file_path, str(e))
+    
+    for file_path in large_files:
+        try:
+            # the stream reports its bytes into a detached progress, the files stage stays intact
+            with reporting_progress(Progress()):
+                accumulator = analyze_file_streaming(file_path, accumulator_analyses, encoding)
+            content_hash = compute_file_hash(file_path) if user_id is not None else None
+            write_report(AnalysisSession(None, accumulator), file_path, content_hash)
+        except Exception as e:
+            record_error(file_path, str(e))
+    if pending_history:
+        add_many_to_history(user_id, pending_history)
+    elapsed = time.perf_counter() - start_time
+    
+    summary_path = os.path.join(output_dir, "batch_summary.csv")
+    with open(summary_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file_path', 'report_path', 'status', 'total_characters', 'total_words', 'total_sentences',
+                         'error'])
+        writer.writerows(rows)
+    
+    processed = sum(1 for row in rows if row[2] == 'ok')
+    progress.finish()
+    flush_instrumentation()
+    return {
+        "files": len(file_paths),
+        "processed": processed,
+        "failed": len(rows) - processed,
+        "seconds": elapsed,
+        "docs_per_second": processed / elapsed if elapsed > 0 else 0,
+        "summary_path": summary_path,
+    }
+
+def service_tokens(session, options):
+    """most frequent tokens as [token, count] pairs"""
+    return session.most_frequent_tokens(options['n'])
+
+def service_lemmas(session, options):
+    """most frequent lemmas as [lemma, count] pairs"""
+    return session.most_frequent_lemmas(options['n'])
+
+def service_sentiment(session, options):
+    """overall polarity and subjectivity, with the polarity by position in sentence mode"""
+    polarity, subjectivity = session.overall_sentiment()
+    by_position = session.sentiment_by_position() if SENTIMENT_MODE == "sentence" else None
+    return {"polarity": polarity, "subjectivity": subjectivity, "by_position": by_position}
+
+def service_statistics(session, options):
+    """the text statistics"""
+    return session.text_statistics()
+
+def service_pos(session, options):
+    """part-of-speech counts, most frequent first"""
+    return dict(session.pos_distribution().most_common())
+
+def service_readability(session, options):
+    """every readability metric"""
+    return session.readability_scores()
+
+def service_kwic(session, options):
+    """one page of keyword in context matches and the total number of hits"""
+    matches, total = session.keyword_in_context(options['keyword'], options['context'], options['lemma'],
+                                                options['offset'], options['limit'])
+    return {"matches": matches, "total": total}
+
+def service_noun_phrases(session, options):
+    """most common noun phrases as [phrase, count] pairs"""
+    return session.most_common_noun_phrases(options['n'])
+
+# analyses the service exposes, each also has its own endpoint
+SERVICE_ANALYSES = {
+    'tokens': service_tokens,
+    'lemmas': service_lemmas,
+    'sentiment': service_sentiment,
+    'statistics': service_statistics,
+    'pos': service_pos,
+    'readability': service_readability,
+    'kwic': service_kwic,
+    'noun_phrases': service_noun_phrases,
+}
+
+def parse_service_request(analyses, body):
+    """validate a JSON request body, return the request dict or raise ValueError
+    
+    the body holds "text" and, for /analyze, an optional list of "analyses". the options
+    "n", "keyword", "context", "lemma", "offset" and "limit" are optional
+    (a keyword is required for kwic), "name" labels the text in the history
+    """
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise ValueError("the body is not valid JSON")
+    if not isinstance(data, dict):
+        raise ValueError("the body must be a JSON object")
+    text = data.get('text')
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("'text' must be a non-empty string")
+    if len(text) > get_nlp().max_length:
+        raise ValueError(f"'text' is longer than {get_nlp().max_length} characters")
+    
+    if analyses is None:
+        # everything by default, keyword in context only when there is a keyword
+        analyses = data.get('analyses', [name for name in SERVICE_ANALYSES if name != 'kwic' or data.get('keyword')])
+        if not isinstance(analyses, list) or not analyses:
+            raise ValueError("'analyses' must be a non-empty list")
+        if not all(isinstance(name, str) for name in analyses):
+            raise ValueError("'analyses' must be a list of names")
+        unknown = [name for name in analyses if name not in SERVICE_ANALYSES]
+        if unknown:
+            raise ValueError(f"unknown analyses: {', '.join(unknown)}")
+    
+    options = {
+        'n': data.get('n', 10),
+        'keyword': data.get('keyword'),
+        'context': data.get('context', 3),
+        'lemma': bool(data.get('lemma', False)),
+        'offset': data.get('offset', 0),
+        'limit': data.get('limit', KWIC_PAGE_SIZE),
+    }
+    for name in ('n', 'context', 'offset', 'limit'):
+        if not isinstance(options[name], int) or options[name] < 0:
+            raise ValueError(f"'{name}' must be a non-negative integer")
+    if 'kwic' in analyses and not (isinstance(options['keyword'], str) and options['keyword'].strip()):
+        raise ValueError("kwic needs a 'keyword'")
+    
+    # the pipeline components come from the analyses, kwic on lemmas needs the lemmatizer
+    pipeline = [('kwic_lemma' if options['lemma'] else 'kwic') if name == 'kwic' else name for name in analyses]
+    return {'text': text, 'analyses': list(dict.fromkeys(analyses)), 'pipeline': pipeline,
+            'options': options, 'name': str(data.get('name') or "service request")}
+
+@instrumented("service")
+def process_service_batch(requests):
+    """run one micro-batch of requests through nlp.pipe, return a (status, payload) per request
+    
+    every text is recorded in its user's history under a service: path with its
+    content hash, and its token/lemma counts are kept for corpus analytics
+    """
+    nlp = get_nlp()
+    with planned_pipeline([name for request in requests for name in request['pipeline']]) as pipes:
+        docs = list(nlp.pipe((request['text'] for request in requests), batch_size=len(requests)))
+    
+    responses = []
+    history = {}  # user_id -> (entries, sizes), one transaction per user
+    for request, doc in zip(requests, docs):
+        set_applied_pipes(doc, pipes)
+        session = AnalysisSession(doc)
+        try:
+            results = {name: SERVICE_ANALYSES[name](session, request['options']) for name in request['analyses']}
+        except Exception as e:
+            responses.append((500, {"error": f"Error analyzing text: {e}"}))
+            continue
+        responses.append((200, {"results": results, "batch_size": len(requests)}))
+        
+        content_hash = compute_content_hash(request['text'])
+        for func in (get_token_counts, get_lemma_counts):
+            if session.has_result(func.__name__):
+                save_term_vector(content_hash, TERM_VECTOR_RESULTS[func.__name__], session.run(func))
+        entries, sizes = history.setdefault(request['user_id'], ([], []))
+        entries.append((SERVICE_HISTORY_PREFIX + content_hash, request['name'], None, content_hash))
+        sizes.append(len(request['text'].encode('utf-8')))
+    
+    for user_id, (entries, sizes) in history.items():
+        add_many_to_history(user_id, entries, sizes)
+    flush_instrumentation()
+    return responses
+
+class AnalysisService:
+    """localhost HTTP API for the analyses, with the model loaded once
+    
+    connections are handled on one asyncio event loop, and every analysis
+    request goes into a queue. a single worker thread takes whatever is
+    queued (up to max_batch requests, waiting at most batch_wait seconds
+    for more) and runs it through nlp.pipe together, so concurrent clients
+    share spaCy's batching while the loop keeps accepting requests.
+    requests authenticate with HTTP Basic auth against the users table
+    """
+    
+    def __init__(self, host=SERVICE_HOST, port=SERVICE_PORT, max_batch=SERVICE_MAX_BATCH,
+                 batch_wait=SERVICE_BATCH_WAIT):
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self.request_count = 0
+        self.batch_count = 0
+        self._credentials = {}  # (username, password hash) -> user_id of successful logins
+        self._queue = None
+        self._executor = None
+    
+    async def serve(self, ready=None):
+        """load the model, then accept connections until cancelled; ready(service) runs once listening"""
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        loop = asyncio.get_running_loop()
+        # spaCy runs on one thread, the pipeline settings are shared between batches
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="service-batch")
+        await loop.run_in_executor(self._executor, get_nlp)
+        self._queue = asyncio.Queue()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                            limit=SERVICE_MAX_HEADER_BYTES)
+        self.port = server.sockets[0].getsockname()[1]
+        batcher = asyncio.ensure_future(self._batch_loop())
+        if ready:
+            ready(self)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._executor.shutdown(wait=True)
+    
+    async def _batch_loop(self):
+        """take queued requests a micro-batch at a time and answer them"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                responses = await loop.run_in_executor(self._executor, process_service_batch,
+                                                       [request for request, _ in batch])
+            except Exception as e:
+                responses = [(500, {"error": f"Error analyzing text: {e}"})] * len(batch)
+            self.batch_count += 1
+            for (_, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+    
+    async def _authenticate(self, authorization):
+        """return the user id for a Basic Authorization header, or None"""
+        import asyncio
+        import base64
+        scheme, _, encoded = (authorization or "").partition(" ")
+        if scheme.lower() != "basic":
+            return None
+        try:
+            username, _, password = base64.b64decode(encoded, validate=True).decode('utf-8').partition(":")
+        except ValueError:
+            return None
+        key = (username, hash_password(password))
+        if key not in self._credentials:
+            # a database round trip only for credentials not seen yet
+            user_id = await asyncio.get_running_loop().run_in_executor(None, authenticate_user, username, password)
+            if user_id is None:
+                return None
+            self._credentials[key] = user_id
+        return self._credentials[key]
+    
+    async def _dispatch(self, method, path, headers, body):
+        """return (status, payload) for one HTTP request"""
+        import asyncio
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        if path == "/health":
+            return 200, {"status": "ok", "pipeline": get_nlp().pipe_names, "requests": self.request_count,
+                         "batches": self.batch_count, "queued": self._queue.qsize(),
+                         "max_batch": self.max_batch, "batch_wait": self.batch_wait}
+        
+        name = path[1:]
+        if name != "analyze" and name not in SERVICE_ANALYSES:
+            return 404, {"error": f"unknown endpoint {path}, use /analyze or one of: "
+                                  f"{', '.join('/' + name for name in SERVICE_ANALYSES)}"}
+        if method != "POST":
+            return 405, {"error": "use POST with a JSON body"}
+        user_id = await self._authenticate(headers.get("authorization"))
+        if user_id is None:
+            return 401, {"error": "invalid or missing credentials"}
+        try:
+            request = parse_service_request(None if name == "analyze" else [name], body)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        
+        request['user_id'] = user_id
+        self.request_count += 1
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((request, future))
+        return await future
+    
+    async def _handle_connection(self, reader, writer):
+        """serve HTTP/1.1 requests on one connection, keeping it open between requests"""
+        import asyncio
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 431, {"error": "request headers too large"}, False)
+                    break
+                
+                request_line, *header_lines = head.decode('latin-1').rstrip("\r\n").split("\r\n")
+                parts = request_line.split(" ")
+                headers = {}
+                for line in header_lines:
+                    key, _, value = line.partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if len(parts) != 3 or length < 0:
+                    await self._respond(writer, 400, {"error": "malformed request"}, False)
+                    break
+                if length > SERVICE_MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "request body too large"}, False)
+                    break
+                
+                method, path, version = parts
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                try:
+                    status, payload = await self._dispatch(method, path, headers, body)
+                except Exception as e:
+                    # a failing request still gets an answer, and the connection stays usable
+                    status, payload = 500, {"error": f"Error handling request: {e}"}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _respond(self, writer, status, payload, keep_alive):
+        """write one JSON response"""
+        from http import HTTPStatus
+        body = json.dumps(payload).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+        if status == 401:
+            head += 'WWW-Authenticate: Basic realm="text-analyzer"\r\n'
+        writer.write(head.encode('latin-1') + b"\r\n" + body)
+        await writer.drain()
+
+def run_service(host=SERVICE_HOST, port=SERVICE_PORT, max_batch=SERVICE_MAX_BATCH, batch_wait=SERVICE_BATCH_WAIT):
+    """run the HTTP service until interrupted"""
+    import asyncio
+    init_database()
+    service = AnalysisService(host, port, max_batch, batch_wait)
+    
+    def ready(service):
+        print(f"Serving on http://{service.host}:{service.port} "
+              f"(micro-batches of up to {service.max_batch}, Ctrl+C to stop)", flush=True)
+    
+    print("Loading the spaCy model...", flush=True)
+    try:
+        asyncio.run(service.serve(ready))
+    except KeyboardInterrupt:
+        print("Service stopped.")
+    flush_instrumentation()
+
+def build_arg_parser():
+    """build the command line parser for the headless commands"""
+    parser = argparse.ArgumentParser(
+        description="Text Analysis Tool. Run without arguments for the interactive menu.")
+    parser.add_argument("--profile", action="store_true",
+                        help="record per-stage timings (same as TEXT_ANALYZER_PROFILE=1)")
+    parser.add_argument("--profile-capture", metavar="MODE=OPERATION",
+                        help="also capture one operation with cProfile or tracemalloc, "
+                             "e.g. cprofile=get_pos_distribution (implies --profile)")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    batch = subparsers.add_parser("batch", help="analyze a directory or glob of files without the menu")
+    batch.add_argument("inputs", nargs="+", help="directories and/or glob patterns of text files")
+    batch.add_argument("--pattern", default="*.txt", help="file pattern used inside directories (default: *.txt)")
+    batch.add_argument("--analyses", default=",".join(DEFAULT_EXPORT_SECTIONS),
+                       help=f"comma separated analyses to report, any of: {', '.join(EXPORT_SECTIONS)}")
+    batch.add_argument("--output-dir", default="reports", help="directory for the reports and summary")
+    batch.add_argument("--user", help="record every file in this user's analysis history")
+    batch.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                       help="number of spaCy worker processes (default: all cores)")
+    batch.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="documents per nlp.pipe batch")
+    batch.add_argument("--encoding", help="encoding of the input files (default: detected per file)")
+    batch.add_argument("--noun-phrases", choices=["parser", "fast"], default=NOUN_PHRASE_MODE,
+                       help="noun phrases from the dependency parse or from tagger-only patterns "
+                            f"(default: {NOUN_PHRASE_MODE})")
+    batch.add_argument("--format", dest="output_format", choices=("text",) + STRUCTURED_EXPORT_FORMATS,
+                       default="text",
+                       help="report format, text or a structured export (default: text)")
+    batch.add_argument("--tables", action="store_true",
+                       help="add per-token and per-sentence tables to a structured export")
+    output = batch.add_mutually_exclusive_group()
+    output.add_argument("--quiet", action="store_true", help="print only errors, no progress bar")
+    output.add_argument("--json", action="store_true",
+                        help="print progress, messages and the summary as JSON lines on stdout")
+    
+    serve = subparsers.add_parser("serve", help="serve the analyses over HTTP with the model kept loaded")
+    serve.add_argument("--host", default=SERVICE_HOST, help=f"address to listen on (default: {SERVICE_HOST})")
+    serve.add_argument("--port", type=int, default=SERVICE_PORT, help=f"port to listen on (default: {SERVICE_PORT})")
+    serve.add_argument("--max-batch", type=int, default=SERVICE_MAX_BATCH,
+                       help=f"most requests per nlp.pipe call (default: {SERVICE_MAX_BATCH})")
+    serve.add_argument("--batch-wait", type=float, default=SERVICE_BATCH_WAIT * 1000,
+                       help=f"milliseconds a request waits for others to batch with "
+                            f"(default: {SERVICE_BATCH_WAIT * 1000:g})")
+    serve.add_argument("--noun-phrases", choices=["parser", "fast"], default=NOUN_PHRASE_MODE,
+                       help=f"noun phrase mode (default: {NOUN_PHRASE_MODE})")
+    return parser
+
+def make_batch_output(mode):
+    """return (say, progress) for the batch output mode: "text", "quiet" or "json"
+    
+    say(message, error=False) prints a message, progress is the Progress the run reports into
+    """
+    progress = Progress()
+    if mode == "json":
+        def say(message, error=False):
+            print(json.dumps({"event": "error" if error else "message", "message": message}), flush=True)
+        progress.subscribe(lambda event: print(json.dumps(event), flush=True))
+        return say, progress
+    
+    def say(message, error=False):
+        if error or mode != "quiet":
+            print(message)
+    
+    if mode == "text":
+        # the bar goes to stderr so stdout stays clean for the messages
+        last_draw = 0.0
+        line_length = 0
+        def draw(event):
+            nonlocal last_draw, line_length
+            now = time.perf_counter()
+            if event["event"] == "finish":
+                if line_length:
+                    sys.stderr.write("\r" + " " * line_length + "\r")
+                    sys.stderr.flush()
+                return
+            if event["event"] == "progress" and now - last_draw < PROGRESS_REFRESH and event["done"] != event["total"]:
+                return
+            last_draw = now
+            line = format_progress_bar(event)
+            sys.stderr.write("\r" + line.ljust(line_length))
+            sys.stderr.flush()
+            line_length = max(line_length, len(line))
+        progress.subscribe(draw)
+    return say, progress
+
+def run_cli(argv):
+    """run a headless command, return the process exit code"""
+    global NOUN_PHRASE_MODE
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.profile_capture:
+        configure_instrumentation(args.profile_capture)
+    elif args.profile:
+        configure_instrumentation("1")
+    
+    if args.command is None and instrumentation_enabled():
+        # --profile alone starts the interactive menu with instrumentation on
+        main()
+        return 0
+    
+    if args.command == "batch":
+        NOUN_PHRASE_MODE = args.noun_phrases
+        say, progress = make_batch_output("json" if args.json else "quiet" if args.quiet else "text")
+        init_database()
+        analyses = [name.strip() for name in args.analyses.split(",") if name.strip()]
+        unknown = [name for name in analyses if name not in EXPORT_SECTIONS]
+        if unknown:
+            parser.error(f"unknown analyses: {', '.join(unknown)}")
+        if args.output_format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+            parser.error("--format parquet needs pyarrow (pip install pyarrow)")
+        
+        user_id = None
+        if args.user:
+            user_id = get_user_id(args.user)
+            if user_id is None:
+                say(f"Error: user '{args.user}' does not exist.", error=True)
+                return 1
+        
+        file_paths = collect_batch_files(args.inputs, args.pattern)
+        if not file_paths:
+            say("No files matched the given inputs.", error=True)
+            return 1
+        
+        say(f"Analyzing {len(file_paths)} files with {args.processes} processes...")
+        result = run_batch(file_paths, analyses, args.output_dir, user_id,
+                           n_process=args.processes, batch_size=args.batch_size, progress=progress,
+                           encoding=args.encoding, output_format=args.output_format,
+                           tables=EXPORT_TABLES if args.tables else (), say=say)
+        if args.json:
+            print(json.dumps({"event": "summary", **result}), flush=True)
+        else:
+            say(f"Processed {result['processed']} of {result['files']} files "
+                f"in {result['seconds']:.1f}s ({result['docs_per_second']:.2f} docs/sec)")
+            say(f"Summary written to: {result['summary_path']}")
+        return 0 if result['failed'] == 0 else 1
+    
+    if args.command == "serve":
+        NOUN_PHRASE_MODE = args.noun_phrases
+        if args.max_batch < 1 or args.batch_wait < 0:
+            parser.error("--max-batch must be at least 1 and --batch-wait not negative")
+        run_service(args.host, args.port, args.max_batch, args.batch_wait / 1000)
+        return 0
+    
+    parser.print_help()
+    return 1
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     main()
\ No newline at end of file